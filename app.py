@@ -1,16 +1,30 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv,find_dotenv
-from flask import Flask,config
-from flask_jwt_extended import JWTManager
+import hmac
+from flask import Flask,Response,config,request
+from flask_jwt_extended import JWTManager,get_jwt,verify_jwt_in_request
 from routes.user_routes import user_app
 from routes.product_routes import prouct_app   
 from routes.order_routes import order_app
-from flask_smorest import Api
+from routes.analytics_routes import analytics_app
+from routes.admin_routes import admin_app
+from flask_smorest import Api,abort
 from utils.rate_limiter import limiter
+from utils.product_cache import product_cache
+from utils.passwords import password_hasher, PasswordQueueFull
+from utils.compression import compressor
+from utils.health import health_monitor
+from utils.metrics import metrics
+from utils.slow_queries import slow_query_log
+from utils.profiling import request_profiler
 from config import config
-from db.mongo_db import db
+from db.mongo_db import db, db_instance
 from utils.create_admin import admin_creation
+from db.indexes import ensure_indexes
+from db.sql_db import upgrade
+from pymongo.errors import PyMongoError
+import logging
 
 load_dotenv(find_dotenv())
 
@@ -23,6 +37,7 @@ def create_app(config_name=None):
     # Load configuration
     env = os.getenv('FLASK_ENV', 'development')
     app.config.from_object(config[env])
+    db_instance.init_app(app)
     
     app.config["API_TITLE"] = "Inventory API"
     app.config["API_VERSION"] = "v1"
@@ -46,8 +61,27 @@ def create_app(config_name=None):
     api.security=[{"bearerAuth":[]}]
     jwt = JWTManager(app)
     limiter.init_app(app)
+    product_cache.init_app(app, db.versions)
+    password_hasher.init_app(app)
+    compressor.init_app(app)
+    health_monitor.init_app(app, env)
+    metrics.init_app(app)
+    slow_query_log.init_app(app)
+    # registered last: its after_request runs first, so an inline report is still compressed
+    request_profiler.init_app(app)
 
     with app.app_context():
+        if db_instance.backend == "sql":
+            if app.config.get("ORDER_TRANSACTIONS"):
+                raise RuntimeError("ORDER_TRANSACTIONS needs MongoDB, it is not available with STORAGE_BACKEND=sql")
+            # the tables and their indexes come from the migrations
+            if app.config.get("SQL_AUTO_MIGRATE"):
+                upgrade(db_instance.sql_uri)
+        elif app.config.get("MONGO_ENSURE_INDEXES"):
+            try:
+                ensure_indexes(db)
+            except PyMongoError as e:
+                logging.error(f"Index bootstrap failed: {e}")
         admin_creation(db)
 
     from routes.user_routes import user_app
@@ -56,29 +90,47 @@ def create_app(config_name=None):
     api.register_blueprint(user_app)
     api.register_blueprint(prouct_app)
     api.register_blueprint(order_app)
+    api.register_blueprint(analytics_app)
+    api.register_blueprint(admin_app)
 
 
 
 
-    # Health check
+    # Health checks, answered from the status the background prober keeps up to date
+    @app.route('/health/live')
+    @limiter.exempt
+    def liveness():
+        return health_monitor.liveness()
+
     @app.route('/health')
-    def health_check():
-        from db.mongo_db import db
-        try:
-            db.command('ping')
-            return {
-                'status': 'healthy',
-                'database': 'connected',
-                'environment': env
-            }, 200
-        except Exception as e:
-            return {'status': 'unhealthy', 'error': str(e)}, 503
+    @app.route('/health/ready')
+    @limiter.exempt
+    def readiness():
+        return health_monitor.readiness()
+
+    # Prometheus metrics of every worker, for admins or the scraper's METRICS_TOKEN
+    @app.route('/metrics')
+    @limiter.exempt
+    def metrics_endpoint():
+        token = app.config.get("METRICS_TOKEN")
+        if not (token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")):
+            verify_jwt_in_request()
+            if get_jwt().get("role") != "admin":
+                abort(403, message="Admins Only")
+        return Response(metrics.exposition(), mimetype="text/plain; version=0.0.4")
     
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
+        # aborts raised by the routes carry their own message/errors
+        if getattr(error, "data", None):
+            return api.handle_http_exception(error)
         return {"error": "Resource not found"}, 404
     
+    @app.errorhandler(PasswordQueueFull)
+    def password_queue_full(error):
+        return {"error": "Too many concurrent logins, please retry"}, 503, {"Retry-After": "1"}
+
     @app.errorhandler(500)
     def internal_error(error):
         return {"error": "Internal server error"}, 500
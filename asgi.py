@@ -0,0 +1,224 @@
+import asyncio
+import io
+import sys
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from app import app as flask_app
+from db.mongo_db import db_instance
+from routes.product_routes import listing_page, listing_query, prouct_app
+from routes.order_routes import (PRICING_PROJECTION, admin_listing_query, admin_only, new_order, order_app,
+                                 order_skus, reservation_failed, user_orders_query, user_orders_response)
+from schema.order_schema import OrderSchema, PostOrderSchema
+from schema.product_schema import Product_Query_Schema
+from utils.order_hooks import after_order_write
+from utils.stock import InsufficientStock, place_order_async
+
+'''
+Async request handling mode.
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+The product listing and the order reads/creation are served by async
+handlers that await AsyncMongoClient queries, so a single worker can keep
+thousands of requests waiting on Mongo instead of one per worker. Every
+other route is passed to the regular Flask app on a thread, so the API is
+the same in both modes.
+
+The async handlers run inside a Flask request context, through the app's
+own hooks and error handlers: authentication, validation, rate limits
+(shared counters, per-route limits), error payloads, ETags, compression
+and metrics are the ones of the sync views. Only the database calls are
+awaited; the rest is the views' code from the route modules.
+'''
+
+
+if db_instance.backend == "sql":
+    # the async handlers await an AsyncMongoClient
+    raise RuntimeError("async mode needs MongoDB, it is not available with STORAGE_BACKEND=sql")
+
+
+def adb():
+    return db_instance.get_async_database()
+
+
+'''
+Async handlers
+'''
+
+async def get_products():
+    verify_jwt_in_request()
+    args = prouct_app.ARGUMENTS_PARSER.parse(Product_Query_Schema, location="query")
+    is_admin = get_jwt().get("role") == "admin"
+    query, options = listing_query(args, is_admin)
+    products = await adb().products.find(*query, **options).to_list()
+    return listing_page(products, args, is_admin)
+
+
+async def get_orders():
+    verify_jwt_in_request()
+    admin_only()
+    orders = await adb().orders.find(*admin_listing_query()).to_list()
+    return OrderSchema(many=True).dump(orders)
+
+
+async def user_order():
+    verify_jwt_in_request()
+    orders = await adb().orders.find(*user_orders_query(get_jwt_identity())).to_list()
+    return user_orders_response(orders)
+
+
+async def create_order():
+    verify_jwt_in_request()
+    data = order_app.ARGUMENTS_PARSER.parse(PostOrderSchema, location="json")
+    session_user = get_jwt_identity()
+    database = adb()
+
+    user = await database.users.find_one({"user_id": session_user})
+    skus = order_skus(data["products"])
+    pricing = {"sku": {"$in": skus}}, PRICING_PROJECTION
+    products = {product["sku"]: product async for product in database.products.find(*pricing)}
+    order_doc = new_order(data, session_user, user, products)
+    try:
+        await place_order_async(database.products, database.orders, order_doc,
+                                use_transaction=flask_app.config.get("ORDER_TRANSACTIONS", False))
+    except InsufficientStock:
+        reservation_failed(data["products"], {p["sku"]: p async for p in database.products.find(*pricing)})
+    order_doc.pop("_id", None)
+    # the read models use the sync client, keep them off the event loop
+    await asyncio.to_thread(after_order_write, None, order_doc)
+    return {"order_details": order_doc}, 201
+
+
+ROUTES = {
+    ("GET", "/product/get_products"): get_products,
+    ("GET", "/orders/get_orders"): get_orders,
+    ("GET", "/orders/user_order"): user_order,
+    ("POST", "/orders/create_order"): create_order,
+}
+
+
+'''
+ASGI plumbing
+'''
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _dispatch(handler):
+    """Flask's full_dispatch_request around an awaited handler"""
+    try:
+        rv = flask_app.preprocess_request()
+        if rv is None:
+            rv = await handler()
+    except Exception as e:
+        rv = flask_app.handle_user_exception(e)
+    return flask_app.finalize_request(rv)
+
+
+async def _call_async(handler, scope, body, send):
+    # contexts live in contextvars, so this one stays pushed across the awaits of this request's task
+    ctx = flask_app.request_context(_environ(scope, body))
+    error = None
+    ctx.push()
+    try:
+        try:
+            response = await _dispatch(handler)
+        except Exception as e:
+            error = e
+            response = flask_app.handle_exception(e)
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.to_wsgi_list()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response.get_data()})
+        response.close()
+    finally:
+        ctx.pop(error)
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("127.0.0.1", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        # the body is read whole, so its length is known even when it came chunked
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope.get("headers", []):
+        name = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            continue
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _call_flask(scope, body, send):
+    """Run the Flask app on a thread, streaming its response back chunk by chunk"""
+    loop = asyncio.get_running_loop()
+    environ = _environ(scope, body)
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    def relay(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        result = flask_app(environ, start_response)
+        try:
+            relay({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            for chunk in result:
+                if chunk:
+                    relay({"type": "http.response.body", "body": chunk, "more_body": True})
+            relay({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    await asyncio.to_thread(run)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if db_instance._async_client is not None:
+                    await db_instance._async_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        return await _call_flask(scope, body, send)
+    await _call_async(handler, scope, body, send)
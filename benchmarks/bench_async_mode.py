@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+Throughput of the sync (Flask/WSGI) and async (asgi.py) modes on the same
+endpoints and data.
+
+The sync mode is driven through the Flask test client from a thread pool
+sized like a pool of sync gunicorn workers; the async mode calls the ASGI app
+from a single event loop with the same number of requests in flight.
+
+    python -m benchmarks.bench_async_mode --requests 2000 --workers 4 --concurrency 200
+
+Needs a running MongoDB (MONGO_URI). Seeds and drops a scratch database.
+'''
+
+BENCH_DB = "inventory_bench_async"
+os.environ["MONGO_DB_NAME"] = BENCH_DB
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("TESTING", "True")
+os.environ.setdefault("SECRETKEY", "bench-secret")
+os.environ.setdefault("ADMINNAME", "admin")
+os.environ.setdefault("ADMINPASSWORD", "Admin@123")
+os.environ.setdefault("ADMINID", "admin-001")
+
+ENDPOINTS = [
+    ("GET", "/product/get_products", b"limit=50"),
+    ("GET", "/orders/user_order", b""),
+]
+
+
+def _seed(db, products, orders):
+    db.products.drop()
+    db.orders.drop()
+    db.products.insert_many([
+        {"product_id": f"p-{i}", "sku": f"SKU-{i:06d}", "product_type": "Laptop", "product_name": f"Laptop {i}",
+         "product_desc": "bench", "product_price": 1000 + i, "quantity_present": 100, "is_active": True,
+         "timestamp": datetime.datetime.now()}
+        for i in range(products)
+    ])
+    db.orders.insert_many([
+        {"order_id": f"o-{i}", "user_id": "bench-user", "user_name": "bench", "products": [],
+         "order_quantity": 1, "order_price": 1000.0, "order_status": "Pending", "payment_status": "Pending",
+         "payment_method": "UPI", "shipping_address": "bench", "created_at": datetime.datetime.now()}
+        for i in range(orders)
+    ])
+
+
+def _report(mode, path, latencies, elapsed):
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{mode:5} {path:24} {len(latencies) / elapsed:8.0f} req/s   "
+          f"p50 {p(0.50):7.1f}ms   p99 {p(0.99):7.1f}ms   mean {statistics.mean(latencies) * 1000:7.1f}ms")
+
+
+def bench_sync(flask_app, token, method, path, query, requests, workers):
+    client = flask_app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"{path}?{query.decode()}" if query else path
+
+    def one(_):
+        started = time.perf_counter()
+        response = client.open(url, method=method, headers=headers)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    _report("sync", path, latencies, time.perf_counter() - started)
+
+
+async def bench_async(asgi_app, token, method, path, query, requests, concurrency):
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(b"authorization", f"Bearer {token}".encode())],
+             "client": ("127.0.0.1", 0), "server": ("localhost", 80)}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def one():
+        async with gate:
+            status = {}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+
+            started = time.perf_counter()
+            await asgi_app(scope, receive, send)
+            assert status["code"] == 200, status
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    _report("async", path, list(latencies), time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare sync and async request handling throughput")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint and mode")
+    parser.add_argument("--workers", type=int, default=4, help="sync: concurrent requests (like gunicorn sync workers)")
+    parser.add_argument("--concurrency", type=int, default=200, help="async: requests in flight on one event loop")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    from flask_jwt_extended import create_access_token
+    from db.mongo_db import db_instance
+    import asgi
+
+    db = db_instance.get_database(BENCH_DB)
+    _seed(db, args.products, args.orders)
+    with asgi.flask_app.app_context():
+        token = create_access_token(identity="bench-user", additional_claims={"role": "user"})
+
+    async def run_async():
+        # one event loop for every endpoint: the AsyncMongoClient is bound to it
+        for method, path, query in ENDPOINTS:
+            await bench_async(asgi.app, token, method, path, query, args.requests, args.concurrency)
+
+    try:
+        for method, path, query in ENDPOINTS:
+            bench_sync(asgi.flask_app, token, method, path, query, args.requests, args.workers)
+        asyncio.run(run_async())
+    finally:
+        db_instance.connect().drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    main()
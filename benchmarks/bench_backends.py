@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from benchmarks.bench_handlers import SCALES, endpoints, measure, seed
+
+'''
+MongoDB against the SQL backend on the same workload.
+
+Seeds each backend with the users, products and orders of
+benchmarks/bench_handlers.py (same seed, same documents), then drives the
+same handlers through the Flask test client and prints ops/sec, p50/p99
+latency and peak memory side by side:
+
+    python -m benchmarks.bench_backends --scale 1k 10k
+    python -m benchmarks.bench_backends --backend sql --sql-dir /var/tmp
+
+The SQL backend runs on a fresh SQLite file per scale (in --sql-dir),
+migrated with the Alembic migrations. MongoDB is MONGO_URI with the
+--mongo-db database, whose collections are dropped first; it is skipped
+when no server answers.
+'''
+
+BACKENDS = ("mongo", "sql")
+
+
+def prepare(backend, scale, args, sql_dir):
+    """Point the app at a clean ``backend`` and return its database, None when it is unreachable"""
+    from db.mongo_db import db_instance
+    from db.sql_db import upgrade
+    if backend == "sql":
+        uri = f"sqlite:///{os.path.join(sql_dir, f'bench-{scale}.db')}"
+        db_instance.use_backend("sql", uri)
+        upgrade(uri)
+        return db_instance.get_database()
+
+    db_instance.use_backend("mongo")
+    if not db_instance.warm():
+        return None
+    store = db_instance.get_database()
+    for name in store.list_collection_names():
+        store.drop_collection(name)
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the MongoDB and SQL storage backends on the handler workload")
+    parser.add_argument("--scale", nargs="+", default=["1k"], choices=list(SCALES))
+    parser.add_argument("--backend", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint at most")
+    parser.add_argument("--seconds", type=float, default=5.0, help="time per endpoint at most")
+    parser.add_argument("--mongo-db", default="inventory_bench", help="database dropped and seeded on MONGO_URI")
+    parser.add_argument("--sql-dir", help="directory of the SQLite files (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sql_dir = args.sql_dir or tempfile.mkdtemp(prefix="bench-backends-")
+    # read by config.py and db/mongo_db.py: the app starts on SQL, so nothing waits for a MongoDB at import
+    os.environ["MONGO_DB_NAME"] = args.mongo_db
+    os.environ["STORAGE_BACKEND"] = "sql"
+    os.environ["SQL_DATABASE_URI"] = f"sqlite:///{os.path.join(sql_dir, 'app.db')}"
+    from flask_jwt_extended import create_access_token
+    from app import app
+
+    try:
+        for scale in args.scale:
+            results = {}
+            for backend in args.backend:
+                store = prepare(backend, scale, args, sql_dir)
+                if store is None:
+                    print(f"\nscale {scale}: {backend} skipped, no MongoDB server answered")
+                    continue
+                rng = random.Random(args.seed)
+                started = time.perf_counter()
+                users, products = seed(store, SCALES[scale], rng)
+                print(f"\nscale {scale}: seeded {backend} with {SCALES[scale]} products/orders "
+                      f"in {time.perf_counter() - started:.1f}s")
+
+                with app.app_context():
+                    tokens = {
+                        "user": create_access_token(identity=users[0]["user_id"], additional_claims={"role": "user"}),
+                        "admin": create_access_token(identity=os.environ["ADMINID"], additional_claims={"role": "admin"})
+                    }
+                client = app.test_client()
+                for name, method, path, role, body in endpoints(users, products, rng):
+                    headers = {"Authorization": f"Bearer {tokens[role]}"}
+                    results[(name, backend)] = measure(client, headers, method, path, body, args.requests, args.seconds)
+
+            print(f"\nscale {scale}")
+            print(f"{'endpoint':<18}{'backend':<9}{'ops/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>11}{'vs mongo':>10}")
+            for name, *_ in endpoints([], [], None):
+                mongo = results.get((name, "mongo"))
+                for backend in args.backend:
+                    result = results.get((name, backend))
+                    if result is None:
+                        continue
+                    ratio = f"{result['ops_per_sec'] / mongo['ops_per_sec']:.2f}x" if mongo else "-"
+                    print(f"{name:<18}{backend:<9}{result['ops_per_sec']:>9.1f}{result['p50_ms']:>10.2f}"
+                          f"{result['p99_ms']:>10.2f}{result['peak_kib']:>11.1f}{ratio:>10}")
+    finally:
+        if not args.sql_dir:
+            shutil.rmtree(sql_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
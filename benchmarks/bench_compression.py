@@ -0,0 +1,129 @@
+import argparse
+import datetime
+import json
+import random
+import time
+import uuid
+from utils.compression import ResponseCompressor
+
+'''
+CPU cost versus bytes saved of response compression.
+
+Builds catalog pages and order listings shaped like the API responses
+(same fields, realistic names, prices and dates), then compresses them with
+every installed coding at a few levels, both as a whole body and chunked the
+way the streamed exports are. Prints the compressed size, the ratio and the
+CPU time per MB of JSON.
+
+    python -m benchmarks.bench_compression --products 500 --orders 200
+
+No database needed. br and zstd are only measured when the brotli and
+zstandard packages are installed.
+'''
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 6], "zstd": [1, 3, 9]}
+BRANDS = {
+    "Laptop": ["Dell XPS", "Lenovo ThinkPad", "HP Spectre", "Apple MacBook Pro", "Asus ZenBook"],
+    "Smartphone": ["Samsung Galaxy", "Apple iPhone", "Google Pixel", "OnePlus"],
+    "TV": ["LG OLED", "Sony Bravia", "Samsung QLED"],
+}
+
+
+def catalog(count, rng):
+    now = datetime.datetime(2026, 1, 1)
+    products = []
+    for i in range(count):
+        product_type = rng.choice(list(BRANDS))
+        name = f"{rng.choice(BRANDS[product_type])} {rng.randint(10, 99)}"
+        products.append({
+            "product_type": product_type,
+            "product_name": name,
+            "product_desc": f"{name} {product_type.lower()} with {rng.choice([8, 16, 32])}GB memory",
+            "product_price": round(rng.uniform(199, 2999), 2),
+            "quantity_present": rng.randint(0, 500),
+            "is_active": rng.random() > 0.1,
+            "sku": f"{product_type[:3].upper()}-{i:06d}",
+            "version": rng.randint(1, 20),
+            "updated_timestamp": (now + datetime.timedelta(minutes=i)).isoformat()
+        })
+    return products
+
+
+def orders(count, products, rng):
+    now = datetime.datetime(2026, 3, 1)
+    result = []
+    for i in range(count):
+        lines = []
+        for product in rng.sample(products, rng.randint(1, 5)):
+            quantity = rng.randint(1, 20)
+            lines.append({
+                "product_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "sku": product["sku"],
+                "product_name": product["product_name"],
+                "product_type": product["product_type"],
+                "product_price": product["product_price"],
+                "product_quantity": quantity,
+                "total_price": round(quantity * product["product_price"], 2)
+            })
+        result.append({
+            "order_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_name": f"buyer{rng.randint(1, 50)}",
+            "user_id": f"user-{rng.randint(1, 50):03d}",
+            "products": lines,
+            "order_quantity": sum(l["product_quantity"] for l in lines),
+            "order_price": round(sum(l["total_price"] for l in lines), 2),
+            "order_status": rng.choice(["Pending", "Processing", "Shipped", "Delivered"]),
+            "payment_status": "Pending",
+            "payment_method": "Credit Card",
+            "shipping_address": f"{rng.randint(1, 999)} Main St, City",
+            "created_at": (now + datetime.timedelta(minutes=7 * i)).isoformat(),
+            "version": 1
+        })
+    return result
+
+
+def measure(codec, coding, level, body, chunks, repeat):
+    codec.levels[coding] = level
+    started = time.process_time()
+    for _ in range(repeat):
+        whole = codec.compress(coding, body)
+    whole_cpu = (time.process_time() - started) / repeat
+
+    started = time.process_time()
+    for _ in range(repeat):
+        streamed = b"".join(codec._stream(chunks, coding))
+    stream_cpu = (time.process_time() - started) / repeat
+    return len(whole), whole_cpu, len(streamed), stream_cpu
+
+
+def report(name, docs, codec, repeat):
+    body = json.dumps(docs).encode("utf-8")
+    chunks = [json.dumps(doc).encode("utf-8") + b"\n" for doc in docs]
+    mb = len(body) / 1e6
+    print(f"\n{name}: {len(docs)} documents, {len(body) / 1024:.1f} KiB of JSON")
+    print(f"{'coding':<8}{'level':>6}{'bytes':>10}{'ratio':>8}{'ms/MB':>9}{'stream bytes':>14}{'stream ms/MB':>14}")
+    for coding in codec.available:
+        for level in LEVELS[coding]:
+            size, cpu, stream_size, stream_cpu = measure(codec, coding, level, body, chunks, repeat)
+            print(f"{coding:<8}{level:>6}{size:>10}{len(body) / size:>8.1f}{cpu * 1000 / mb:>9.1f}"
+                  f"{stream_size:>14}{stream_cpu * 1000 / mb:>14.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compression ratio and CPU cost on catalog and order payloads")
+    parser.add_argument("--products", type=int, default=500, help="products per catalog page")
+    parser.add_argument("--orders", type=int, default=200, help="orders per listing")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    codec = ResponseCompressor()
+    products = catalog(args.products, rng)
+    report("catalog page", products, codec, args.repeat)
+    report("order listing", orders(args.orders, products, rng), codec, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,239 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+'''
+Per-handler micro-benchmarks against the in-process document store.
+
+Seeds benchmarks/memory_store.py with users, products and orders at each
+requested scale (1k/100k/1m documents per collection), then drives the real
+route handlers through the Flask test client one request at a time:
+
+- Get_Product.get   GET /product/get_products?limit=50 (as a user)
+- Get_Order.get     GET /orders/get_orders (as an admin, every order)
+- PostOrder.post    POST /orders/create_order (as a user, 1-3 lines)
+
+and prints ops/sec, p50/p95/p99 latency and the peak memory allocated while
+handling one request (tracemalloc, measured on a separate pass so it does
+not slow the timed one). Each endpoint runs for --requests requests or
+--seconds seconds, whichever comes first.
+
+    python -m benchmarks.bench_handlers --scale 1k 100k
+    python -m benchmarks.bench_handlers --scale 1k --save-baseline
+    python -m benchmarks.bench_handlers --scale 1k --check
+
+Results are compared with benchmarks/baselines/handlers.json; anything
+slower or bigger than the baseline by more than --tolerance is marked as a
+regression (and --check exits with 1). Baselines are machine dependent:
+record them on the machine that runs the comparison. No database needed;
+the testing config is used (product cache off, rate limits off).
+'''
+
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("TESTING", "True")
+os.environ.setdefault("SECRETKEY", "bench-secret")
+os.environ.setdefault("ADMINNAME", "admin")
+os.environ.setdefault("ADMINPASSWORD", "Admin@123")
+os.environ.setdefault("ADMINID", "admin-001")
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "handlers.json")
+# (metric, True when higher is better)
+METRICS = (("ops_per_sec", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("peak_kib", False))
+
+
+def seed(db, count, rng):
+    """``count`` products and orders and a tenth as many users"""
+    from db.indexes import ensure_indexes
+    # the choices the schemas accept, so every seeded document is one the API could have created
+    from utils.generate_data import PAYMENT_METHODS, PRODUCT_TYPES
+    ensure_indexes(db)
+    now = datetime.datetime(2026, 1, 1)
+    users = [{"user_id": f"user-{i:07d}", "user_name": f"bench-user-{i}", "user_password": "x", "user_role": "user"}
+             for i in range(max(count // 10, 10))]
+    db.users.insert_many(users)
+
+    products = []
+    for i in range(count):
+        product_type = rng.choice(PRODUCT_TYPES)
+        products.append({
+            "product_id": f"prod-{i:07d}", "sku": f"{product_type[:3].upper()}-{i:07d}",
+            "product_type": product_type, "product_name": f"{product_type} {i}",
+            "product_desc": f"{product_type} number {i}", "product_price": round(rng.uniform(10, 3000), 2),
+            "quantity_present": 10_000_000, "is_active": True, "version": 1,
+            "timestamp": now, "updated_timestamp": now
+        })
+    db.products.insert_many(products)
+
+    orders = []
+    for i in range(count):
+        user = rng.choice(users)
+        lines = []
+        for product in rng.sample(products, rng.randint(1, 3)):
+            quantity = rng.randint(1, 5)
+            lines.append({"product_id": product["product_id"], "sku": product["sku"],
+                          "product_name": product["product_name"], "product_price": product["product_price"],
+                          "product_quantity": quantity, "total_price": quantity * product["product_price"]})
+        orders.append({
+            "order_id": f"order-{i:07d}", "user_name": user["user_name"], "user_id": user["user_id"],
+            "products": lines, "order_quantity": sum(line["product_quantity"] for line in lines),
+            "order_price": sum(line["total_price"] for line in lines), "order_status": "Pending",
+            "payment_status": "Pending", "payment_method": rng.choice(PAYMENT_METHODS),
+            "shipping_address": f"{i} Bench Street", "created_at": now + datetime.timedelta(minutes=i), "version": 1
+        })
+    db.orders.insert_many(orders)
+    return users, products
+
+
+def endpoints(users, products, rng):
+    """(name, method, path, role, body factory) of every benchmarked handler"""
+    def order_body():
+        return {"user_id": rng.choice(users)["user_id"], "payment_method": "UPI", "shipping_address": "1 Bench Street",
+                "products": [{"sku": p["sku"], "product_name": p["product_name"], "product_type": p["product_type"],
+                              "product_quantity": 1} for p in rng.sample(products, rng.randint(1, 3))]}
+
+    return [
+        ("Get_Product.get", "GET", "/product/get_products?limit=50", "user", None),
+        ("Get_Order.get", "GET", "/orders/get_orders", "admin", None),
+        ("PostOrder.post", "POST", "/orders/create_order", "user", order_body),
+    ]
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(client, headers, method, path, body, requests, seconds):
+    """Latencies (s) of sequential requests"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while len(latencies) < requests and (len(latencies) < 5 or time.perf_counter() < deadline):
+        payload = body() if body else None
+        started = time.perf_counter()
+        response = client.open(path, method=method, headers=headers, json=payload)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code in (200, 201), (path, response.status_code, response.get_data(as_text=True)[:200])
+    return latencies
+
+
+def peak_memory(client, headers, method, path, body, samples=3):
+    """Largest allocation peak (KiB) of a single request"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            payload = body() if body else None
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            client.open(path, method=method, headers=headers, json=payload)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return max(peaks) / 1024
+
+
+def measure(client, headers, method, path, body, requests, seconds):
+    latencies = run(client, headers, method, path, body, requests, seconds)
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "ops_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "peak_kib": round(peak_memory(client, headers, method, path, body), 1)
+    }
+
+
+def regressions(result, baseline, tolerance):
+    """Metrics of ``result`` worse than ``baseline`` by more than ``tolerance`` (a fraction)"""
+    worse = []
+    for metric, higher_is_better in METRICS:
+        before, now = baseline.get(metric), result.get(metric)
+        if not before or now is None:
+            continue
+        change = (before - now) / before if higher_is_better else (now - before) / before
+        if change > tolerance:
+            worse.append(f"{metric} {change:+.0%}")
+    return worse
+
+
+def load_baselines(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"scales": {}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the route handlers against the in-process document store")
+    parser.add_argument("--scale", nargs="+", default=["1k"], choices=list(SCALES))
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint at most")
+    parser.add_argument("--seconds", type=float, default=5.0, help="time per endpoint at most")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression")
+    parser.add_argument("--check", action="store_true", help="exit with 1 on any regression")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from db import mongo_db
+    from benchmarks.memory_store import MemoryDatabase
+    # the routes capture their collections at import: swap the database in first
+    store = mongo_db.db = MemoryDatabase("bench")
+    from flask_jwt_extended import create_access_token
+    from app import app
+
+    stored = load_baselines(args.baseline)
+    baselines = {"scales": {scale: dict(results) for scale, results in stored["scales"].items()}}
+    found = []
+    for scale in args.scale:
+        for name in list(store.list_collection_names()):
+            store[name].drop()
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        users, products = seed(store, SCALES[scale], rng)
+        print(f"\nscale {scale}: seeded {SCALES[scale]} products/orders in {time.perf_counter() - started:.1f}s")
+        print(f"{'endpoint':<18}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>11}  vs baseline")
+
+        with app.app_context():
+            tokens = {
+                "user": create_access_token(identity=users[0]["user_id"], additional_claims={"role": "user"}),
+                "admin": create_access_token(identity=os.environ["ADMINID"], additional_claims={"role": "admin"})
+            }
+        client = app.test_client()
+        results = baselines["scales"].setdefault(scale, {}) if args.save_baseline else {}
+        for name, method, path, role, body in endpoints(users, products, rng):
+            headers = {"Authorization": f"Bearer {tokens[role]}"}
+            result = measure(client, headers, method, path, body, args.requests, args.seconds)
+            baseline = stored["scales"].get(scale, {}).get(name)
+            worse = regressions(result, baseline, args.tolerance) if baseline else []
+            found += [f"{scale} {name}: {w}" for w in worse]
+            verdict = "no baseline" if not baseline else ("REGRESSION " + ", ".join(worse) if worse else "ok")
+            print(f"{name:<18}{result['ops_per_sec']:>9.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                  f"{result['p99_ms']:>10.2f}{result['peak_kib']:>11.1f}  {verdict}")
+            results[name] = result
+
+    if args.save_baseline:
+        baselines["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                                "processor": platform.processor() or platform.machine()}
+        baselines["recorded_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\nbaseline written to {args.baseline}")
+    if found:
+        print(f"\n{len(found)} regression(s) over {args.tolerance:.0%}:", *found, sep="\n  ")
+    return 1 if found and args.check else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
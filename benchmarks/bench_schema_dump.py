@@ -0,0 +1,101 @@
+import argparse
+import datetime
+import random
+import time
+import uuid
+from marshmallow import Schema
+from schema.order_schema import OrderSchema
+from schema.user_schema import User_Schema
+
+'''
+Compiled versus plain marshmallow dumping of the response schemas.
+
+Builds orders shaped like the stored ones (1-5 product lines, datetimes)
+and users, dumps them with OrderSchema(many=True) / User_Schema(many=True)
+through marshmallow's generic path and through the compiled functions,
+checks that both give the same output and prints the time of each.
+
+    python -m benchmarks.bench_schema_dump --orders 100000
+
+No database needed.
+'''
+
+
+def orders(count, rng):
+    now = datetime.datetime(2026, 3, 1)
+    result = []
+    for i in range(count):
+        lines = []
+        for _ in range(rng.randint(1, 5)):
+            quantity = rng.randint(1, 20)
+            price = round(rng.uniform(199, 2999), 2)
+            lines.append({
+                "product_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "sku": f"LAP-{rng.randint(0, 9999):06d}",
+                "product_name": f"Laptop {rng.randint(10, 99)}",
+                "product_type": "Laptop",
+                "product_price": price,
+                "product_quantity": quantity,
+                "total_price": round(quantity * price, 2)
+            })
+        order = {
+            "_id": i,
+            "order_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_name": f"buyer{rng.randint(1, 500)}",
+            "user_id": f"user-{rng.randint(1, 500):03d}",
+            "products": lines,
+            "order_quantity": sum(l["product_quantity"] for l in lines),
+            "order_price": round(sum(l["total_price"] for l in lines), 2),
+            "order_status": rng.choice(["Pending", "Confirmed", "Shipped", "Delivered", "Cancelled"]),
+            "payment_status": "Pending",
+            "payment_method": "Credit Card",
+            "shipping_address": f"{rng.randint(1, 999)} Main St, City",
+            "created_at": now + datetime.timedelta(minutes=i)
+        }
+        if order["order_status"] == "Cancelled":
+            order["reason"] = "Changed my mind"
+            order["updated_timestamp"] = order["created_at"] + datetime.timedelta(hours=1)
+        result.append(order)
+    return result
+
+
+def users(count):
+    return [{"user_id": f"user-{i:06d}", "user_name": f"buyer{i}", "user_role": "user"} for i in range(count)]
+
+
+def timed(dump, docs, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = dump(docs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def compare(name, schema, docs, repeat):
+    plain, plain_s = timed(lambda d: Schema.dump(schema, d), docs, repeat)
+    compiled, compiled_s = timed(schema.dump, docs, repeat)
+    same = plain == compiled
+    print(f"{name:<8}{len(docs):>9}{plain_s * 1000:>12.1f}{compiled_s * 1000:>14.1f}{plain_s / compiled_s:>9.1f}x"
+          f"  {'identical' if same else 'OUTPUT DIFFERS'}")
+    return same
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compiled vs marshmallow dump of the response schemas")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'schema':<8}{'docs':>9}{'plain ms':>12}{'compiled ms':>14}{'speedup':>10}")
+    ok = compare("orders", OrderSchema(many=True), orders(args.orders, rng), args.repeat)
+    ok = compare("users", User_Schema(many=True), users(args.users), args.repeat) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dotenv import load_dotenv, find_dotenv
+from pymongo import MongoClient
+from utils.stock import InsufficientStock, reserve_stock
+
+'''
+Concurrency benchmark for stock reservation.
+
+Hammers a handful of products with far more concurrent reservations than
+there is stock, from several processes and threads, then checks that the
+number of successful reservations matches the stock exactly and that no
+product went below zero.
+
+    python -m benchmarks.bench_stock_reservation --stock 500 --requests 5000
+
+Needs a running MongoDB (MONGO_URI). Uses a scratch database that is
+dropped at the end.
+'''
+
+load_dotenv(find_dotenv())
+
+BENCH_DB = "inventory_bench_stock"
+
+
+def _collection(uri):
+    client = MongoClient(uri, maxPoolSize=100)
+    return client, client[BENCH_DB].products
+
+
+def _worker(uri, product_ids, requests, threads, quantity):
+    """Fire ``requests`` reservations from ``threads`` threads, return (ok, rejected)"""
+    client, products = _collection(uri)
+
+    def attempt(i):
+        product_id = product_ids[i % len(product_ids)]
+        try:
+            reserve_stock(products, str(uuid.uuid4()), {product_id: quantity})
+            return True
+        except InsufficientStock:
+            return False
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(attempt, range(requests)))
+    client.close()
+    return results.count(True), results.count(False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that concurrent reservations never oversell")
+    parser.add_argument("--uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--products", type=int, default=4)
+    parser.add_argument("--stock", type=int, default=500, help="stock per product")
+    parser.add_argument("--requests", type=int, default=5000, help="reservations per process")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=32, help="threads per process")
+    parser.add_argument("--quantity", type=int, default=1, help="units per reservation")
+    args = parser.parse_args(argv)
+
+    client, products = _collection(args.uri)
+    products.drop()
+    product_ids = [f"bench-{i}" for i in range(args.products)]
+    products.insert_many([
+        {"product_id": pid, "sku": pid.upper(), "is_active": True, "quantity_present": args.stock}
+        for pid in product_ids
+    ])
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        futures = [
+            pool.submit(_worker, args.uri, product_ids, args.requests, args.threads, args.quantity)
+            for _ in range(args.processes)
+        ]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    reserved = sum(ok for ok, _ in results)
+    rejected = sum(rejected for _, rejected in results)
+    total = reserved + rejected
+    remaining = {p["product_id"]: p["quantity_present"] for p in products.find({}, {"product_id": 1, "quantity_present": 1})}
+    leftover_tags = products.count_documents({"reservations.0": {"$exists": True}})
+
+    expected_reserved = min(total, args.products * (args.stock // args.quantity))
+    units_taken = args.products * args.stock - sum(remaining.values())
+
+    print(f"requests:           {total} in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"reserved/rejected:  {reserved}/{rejected}")
+    print(f"remaining stock:    {remaining}")
+    print(f"units taken:        {units_taken} (reserved x quantity = {reserved * args.quantity})")
+
+    ok = (
+        all(q >= 0 for q in remaining.values())
+        and units_taken == reserved * args.quantity
+        and reserved == expected_reserved
+        and leftover_tags == 0
+    )
+    print("no oversell" if ok else "OVERSELL OR LOST STOCK DETECTED")
+
+    client.drop_database(BENCH_DB)
+    client.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+import copy
+from bisect import bisect_left, bisect_right, insort
+from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from db.documents import (aggregate_documents, candidates, field_values, first_value, matches, merge_operations,
+                          merge_target, project, sort_key, sort_spec, updated_document, upserted_document)
+
+'''
+In-process document store with the subset of the pymongo API the routes use.
+
+Stands in for a MongoDB database in the handler benchmarks: attribute or
+item access gives a collection with find/find_one/insert/update/replace/
+delete, find_one_and_update, bulk_write, count_documents and aggregate,
+with the filter, update and pipeline semantics of db/documents.py and
+upserts.
+
+Indexes are single-field (the first key of create_index/IndexModel keys):
+equality, $in and range filters on an indexed field read only the matching
+documents, and a sort on an indexed field walks the index in order and
+stops at the limit, like an IXSCAN. Unique indexes raise DuplicateKeyError.
+Documents are deep-copied in and out, standing in for BSON encoding.
+'''
+
+
+class Index:
+    """Single-field index: value -> document ids, plus the distinct values in order"""
+
+    def __init__(self, field, unique=False, name=None):
+        self.field = field
+        self.unique = unique
+        self.name = name or f"{field}_1"
+        self.entries = {}
+        self.keys = []
+
+    @staticmethod
+    def _hashable(value):
+        return sort_key(value) if isinstance(value, (dict, list)) else (sort_key(value)[0], value)
+
+    def _keys_of(self, doc):
+        values = list(candidates(field_values(doc, self.field))) or [None]
+        return {self._hashable(v) for v in values if not isinstance(v, list)}
+
+    def add(self, doc):
+        for key in self._keys_of(doc):
+            ids = self.entries.get(key)
+            if ids is None:
+                ids = self.entries[key] = set()
+                insort(self.keys, key)
+            elif self.unique and ids and key[1] is not None:
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {self.name} dup key: {key[1]!r}")
+            ids.add(doc["_id"])
+
+    def remove(self, doc):
+        for key in self._keys_of(doc):
+            ids = self.entries.get(key)
+            if ids is None:
+                continue
+            ids.discard(doc["_id"])
+            if not ids:
+                del self.entries[key]
+                del self.keys[bisect_left(self.keys, key)]
+
+    def lookup(self, condition):
+        """Ids that may match ``condition`` on this field, None when the index cannot narrow it"""
+        if not isinstance(condition, dict) or not all(k.startswith("$") for k in condition):
+            if hasattr(condition, "search") or isinstance(condition, (dict, list)):
+                return None
+            return set(self.entries.get(self._hashable(condition), ()))
+        if "$eq" in condition and not isinstance(condition["$eq"], (dict, list)):
+            return set(self.entries.get(self._hashable(condition["$eq"]), ()))
+        if "$in" in condition:
+            ids = set()
+            for value in condition["$in"]:
+                if isinstance(value, (dict, list)) or hasattr(value, "search"):
+                    return None
+                ids |= self.entries.get(self._hashable(value), set())
+            return ids
+        bounds = self.bounds(condition)
+        if bounds is None:
+            return None
+        ids = set()
+        for key in self.keys[bounds[0]:bounds[1]]:
+            ids |= self.entries[key]
+        return ids
+
+    def bounds(self, condition):
+        """(low, high) slice of ``keys`` for the range operators of ``condition``, None without any"""
+        if not isinstance(condition, dict):
+            return None
+        ranges = {op: condition[op] for op in ("$gt", "$gte", "$lt", "$lte") if op in condition}
+        if not ranges:
+            return None
+        low, high = 0, len(self.keys)
+        for op, value in ranges.items():
+            key = self._hashable(value)
+            if op == "$gt":
+                low = max(low, bisect_right(self.keys, key))
+            elif op == "$gte":
+                low = max(low, bisect_left(self.keys, key))
+            elif op == "$lt":
+                high = min(high, bisect_left(self.keys, key))
+            else:
+                high = min(high, bisect_right(self.keys, key))
+        return low, high
+
+    def ordered_ids(self, direction, condition=None):
+        """Document ids in index order, starting at the range bounds of ``condition``"""
+        low, high = self.bounds(condition) or (0, len(self.keys))
+        keys = self.keys[low:high]
+        for key in keys if direction == 1 else reversed(keys):
+            yield from sorted(self.entries[key], key=sort_key)
+
+
+class MemoryCursor:
+    """Lazily evaluated find(); iterating runs the query"""
+
+    def __init__(self, collection, query, projection, sort=None, limit=0, skip=0):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = sort_spec(sort)
+        self._limit = limit or 0
+        self._skip = skip or 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else sort_spec(key_or_list)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        docs = self.collection._select(self.query, self._sort, self._limit + self._skip if self._limit else 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return (project(doc, self.projection) for doc in docs)
+
+
+class MemoryCollection:
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.documents = {}
+        self.indexes = {"_id": Index("_id", unique=True, name="_id_")}
+        # every created index as index_information() reports it, keyed by name
+        self.index_specs = {"_id_": {"key": [("_id", 1)]}}
+
+    def __repr__(self):
+        return f"MemoryCollection({self.name!r}, {len(self.documents)} documents)"
+
+    def with_options(self, **kwargs):
+        return self
+
+    '''
+    Indexes
+    '''
+
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        keys = [(keys, 1)] if isinstance(keys, str) else sort_spec(keys)
+        field = keys[0][0]
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        # only the first key is indexed; a unique compound index would be checked on that key alone
+        index = Index(field, unique=unique and len(keys) == 1, name=name)
+        for doc in self.documents.values():
+            index.add(doc)
+        self.indexes.setdefault(field, index)
+        self.index_specs[name] = {"key": keys, **({"unique": True} if unique else {})}
+        return name
+
+    def index_information(self):
+        return copy.deepcopy(self.index_specs)
+
+    def create_indexes(self, models, **kwargs):
+        names = []
+        for model in models:
+            spec = model.document
+            names.append(self.create_index(list(spec["key"].items()), unique=spec.get("unique", False),
+                                           name=spec.get("name")))
+        return names
+
+    def drop(self):
+        self.documents.clear()
+        for field, index in list(self.indexes.items()):
+            self.indexes[field] = Index(field, index.unique, index.name)
+
+    '''
+    Reads
+    '''
+
+    def _select(self, query, sort=(), limit=0):
+        """Matching stored documents (not copies), sorted, at most ``limit`` when given"""
+        query = query or {}
+        ids, narrowed_by = None, set()
+        for field, condition in query.items():
+            index = self.indexes.get(field)
+            if index is not None:
+                narrowed = index.lookup(condition)
+                if narrowed is not None:
+                    ids = narrowed if ids is None else ids & narrowed
+                    narrowed_by.add(field)
+
+        if len(sort) == 1 and sort[0][0] in self.indexes and narrowed_by <= {sort[0][0]}:
+            # walk the sort index in order and stop at the limit
+            field, direction = sort[0]
+            found = []
+            for _id in self.indexes[field].ordered_ids(direction, query.get(field)):
+                doc = self.documents[_id]
+                if matches(doc, query):
+                    found.append(doc)
+                    if limit and len(found) >= limit:
+                        break
+            return found
+
+        pool = self.documents.values() if ids is None else (self.documents[i] for i in ids if i in self.documents)
+        found = [doc for doc in pool if matches(doc, query)]
+        for field, direction in reversed(sort or []):
+            found.sort(key=lambda doc: sort_key(first_value(doc, field)), reverse=direction == -1)
+        return found[:limit] if limit else found
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, skip=0, **kwargs):
+        return MemoryCursor(self, filter, projection, sort, limit, skip)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = self._select(filter, sort_spec(sort), 1)
+        return project(docs[0], projection) if docs else None
+
+    def count_documents(self, filter, **kwargs):
+        return len(self._select(filter))
+
+    def estimated_document_count(self, **kwargs):
+        return len(self.documents)
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        for doc in self._select(filter):
+            for value in candidates(field_values(doc, key)):
+                if not isinstance(value, list) and value not in values:
+                    values.append(value)
+        return values
+
+    '''
+    Writes
+    '''
+
+    def _store(self, doc):
+        added = []
+        try:
+            for index in self.indexes.values():
+                index.add(doc)
+                added.append(index)
+        except DuplicateKeyError:
+            for index in added:
+                index.remove(doc)
+            raise
+        self.documents[doc["_id"]] = doc
+
+    def _unstore(self, doc):
+        for index in self.indexes.values():
+            index.remove(doc)
+        del self.documents[doc["_id"]]
+
+    def insert_one(self, document, **kwargs):
+        # like pymongo, the caller's document gets its _id
+        document.setdefault("_id", ObjectId())
+        self._store(copy.deepcopy(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        ids = [self.insert_one(document).inserted_id for document in documents]
+        return InsertManyResult(ids, True)
+
+    def _upsert_document(self, filter, update, replacement=False):
+        doc = upserted_document(filter, update, replacement)
+        doc.setdefault("_id", ObjectId())
+        self._store(doc)
+        return doc
+
+    def _modify(self, doc, update, replacement=False):
+        """Update a stored document, keeping the indexes in sync; True when it changed"""
+        before = copy.deepcopy(doc)
+        changed = updated_document(doc, update, replacement)
+        if changed == before:
+            return False
+        self._unstore(doc)
+        try:
+            self._store(changed)
+        except DuplicateKeyError:
+            self._store(before)
+            raise
+        return True
+
+    def _update(self, filter, update, upsert=False, many=False, replacement=False):
+        docs = self._select(filter, (), 0 if many else 1)
+        if not docs:
+            if upsert:
+                doc = self._upsert_document(filter, update, replacement)
+                return UpdateResult({"n": 1, "nModified": 0, "upserted": doc["_id"]}, True)
+            return UpdateResult({"n": 0, "nModified": 0}, True)
+        modified = sum(self._modify(doc, update, replacement) for doc in docs)
+        return UpdateResult({"n": len(docs), "nModified": modified}, True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert, many=True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update(filter, replacement, upsert, replacement=True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        docs = self._select(filter, sort_spec(sort), 1)
+        if not docs:
+            if not upsert:
+                return None
+            doc = self._upsert_document(filter, update)
+            return project(doc, projection) if return_document == ReturnDocument.AFTER else None
+        before = project(docs[0], projection)
+        self._modify(docs[0], update)
+        if return_document == ReturnDocument.AFTER:
+            return project(self.documents[docs[0]["_id"]], projection)
+        return before
+
+    def _delete(self, filter, many):
+        docs = self._select(filter, (), 0 if many else 1)
+        for doc in docs:
+            self._unstore(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    def delete_one(self, filter, **kwargs):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter, **kwargs):
+        return self._delete(filter, many=True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nUpserted": 0, "nRemoved": 0, "upserted": []}
+        for i, op in enumerate(requests):
+            kind = type(op).__name__
+            if kind == "InsertOne":
+                self.insert_one(op._doc)
+                result["nInserted"] += 1
+                continue
+            if kind in ("DeleteOne", "DeleteMany"):
+                result["nRemoved"] += self._delete(op._filter, kind == "DeleteMany").deleted_count
+                continue
+            outcome = self._update(op._filter, op._doc, op._upsert, many=kind == "UpdateMany",
+                                   replacement=kind == "ReplaceOne")
+            result["nMatched"] += outcome.matched_count
+            result["nModified"] += outcome.modified_count
+            if outcome.upserted_id is not None:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": i, "_id": outcome.upserted_id})
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline, **kwargs):
+        pipeline = list(pipeline)
+        merge = pipeline.pop()["$merge"] if pipeline and "$merge" in pipeline[-1] else None
+        docs = list(aggregate_documents((copy.deepcopy(doc) for doc in list(self.documents.values())), pipeline))
+        if merge is None:
+            return iter(docs)
+        target = self.database[merge_target(merge)]
+        for op in merge_operations(docs, merge):
+            target._update(op._filter, op._doc, op._upsert, replacement=isinstance(op, ReplaceOne))
+        return iter([])
+
+
+class MemoryDatabase:
+    """Collections are created on first access, like a MongoDB database"""
+
+    def __init__(self, name="memory"):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self._collections)
+
+    def drop_collection(self, name):
+        self._collections.pop(name, None)
+
+    def command(self, command, *args, **kwargs):
+        if command == "ping" or command == {"ping": 1}:
+            return {"ok": 1.0}
+        raise OperationFailure(f"no such command: {command!r} on the memory store", 59)
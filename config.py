@@ -29,20 +29,98 @@ class Config:
 
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
     MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'user_db')
+
+    # Connection pool of each worker process (the client is created on first use, per process)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0)) or None
     
     # Admin Configuration
     ADMIN_NAME = os.getenv("ADMINNAME", "admin") #admin is default username
     ADMIN_PASSWORD = os.getenv("ADMINPASSWORD", "Admin@123") #Admin@123 is default password
     ADMIN_ID = os.getenv("ADMINID", "admin-001") #admin-001 is default admin id
     
+    # Storage: "mongo", or "sql" to run a single node without MongoDB (db/sql_db.py, SQLite by default)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+    SQL_DATABASE_URI = os.getenv("SQL_DATABASE_URI", "sqlite:///inventory.db")
+    SQL_BUSY_TIMEOUT_MS = int(os.getenv("SQL_BUSY_TIMEOUT_MS", 5000))
+    # Apply the Alembic migrations when the app starts (python -m db.sql_db upgrade does the same)
+    SQL_AUTO_MIGRATE = os.getenv("SQL_AUTO_MIGRATE", "True") == "True"
+
+    # Create missing indexes when the app starts (python -m db.indexes does the same from the CLI)
+    MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "True") == "True"
+
+    # Cursor batch size used by the streaming export endpoints
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+    STOCK_ADJUST_CHUNK_SIZE = int(os.getenv("STOCK_ADJUST_CHUNK_SIZE", 1000))
+
+    # Reserve stock and insert orders in one multi-document transaction (needs a replica set)
+    ORDER_TRANSACTIONS = os.getenv("ORDER_TRANSACTIONS", "False") == "True"
+
+    # Product cache (per worker, invalidated across workers through the versions collection)
+    PRODUCT_CACHE_ENABLED = os.getenv("PRODUCT_CACHE_ENABLED", "True") == "True"
+    PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 10000))
+    PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 300))
+    PRODUCT_CACHE_VERSION_INTERVAL = float(os.getenv("PRODUCT_CACHE_VERSION_INTERVAL", 1.0))
+
+    # Password hashing: cost, or a target latency to calibrate the cost at startup
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", 0)) or None
+    BCRYPT_MIN_ROUNDS = 10
+    BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", 2))
+    BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", 16))
+    BCRYPT_TIMEOUT = 10
+
+    # Response compression (br/zstd need the brotli/zstandard packages, gzip is always there)
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "True") == "True"
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+    COMPRESS_BROTLI_LEVEL = int(os.getenv("COMPRESS_BROTLI_LEVEL", 4))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", 3))
+
+    # Background health prober behind /health/live and /health/ready
+    HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 5))
+    HEALTH_MAX_PING_MS = int(os.getenv("HEALTH_MAX_PING_MS", 500))
+    HEALTH_POOL_SATURATION = float(os.getenv("HEALTH_POOL_SATURATION", 0.9))
+
+    # Prometheus metrics: set METRICS_DIR to add up the values of every gunicorn worker
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Slow command log behind /admin/slow_queries and python -m utils.slow_queries
+    SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "True") == "True"
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+    SLOW_QUERY_FLUSH_INTERVAL = float(os.getenv("SLOW_QUERY_FLUSH_INTERVAL", 10))
+    SLOW_QUERY_EXPLAIN_TOP = int(os.getenv("SLOW_QUERY_EXPLAIN_TOP", 5))
+    SLOW_QUERY_EXPLAIN_EVERY = float(os.getenv("SLOW_QUERY_EXPLAIN_EVERY", 3600))
+
+    # Admin requests sent with X-Profile: 1 run under cProfile, see /admin/profiles
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True") == "True"
+    PROFILE_DIR = os.getenv("PROFILE_DIR")
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+    PROFILE_TOP = int(os.getenv("PROFILE_TOP", 30))
+
     # Rate Limiting
-    RATELIMIT_STORAGE_URI = "memory://"
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "fixed-window")
+    # size of the mmap:// table, about 32 bytes per counter: a full stripe refuses new clients
+    RATELIMIT_STORAGE_OPTIONS = {
+        "slots": int(os.getenv("RATELIMIT_MMAP_SLOTS", 262144)),
+        "windows": int(os.getenv("RATELIMIT_MMAP_WINDOWS", 4096)),
+        "window_size": int(os.getenv("RATELIMIT_MMAP_WINDOW_SIZE", 256))
+    }
     
 class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
-    MONGO_URI = 'mongodb://localhost:27017/'
-    MONGO_DB_NAME = 'user_db'
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'user_db')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
     
 class ProductionConfig(Config):
@@ -51,11 +129,15 @@ class ProductionConfig(Config):
     MONGO_URI = os.getenv('MONGO_URI')  # Required in production
     MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'user_db')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)  # Shorter for production
-    # RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'redis://localhost:6379/0')
+    BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", 250))
+    # one set of counters for every worker on the host, kept across worker restarts
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'mmap:///var/tmp/inventory-ratelimit.mmap')
 
     
 class TestingConfig(Config):
     TESTING = True
+    PRODUCT_CACHE_ENABLED = False
+    BCRYPT_ROUNDS = 4
     MONGO_URI = 'mongodb://localhost:27017'
     MONGO_DB_NAME = 'user_db_test'
     
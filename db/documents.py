@@ -0,0 +1,644 @@
+import copy
+import datetime
+import itertools
+import re
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+'''
+MongoDB document semantics in plain Python.
+
+Filters, update documents, projections and sort order evaluated the way
+the server does, for the stores that keep documents themselves: the
+in-process store of the benchmarks (benchmarks/memory_store.py) and the SQL
+backend (db/sql_db.py), which narrows with SQL and checks with ``matches``.
+
+Filters support equality (including array membership and dotted paths),
+$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$exists/$regex/$size/$elemMatch/$not and
+$and/$or/$nor; updates support $set/$unset/$inc/$min/$max/$push/$addToSet/
+$pull/$setOnInsert/$currentDate, and pipeline updates made of $set/
+$addFields/$unset stages with the expressions the order routes use.
+aggregate_documents runs the aggregation pipelines of the analytics and the
+rebuild jobs. Anything else raises UnsupportedOperation, an
+OperationFailure like the one the server answers for an unknown operator,
+so the callers' PyMongoError handling applies.
+'''
+
+_TYPE_ORDER = ((type(None), 0), (bool, 8), ((int, float), 1), (str, 2), (dict, 3), (list, 4), (ObjectId, 7),
+               (datetime.datetime, 9))
+_MISSING = object()
+
+
+class UnsupportedOperation(OperationFailure):
+    """An operator, stage or accumulator these semantics do not implement"""
+
+    def __init__(self, what, code=2):
+        super().__init__(f"{what} is not supported outside MongoDB", code)
+
+
+# every operator implemented below, by where it may appear; tests/test_sql_db.py fails when
+# the routes or utils use one that is missing
+OPERATORS = {
+    "query": {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$exists", "$regex", "$options", "$size",
+              "$elemMatch", "$not", "$and", "$or", "$nor"},
+    "update": {"$set", "$setOnInsert", "$unset", "$inc", "$min", "$max", "$currentDate", "$push", "$addToSet",
+               "$each", "$pull"},
+    "stage": {"$match", "$sort", "$limit", "$skip", "$project", "$set", "$addFields", "$unset", "$unwind", "$group",
+              "$count", "$merge"},
+    "expression": {"$literal", "$let", "$map", "$cond", "$dateToString", "$ifNull", "$sum", "$add", "$subtract",
+                   "$multiply", "$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$size", "$range", "$arrayElemAt",
+                   "$indexOfArray", "$arrayToObject", "$mergeObjects"},
+    "accumulator": {"$sum", "$count", "$avg", "$first", "$last", "$push", "$addToSet", "$min", "$max"},
+}
+
+
+def sort_key(value):
+    for types, rank in _TYPE_ORDER:
+        if isinstance(value, types):
+            return (rank, value) if rank not in (3, 4) else (rank, repr(value))
+    return (10, repr(value))
+
+
+def field_values(doc, path):
+    """Every value at ``path`` (arrays on the way are traversed), [] when missing"""
+    current = [doc]
+    for part in path.split("."):
+        found = []
+        for value in current:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+        current = found
+    return current
+
+
+def candidates(values):
+    """Values compared by a query: the values themselves and the elements of arrays"""
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _compare(values, operand, test):
+    rank = sort_key(operand)[0]
+    return any(sort_key(v)[0] == rank and test(sort_key(v), sort_key(operand)) for v in candidates(values))
+
+
+def _equals(values, operand):
+    return any(v == operand for v in candidates(values)) or (operand is None and not values)
+
+
+def _match_operators(values, condition):
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = _equals(values, operand)
+        elif op == "$ne":
+            ok = not _equals(values, operand)
+        elif op == "$gt":
+            ok = _compare(values, operand, lambda a, b: a > b)
+        elif op == "$gte":
+            ok = _compare(values, operand, lambda a, b: a >= b)
+        elif op == "$lt":
+            ok = _compare(values, operand, lambda a, b: a < b)
+        elif op == "$lte":
+            ok = _compare(values, operand, lambda a, b: a <= b)
+        elif op == "$in":
+            ok = any(_equals(values, o) for o in operand)
+        elif op == "$nin":
+            ok = not any(_equals(values, o) for o in operand)
+        elif op == "$exists":
+            ok = bool(values) == bool(operand)
+        elif op == "$regex":
+            flags = re.I if "i" in condition.get("$options", "") else 0
+            pattern = operand if hasattr(operand, "search") else re.compile(operand, flags)
+            ok = any(isinstance(v, str) and pattern.search(v) for v in candidates(values))
+        elif op == "$options":
+            ok = True
+        elif op == "$size":
+            ok = any(isinstance(v, list) and len(v) == operand for v in values)
+        elif op == "$elemMatch":
+            ok = any(isinstance(v, list) and any(_element_matches(e, operand) for e in v) for v in values)
+        elif op == "$not":
+            ok = not _match_condition(values, operand)
+        else:
+            raise UnsupportedOperation(f"query operator {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _element_matches(element, condition):
+    """$elemMatch/$pull: a sub-filter on a document element, or operators/a value on a scalar one"""
+    if not isinstance(condition, dict):
+        return element == condition
+    if isinstance(element, dict) and not any(k.startswith("$") for k in condition):
+        return matches(element, condition)
+    return _match_operators([element], condition)
+
+
+def _match_condition(values, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        return _match_operators(values, condition)
+    if hasattr(condition, "search"):
+        return _match_operators(values, {"$regex": condition})
+    return _equals(values, condition)
+
+
+def matches(doc, query):
+    """Whether ``doc`` matches the ``query`` filter"""
+    for key, condition in query.items():
+        if key == "$and":
+            ok = all(matches(doc, q) for q in condition)
+        elif key == "$or":
+            ok = any(matches(doc, q) for q in condition)
+        elif key == "$nor":
+            ok = not any(matches(doc, q) for q in condition)
+        elif key.startswith("$"):
+            raise UnsupportedOperation(f"query operator {key}")
+        else:
+            ok = _match_condition(field_values(doc, key), condition)
+        if not ok:
+            return False
+    return True
+
+
+def _parent(doc, path, create=True):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if isinstance(doc, list):
+            doc = doc[int(part)]
+            continue
+        if part not in doc:
+            if not create:
+                return None, parts[-1]
+            doc[part] = {}
+        doc = doc[part]
+    return doc, parts[-1]
+
+
+def get_path(doc, path):
+    parent, key = _parent(doc, path, create=False)
+    if parent is None:
+        return _MISSING
+    if isinstance(parent, list):
+        return parent[int(key)] if key.isdigit() and int(key) < len(parent) else _MISSING
+    return parent.get(key, _MISSING)
+
+
+def set_path(doc, path, value):
+    parent, key = _parent(doc, path)
+    if isinstance(parent, list):
+        parent[int(key)] = value
+    else:
+        parent[key] = value
+
+
+def _each(operand):
+    return operand["$each"] if isinstance(operand, dict) and "$each" in operand else [operand]
+
+
+def apply_update(doc, update, inserting=False):
+    """Apply an update document in place"""
+    if isinstance(update, list):
+        apply_pipeline(doc, update)
+        return
+    for op, fields in update.items():
+        for path, operand in fields.items():
+            current = get_path(doc, path)
+            if op == "$set":
+                set_path(doc, path, copy.deepcopy(operand))
+            elif op == "$setOnInsert":
+                if inserting:
+                    set_path(doc, path, copy.deepcopy(operand))
+            elif op == "$unset":
+                parent, key = _parent(doc, path, create=False)
+                if isinstance(parent, dict):
+                    parent.pop(key, None)
+            elif op == "$inc":
+                set_path(doc, path, (0 if current is _MISSING else current) + operand)
+            elif op == "$min":
+                if current is _MISSING or sort_key(operand) < sort_key(current):
+                    set_path(doc, path, operand)
+            elif op == "$max":
+                if current is _MISSING or sort_key(operand) > sort_key(current):
+                    set_path(doc, path, operand)
+            elif op == "$currentDate":
+                set_path(doc, path, datetime.datetime.now())
+            elif op in ("$push", "$addToSet"):
+                array = [] if current is _MISSING else current
+                for value in _each(operand):
+                    if op == "$push" or value not in array:
+                        array.append(copy.deepcopy(value))
+                set_path(doc, path, array)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    set_path(doc, path, [v for v in current if not _element_matches(v, operand)])
+            else:
+                raise UnsupportedOperation(f"update operator {op}", 9)
+
+
+def upserted_document(filter, update, replacement=False):
+    """The document an upsert inserts when ``filter`` matched nothing (``_id`` may still be missing)"""
+    if replacement:
+        doc = copy.deepcopy(update)
+    else:
+        doc = {}
+        for key, condition in filter.items():
+            if key.startswith("$"):
+                continue
+            if isinstance(condition, dict) and all(k.startswith("$") for k in condition):
+                if "$eq" in condition:
+                    set_path(doc, key, copy.deepcopy(condition["$eq"]))
+                continue
+            set_path(doc, key, copy.deepcopy(condition))
+        apply_update(doc, update, inserting=True)
+    if "_id" not in doc and "_id" in filter and not isinstance(filter["_id"], dict):
+        doc["_id"] = filter["_id"]
+    return doc
+
+
+def updated_document(doc, update, replacement=False):
+    """A copy of ``doc`` with ``update`` (or the ``replacement`` document) applied, keeping its _id"""
+    if replacement:
+        changed = copy.deepcopy(update)
+        changed["_id"] = doc["_id"]
+    else:
+        changed = copy.deepcopy(doc)
+        apply_update(changed, update)
+    return changed
+
+
+def project(doc, projection, shared=True):
+    """A copy of ``doc`` with the pymongo ``projection`` (dict or list of fields) applied
+
+    ``shared=False`` when nothing else holds ``doc`` (a freshly decoded row):
+    it is projected without copying.
+    """
+    clone = copy.deepcopy if shared else (lambda value: value)
+    if not projection:
+        return clone(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        result = {}
+        for path in fields:
+            _copy_path(doc, result, path.split("."))
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return clone(result)
+    result = clone(doc)
+    for path in fields:
+        parent, key = _parent(result, path, create=False)
+        if isinstance(parent, dict):
+            parent.pop(key, None)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _copy_path(source, target, parts):
+    head = parts[0]
+    if head not in source:
+        return
+    value = source[head]
+    if len(parts) == 1:
+        target[head] = value
+    elif isinstance(value, dict):
+        _copy_path(value, target.setdefault(head, {}), parts[1:])
+    elif isinstance(value, list):
+        items = target.setdefault(head, [{} for _ in value])
+        for item, element in zip(items, value):
+            if isinstance(element, dict):
+                _copy_path(element, item, parts[1:])
+
+
+def sort_spec(sort):
+    if sort is None:
+        return []
+    if isinstance(sort, str):
+        return [(sort, 1)]
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return [tuple(s) for s in sort]
+
+
+def first_value(doc, path):
+    values = field_values(doc, path)
+    return values[0] if values else None
+
+
+'''
+Pipeline updates
+'''
+
+
+def apply_pipeline(doc, pipeline):
+    """Apply an update pipeline in place; each stage sees the document left by the previous one"""
+    for stage in pipeline:
+        for op, spec in stage.items():
+            if op in ("$set", "$addFields"):
+                # every expression of a stage reads the document as it was before the stage
+                values = {path: evaluate(expression, doc) for path, expression in spec.items()}
+                for path, value in values.items():
+                    set_path(doc, path, value)
+            elif op == "$unset":
+                for path in [spec] if isinstance(spec, str) else spec:
+                    parent, key = _parent(doc, path, create=False)
+                    if isinstance(parent, dict):
+                        parent.pop(key, None)
+            else:
+                raise UnsupportedOperation(f"pipeline update stage {op}", 40324)
+
+
+def _path_value(value, parts):
+    """Aggregation field path: arrays on the way give the array of their elements' values"""
+    for i, part in enumerate(parts):
+        if isinstance(value, list):
+            return [v for v in (_path_value(e, parts[i:]) for e in value if isinstance(e, dict)) if v is not None]
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def evaluate(expression, doc, variables=None):
+    """Value of an aggregation expression against ``doc``"""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, *parts = expression[2:].split(".")
+        return _path_value(variables[name] if name != "ROOT" else doc, parts)
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _path_value(doc, expression[1:].split("."))
+    if isinstance(expression, list):
+        return [evaluate(e, doc, variables) for e in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) == 1:
+        op, operand = next(iter(expression.items()))
+        if op.startswith("$"):
+            return _operator(op, operand, doc, variables)
+    return {key: evaluate(value, doc, variables) for key, value in expression.items()}
+
+
+def _operator(op, operand, doc, variables):
+    if op == "$literal":
+        return operand
+    if op == "$let":
+        scope = dict(variables)
+        scope.update({name: evaluate(e, doc, variables) for name, e in operand["vars"].items()})
+        return evaluate(operand["in"], doc, scope)
+    if op == "$map":
+        items = evaluate(operand["input"], doc, variables)
+        name = operand.get("as", "this")
+        return None if items is None else [evaluate(operand["in"], doc, {**variables, name: item}) for item in items]
+    if op == "$cond":
+        if isinstance(operand, dict):
+            operand = [operand["if"], operand["then"], operand["else"]]
+        branch = operand[1] if _truthy(evaluate(operand[0], doc, variables)) else operand[2]
+        return evaluate(branch, doc, variables)
+    if op == "$dateToString":
+        date = evaluate(operand["date"], doc, variables)
+        if date is None:
+            return evaluate(operand.get("onNull"), doc, variables)
+        # %L is the milliseconds, the other specifiers are strftime's
+        return date.strftime(operand.get("format", "%Y-%m-%dT%H:%M:%S.%LZ").replace("%L", f"{date.microsecond // 1000:03d}"))
+    if op == "$ifNull":
+        for e in operand:
+            value = evaluate(e, doc, variables)
+            if value is not None:
+                return value
+        return None
+
+    # a single argument may be given without the list around it
+    args = [evaluate(e, doc, variables) for e in operand] if isinstance(operand, list) else [evaluate(operand, doc, variables)]
+    if op == "$sum":
+        # a single array argument sums its elements
+        numbers = args[0] if len(args) == 1 and isinstance(args[0], list) else args
+        return sum(n for n in numbers if isinstance(n, (int, float)) and not isinstance(n, bool))
+    if op == "$add":
+        return None if None in args else sum(args)
+    if op == "$subtract":
+        return None if None in args else args[0] - args[1]
+    if op == "$multiply":
+        if None in args:
+            return None
+        product = 1
+        for n in args:
+            product *= n
+        return product
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = sort_key(args[0]), sort_key(args[1])
+        return {"$eq": a == b, "$ne": a != b, "$gt": a > b, "$gte": a >= b, "$lt": a < b, "$lte": a <= b}[op]
+    if op == "$size":
+        return len(args[0])
+    if op == "$range":
+        return list(range(*args))
+    if op == "$arrayElemAt":
+        array, index = args
+        if array is None or not -len(array) <= index < len(array):
+            return None
+        return array[index]
+    if op == "$indexOfArray":
+        array, value = args[0], args[1]
+        return next((i for i, v in enumerate(array or []) if v == value), -1)
+    if op == "$arrayToObject":
+        pairs = args[0]
+        return None if pairs is None else dict((p["k"], p["v"]) if isinstance(p, dict) else tuple(p) for p in pairs)
+    if op == "$mergeObjects":
+        merged = {}
+        for value in args:
+            merged.update(value or {})
+        return merged
+    raise UnsupportedOperation(f"expression operator {op}", 168)
+
+
+def _truthy(value):
+    return value not in (None, False, 0) and value is not _MISSING
+
+
+'''
+Aggregation
+'''
+
+
+def aggregate_documents(docs, pipeline):
+    """Documents out of ``pipeline`` run over ``docs`` (which it may modify).
+
+    Stages: $match, $sort, $limit, $skip, $project, $set/$addFields/$unset,
+    $unwind, $group and $count. A $merge stage is left to the store, see
+    merge_operations.
+    """
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = _matching(docs, spec)
+        elif op == "$sort":
+            docs = _sorted(docs, spec)
+        elif op == "$limit":
+            docs = itertools.islice(docs, spec)
+        elif op == "$skip":
+            docs = itertools.islice(docs, spec, None)
+        elif op == "$project":
+            docs = _projected(docs, spec)
+        elif op in ("$set", "$addFields", "$unset"):
+            docs = _staged(docs, stage)
+        elif op == "$unwind":
+            docs = _unwound(docs, spec)
+        elif op == "$group":
+            docs = _grouped(docs, spec)
+        elif op == "$count":
+            docs = iter([{spec: sum(1 for _ in docs)}])
+        else:
+            raise UnsupportedOperation(f"aggregation stage {op}", 40324)
+    return docs
+
+
+def merge_operations(docs, spec):
+    """The upserts a ``$merge`` stage with ``spec`` makes for ``docs`` in its target collection"""
+    on = spec.get("on", "_id")
+    on = [on] if isinstance(on, str) else on
+    when_matched = spec.get("whenMatched", "merge")
+    upsert = spec.get("whenNotMatched", "insert") == "insert"
+    if when_matched not in ("replace", "merge", "keepExisting") or spec.get("whenNotMatched", "insert") not in ("insert", "discard"):
+        raise UnsupportedOperation(f"$merge {when_matched}/{spec.get('whenNotMatched')}")
+    for doc in docs:
+        filter = {field: first_value(doc, field) for field in on}
+        if when_matched == "replace":
+            yield ReplaceOne(filter, doc, upsert=upsert)
+        elif when_matched == "merge":
+            fields = {k: v for k, v in doc.items() if k != "_id" or "_id" in on}
+            yield UpdateOne(filter, {"$set": fields}, upsert=upsert)
+        else:
+            yield UpdateOne(filter, {"$setOnInsert": doc}, upsert=upsert)
+
+
+def merge_target(spec):
+    """Name of the collection a ``$merge`` stage writes to"""
+    into = spec["into"]
+    return into if isinstance(into, str) else into["coll"]
+
+
+def _matching(docs, query):
+    return (doc for doc in docs if matches(doc, query))
+
+
+def _sorted(docs, spec):
+    docs = list(docs)
+    for field, direction in reversed(sort_spec(spec)):
+        docs.sort(key=lambda doc: sort_key(first_value(doc, field)), reverse=direction == -1)
+    return docs
+
+
+def _included(value):
+    return isinstance(value, (bool, int)) and not isinstance(value, float) and bool(value)
+
+
+def _projected(docs, spec):
+    fields = {k: v for k, v in spec.items() if k != "_id"}
+    exclusion = all(isinstance(v, (bool, int)) and not v for v in spec.values())
+    for doc in docs:
+        if exclusion:
+            yield project(doc, spec, shared=False)
+            continue
+        result = {}
+        id_spec = spec.get("_id", 1)
+        if _included(id_spec):
+            if "_id" in doc:
+                result["_id"] = doc["_id"]
+        elif not isinstance(id_spec, (bool, int)):
+            result["_id"] = evaluate(id_spec, doc)
+        for path, value in fields.items():
+            if _included(value):
+                _copy_path(doc, result, path.split("."))
+            else:
+                set_path(result, path, evaluate(value, doc))
+        yield result
+
+
+def _staged(docs, stage):
+    for doc in docs:
+        apply_pipeline(doc, [stage])
+        yield doc
+
+
+def _unwound(docs, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    for doc in docs:
+        value = get_path(doc, path)
+        if isinstance(value, list) and value:
+            for element in value:
+                # only the unwound path differs between the copies
+                unwound = copy.copy(doc) if "." not in path else copy.deepcopy(doc)
+                set_path(unwound, path, element)
+                yield unwound
+        elif value is _MISSING or value is None or value == []:
+            if keep_empty:
+                yield doc
+        else:
+            yield doc
+
+
+def _group_key(value):
+    """Hashable form of a group _id; 1 and 1.0 group together as on the server, True and 1 do not"""
+    if isinstance(value, dict):
+        return ("object", tuple((k, _group_key(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("array", tuple(_group_key(v) for v in value))
+    return sort_key(value)[0], value
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _grouped(docs, spec):
+    accumulators = {name: next(iter(acc.items())) for name, acc in spec.items() if name != "_id"}
+    groups = {}
+    for doc in docs:
+        key = evaluate(spec["_id"], doc)
+        group = groups.get(_group_key(key))
+        if group is None:
+            group = groups[_group_key(key)] = {"_id": key}
+        for name, (op, expression) in accumulators.items():
+            value = evaluate(expression, doc) if op != "$count" else 1
+            if op in ("$sum", "$count"):
+                group[name] = group.get(name, 0) + (value if _number(value) else 0)
+            elif op == "$avg":
+                total, count = group.get(name, (0, 0))
+                group[name] = (total + value, count + 1) if _number(value) else (total, count)
+            elif op == "$first":
+                group.setdefault(name, value)
+            elif op == "$last":
+                group[name] = value
+            elif op == "$push":
+                group.setdefault(name, []).append(value)
+            elif op == "$addToSet":
+                values = group.setdefault(name, [])
+                if value not in values:
+                    values.append(value)
+            elif op in ("$min", "$max"):
+                current = group.get(name)
+                if value is not None and (current is None or (sort_key(value) < sort_key(current)) == (op == "$min")):
+                    group[name] = value
+                else:
+                    group.setdefault(name, None)
+            else:
+                raise UnsupportedOperation(f"accumulator {op}", 15952)
+    for group in groups.values():
+        for name, (op, _) in accumulators.items():
+            if op == "$avg":
+                total, count = group[name]
+                group[name] = total / count if count else None
+        yield group
@@ -0,0 +1,135 @@
+import argparse
+import logging
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+'''
+Declared indexes for every query shape used by the routes.
+
+Keyed by collection name. Index names are explicit so drift can be
+reported by name instead of guessing from the key pattern.
+'''
+
+INDEXES = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("user_name", ASCENDING)], name="user_name_unique", unique=True),
+    ],
+    "products": [
+        IndexModel([("sku", ASCENDING)], name="sku_unique", unique=True),
+        IndexModel([("product_id", ASCENDING)], name="product_id_unique", unique=True),
+        # keyset pagination of /product/get_products filtered by type
+        IndexModel([("product_type", ASCENDING), ("sku", ASCENDING)], name="product_type_sku"),
+    ],
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+    ],
+    "order_summaries": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        # newest first pages of /orders/user_order_summaries
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)],
+                   name="user_id_created_at_order_id"),
+    ],
+    # sales_daily is keyed by its _id (the day)
+    "sales_product_daily": [
+        IndexModel([("day", ASCENDING), ("product_id", ASCENDING)], name="day_product_id_unique", unique=True),
+    ],
+    # report of utils/slow_queries.py, slowest first
+    "slow_queries": [
+        IndexModel([("total_ms", DESCENDING)], name="total_ms"),
+    ],
+}
+
+
+def _normalize(spec):
+    """Reduce an index spec to the parts we compare (key pattern and options)"""
+    key = spec.get("key", {})
+    if isinstance(key, dict):
+        key = list(key.items())
+    return {
+        "key": [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+                for field, direction in key],
+        "unique": bool(spec.get("unique", False)),
+        "partialFilterExpression": spec.get("partialFilterExpression"),
+    }
+
+
+def index_drift(db, indexes=None):
+    """Compare declared indexes with the ones present in the database.
+
+    Returns a dict per collection with ``missing``, ``mismatched`` and
+    ``extra`` index names. Collections without drift are left out.
+    """
+    indexes = INDEXES if indexes is None else indexes
+    report = {}
+    for collection_name, models in indexes.items():
+        existing = db[collection_name].index_information()
+        declared = {m.document["name"]: _normalize(m.document) for m in models}
+        actual = {name: _normalize(spec) for name, spec in existing.items() if name != "_id_"}
+
+        missing = [name for name in declared if name not in actual]
+        mismatched = [name for name in declared if name in actual and declared[name] != actual[name]]
+        extra = [name for name in actual if name not in declared]
+
+        if missing or mismatched or extra:
+            report[collection_name] = {
+                "missing": missing,
+                "mismatched": mismatched,
+                "extra": extra,
+            }
+    return report
+
+
+def ensure_indexes(db, indexes=None):
+    """Create every declared index that does not exist yet.
+
+    Safe to run on every startup: existing indexes are left alone and
+    mismatched or extra ones are only reported, never dropped.
+    Returns the drift report computed before the missing indexes were created.
+    """
+    indexes = INDEXES if indexes is None else indexes
+    report = index_drift(db, indexes)
+    for collection_name, drift in report.items():
+        to_create = [m for m in indexes[collection_name] if m.document["name"] in drift["missing"]]
+        if to_create:
+            db[collection_name].create_indexes(to_create)
+            logging.info(f"Created indexes on {collection_name}: {[m.document['name'] for m in to_create]}")
+        if drift["mismatched"] or drift["extra"]:
+            logging.warning(f"Index drift on {collection_name}: mismatched={drift['mismatched']} extra={drift['extra']}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or verify the declared MongoDB indexes")
+    parser.add_argument("--check", action="store_true",
+                        help="only report drift, do not create anything (exit code 1 on drift)")
+    args = parser.parse_args(argv)
+
+    from db.mongo_db import db
+
+    try:
+        report = index_drift(db) if args.check else ensure_indexes(db)
+    except PyMongoError as e:
+        print(f"Index bootstrap failed: {e}")
+        return 2
+
+    if not report:
+        print("Indexes are in sync")
+        return 0
+
+    for collection_name, drift in report.items():
+        print(f"{collection_name}:")
+        for kind in ("missing", "mismatched", "extra"):
+            if drift[kind]:
+                print(f"  {kind}: {', '.join(drift[kind])}")
+
+    if args.check:
+        return 1
+    # missing indexes were created, only mismatched/extra are still drift
+    return 1 if any(d["mismatched"] or d["extra"] for d in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,53 +6,242 @@ load_dotenv(find_dotenv())
 # client = MongoClient("mongodb://localhost:27017")
 # db = client["user_db"]
 
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-import os
+from pymongo import MongoClient, AsyncMongoClient
+from pymongo.errors import PyMongoError
+from pymongo.database import Database as MongoDatabase
 import logging
+import re
+import threading
+from db.pool_stats import pool_stats
+
+'''
+Per-process MongoDB clients.
+
+Nothing connects at import time: the client is created on first use and
+belongs to the process that created it. A forked gunicorn worker (with or
+without --preload) drops the client it inherited and lazily creates its own,
+so no pool, monitor thread or socket is ever shared across processes.
+
+``db`` and every ``db.<collection>`` captured by the route modules are
+proxies resolved against the current process's client on each use. The URI,
+the database name and the pool settings come from config.py (MONGO_URI,
+MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE and the
+MONGO_*_TIMEOUT_MS timeouts), applied by create_app through init_app.
+
+With STORAGE_BACKEND=sql the same proxies resolve to the SQL backend of
+db/sql_db.py instead (SQL_DATABASE_URI, one engine per process), so the
+routes run unchanged on either store.
+'''
+
+def redact_uri(uri):
+    """``uri`` without the credentials, for logs"""
+    return re.sub(r"//[^/@]*@", "//***@", uri or "")
+
+
+# pool settings used until init_app is called (CLI tools, benchmarks)
+DEFAULT_POOL_SETTINGS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 10,
+    "serverSelectionTimeoutMS": 5000,
+    "connectTimeoutMS": 10000,
+    "socketTimeoutMS": None,
+    "waitQueueTimeoutMS": None,
+}
+
 
 class Database:
     _instance = None
     _client = None
     _db = None
+    _async_client = None
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
+            cls._instance._pid = None
+            cls._instance._async_pid = None
+            # bumped whenever the client is replaced, so the proxies drop what they resolved
+            cls._instance.generation = 0
+            cls._instance.pool_settings = dict(DEFAULT_POOL_SETTINGS)
+            # the environment until init_app is called
+            cls._instance.mongo_uri = os.getenv("MONGO_URI")
+            cls._instance.db_name = os.getenv("MONGO_DB_NAME", "user_db")
+            cls._instance._lock = threading.Lock()
+            cls._instance.backend = os.getenv("STORAGE_BACKEND", "mongo")
+            cls._instance.sql_uri = os.getenv("SQL_DATABASE_URI", "sqlite:///inventory.db")
+            cls._instance.sql_busy_timeout_ms = 5000
+            cls._instance._sql = None
+            cls._instance._sql_pid = None
         return cls._instance
-    
+
+    def init_app(self, app):
+        """Read the URI, database name and pool settings from the app config (before the first query of this process)"""
+        self.mongo_uri = app.config.get("MONGO_URI") or self.mongo_uri
+        self.db_name = app.config.get("MONGO_DB_NAME") or self.db_name
+        self.pool_settings = {
+            "maxPoolSize": app.config.get("MONGO_MAX_POOL_SIZE", 50),
+            "minPoolSize": app.config.get("MONGO_MIN_POOL_SIZE", 10),
+            "serverSelectionTimeoutMS": app.config.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+            "connectTimeoutMS": app.config.get("MONGO_CONNECT_TIMEOUT_MS", 10000),
+            "socketTimeoutMS": app.config.get("MONGO_SOCKET_TIMEOUT_MS"),
+            "waitQueueTimeoutMS": app.config.get("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        }
+        self.sql_busy_timeout_ms = app.config.get("SQL_BUSY_TIMEOUT_MS", 5000)
+        self.use_backend(app.config.get("STORAGE_BACKEND", "mongo"), app.config.get("SQL_DATABASE_URI"))
+
+    def use_backend(self, backend, sql_uri=None):
+        """Switch the store behind ``db`` ("mongo" or "sql"); the proxies resolve again on next use"""
+        if backend not in ("mongo", "sql"):
+            raise ValueError(f"Unknown storage backend {backend!r}")
+        with self._lock:
+            if backend == self.backend and (sql_uri or self.sql_uri) == self.sql_uri:
+                return
+            self.backend = backend
+            self.sql_uri = sql_uri or self.sql_uri
+            self._drop_sql()
+            self.generation += 1
+
+    def _client_options(self):
+        return {k: v for k, v in self.pool_settings.items() if v is not None}
+
     def connect(self):
-        if self._client is None:
-            try:
-                # mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-                mongo_uri = os.getenv('MONGO_URI')
-                print(f"Connecting to MongoDB at: {mongo_uri}")
-                self._client = MongoClient(
-                    mongo_uri,
-                    maxPoolSize=50,
-                    minPoolSize=10,
-                    serverSelectionTimeoutMS=5000,
-                    connectTimeoutMS=10000,
-                    retryWrites=True
-                )
-                # Test connection
-                self._client.admin.command('ping')
-                logging.info("MongoDB connected successfully")
-            except ConnectionFailure as e:
-                logging.error(f"MongoDB connection failed: {e}")
-                raise
+        """The MongoClient of this process, created on first use (no network round trip)"""
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    logging.info(f"Connecting to MongoDB at {redact_uri(self.mongo_uri)} (pid {os.getpid()})")
+                    # an inherited client is dropped, never closed: its sockets belong to the parent
+                    pool_stats.reset()
+                    self._client = MongoClient(self.mongo_uri, retryWrites=True, event_listeners=[pool_stats],
+                                               **self._client_options())
+                    self._db = None
+                    self._pid = os.getpid()
+                    self.generation += 1
         return self._client
-    
+
+    def connect_sql(self):
+        """The SqlDatabase of this process, its engine created on first use"""
+        if self._sql is None or self._sql_pid != os.getpid():
+            with self._lock:
+                if self._sql is None or self._sql_pid != os.getpid():
+                    from db.sql_db import SqlDatabase
+                    self._sql = SqlDatabase(self.sql_uri, self.sql_busy_timeout_ms)
+                    self._sql_pid = os.getpid()
+                    self.generation += 1
+        return self._sql
+
+    def _drop_sql(self):
+        if self._sql is not None:
+            # an inherited engine is dropped, never closed: its connections belong to the parent
+            self._sql.engine.dispose(close=self._sql_pid == os.getpid())
+        self._sql = None
+
     def get_database(self, db_name=None):
+       if self.backend == "sql":
+           return self.connect_sql()
        if db_name is None:
-            # Use your actual database name as default
-            db_name = os.getenv('MONGO_DB_NAME', 'user_db')
-            print(f"Using database name: {db_name}")
-        
+            db_name = self.db_name
+
        client = self.connect()
-       self._db = client[db_name]
-        
+       if self._db is None or self._db.name != db_name:
+           self._db = client[db_name]
+
     #    logger.info(f"Using database: {db_name}")
        return self._db
 
+    def warm(self):
+        """Connect and ping, so the pool fills up to minPoolSize before the first request"""
+        try:
+            self.get_database().command('ping')
+            logging.info("MongoDB connected successfully")
+            return True
+        except PyMongoError as e:
+            logging.error(f"MongoDB connection failed: {e}")
+            return False
+
+    def close(self):
+        """Close this process's client, e.g. in the gunicorn master before it forks"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._db = None
+            self._drop_sql()
+            self.generation += 1
+
+    def _after_fork(self):
+        # the lock may have been held by another thread of the parent while forking
+        self._lock = threading.Lock()
+        self._client = None
+        self._db = None
+        self._async_client = None
+        self._drop_sql()
+        self.generation += 1
+
+    def connect_async(self):
+        """AsyncMongoClient for the async (ASGI) handlers, same pool settings as the sync one"""
+        if self._async_client is None or self._async_pid != os.getpid():
+            # no ping here: the client connects lazily on the event loop that first uses it
+            self._async_client = AsyncMongoClient(self.mongo_uri, retryWrites=True, **self._client_options())
+            self._async_pid = os.getpid()
+        return self._async_client
+
+    def get_async_database(self, db_name=None):
+        if db_name is None:
+            db_name = self.db_name
+        return self.connect_async()[db_name]
+
+
+class LazyCollection:
+    """Stands for ``db.<name>`` of the current process's client"""
+
+    def __init__(self, database, name):
+        self._database = database
+        self._name = name
+        self._resolved = (None, None)
+
+    def _collection(self):
+        generation, collection = self._resolved
+        if collection is None or generation != db_instance.generation:
+            database = self._database._get()
+            collection = database[self._name]
+            self._resolved = (db_instance.generation, collection)
+        return collection
+
+    def __getattr__(self, attr):
+        return getattr(self._collection(), attr)
+
+    def __getitem__(self, name):
+        return self._collection()[name]
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
+
+
+class LazyDatabase:
+    """Stands for the default database: collections and database methods resolve on use"""
+
+    def __init__(self, instance):
+        self._instance = instance
+        self._collections = {}
+
+    def _get(self):
+        return self._instance.get_database()
+
+    def __getattr__(self, name):
+        if name.startswith("_") or hasattr(MongoDatabase, name):
+            return getattr(self._get(), name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = LazyCollection(self, name)
+        return self._collections[name]
+
+    def __repr__(self):
+        return "LazyDatabase()"
+
+
 db_instance = Database()
-db = db_instance.get_database()
\ No newline at end of file
+db = LazyDatabase(db_instance)
+
+os.register_at_fork(after_in_child=db_instance._after_fork)
@@ -0,0 +1,72 @@
+import threading
+from pymongo.monitoring import ConnectionPoolListener
+
+'''
+Connection pool counters of this process's MongoClient, fed by pymongo's
+pool events (the pool itself exposes no public statistics).
+'''
+
+
+class PoolStats(ConnectionPoolListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start over, e.g. in a forked worker whose client is new"""
+        with self._lock:
+            self.open = 0
+            self.checked_out = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pools_cleared": self.pools_cleared
+            }
+
+    def _add(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def connection_created(self, event):
+        self._add("open")
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_checked_out(self, event):
+        self._add("checked_out")
+
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures")
+
+    def pool_cleared(self, event):
+        self._add("pools_cleared")
+
+    # the remaining events carry nothing we count
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+pool_stats = PoolStats()
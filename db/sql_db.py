@@ -0,0 +1,668 @@
+import argparse
+import json
+import logging
+import operator
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from bson import ObjectId, json_util
+from pymongo import InsertOne, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from sqlalchemy import (Boolean, Column, DateTime, Float, Index, MetaData, String, Table, Text, create_engine, delete,
+                        event, func, inspect, insert, or_, select, update)
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from db.documents import (aggregate_documents, candidates, field_values, first_value, matches, merge_operations,
+                          merge_target, project, sort_key, sort_spec, updated_document, upserted_document)
+
+'''
+SQL storage backend for single-node deployments (STORAGE_BACKEND=sql).
+
+Serves the same collection API as pymongo (find/find_one/insert/update/
+replace/delete, find_one_and_update, bulk_write, count_documents) on top of
+SQLAlchemy, SQLite by default, so the routes and the utils they call run
+unchanged on either backend. Every collection is a table of documents: the
+``document`` column holds the whole document as Extended JSON, and the
+fields the routes filter and sort on are copied into typed, indexed
+columns, with the index names of db/indexes.py (prefixed with the table:
+SQL index names are global). Collections without a
+table of their own (versions, sales_daily) share the ``documents`` table.
+
+A query is narrowed in SQL on those columns (equality, $in, $ne and ranges,
+ORDER BY when every sort key is a column, LIMIT when the whole filter ran
+in SQL) and checked with db/documents.py for the rest. Columns only hold
+values of their type: a field that holds anything else (an array, a
+number in a string column) is NULL there and cannot be found by that
+field. Every write runs in its own transaction; on SQLite it starts with
+BEGIN IMMEDIATE, so read-modify-write updates are serialized across
+workers the way single-document updates are atomic in MongoDB. Errors are
+raised as pymongo errors (DuplicateKeyError, BulkWriteError,
+OperationFailure) so the callers' error handling is the same.
+
+The schema is managed by the Alembic migrations in migrations/:
+``python -m db.sql_db upgrade`` (or ``alembic upgrade head``), run at
+startup when SQL_AUTO_MIGRATE is set. aggregate runs the pipelines of
+db/documents.py, a leading $match in SQL and a final $merge in one
+transaction.
+
+Not available on SQL: multi-document transactions (ORDER_TRANSACTIONS) and
+the async mode of asgi.py, both refused at startup, and the slow query log
+and MongoDB command/pool metrics, which come from pymongo's monitoring.
+'''
+
+metadata = MetaData()
+
+
+def _documents_table(name, *columns):
+    return Table(name, metadata, Column("_id", String, primary_key=True), *columns,
+                 Column("document", Text, nullable=False))
+
+
+users = _documents_table(
+    "users",
+    Column("user_id", String),
+    Column("user_name", String),
+    Index("users_user_id_unique", "user_id", unique=True),
+    Index("users_user_name_unique", "user_name", unique=True),
+)
+products = _documents_table(
+    "products",
+    Column("sku", String),
+    Column("product_id", String),
+    Column("product_type", String),
+    Column("product_price", Float),
+    Column("is_active", Boolean),
+    # the conditional stock updates filter on it
+    Column("quantity_present", Float),
+    Index("products_sku_unique", "sku", unique=True),
+    Index("products_product_id_unique", "product_id", unique=True),
+    Index("products_product_type_sku", "product_type", "sku"),
+)
+orders = _documents_table(
+    "orders",
+    Column("order_id", String),
+    Column("user_id", String),
+    Column("user_name", String),
+    Column("order_status", String),
+    Column("created_at", DateTime),
+    Index("orders_order_id_unique", "order_id", unique=True),
+)
+Index("orders_user_id_created_at", orders.c.user_id, orders.c.created_at.desc())
+order_summaries = _documents_table(
+    "order_summaries",
+    Column("order_id", String),
+    Column("user_id", String),
+    Column("order_status", String),
+    Column("created_at", DateTime),
+    Index("order_summaries_order_id_unique", "order_id", unique=True),
+)
+Index("order_summaries_user_id_created_at_order_id", order_summaries.c.user_id, order_summaries.c.created_at.desc(),
+      order_summaries.c.order_id.desc())
+sales_product_daily = _documents_table(
+    "sales_product_daily",
+    Column("day", String),
+    Column("product_id", String),
+    Index("sales_product_daily_day_product_id_unique", "day", "product_id", unique=True),
+)
+slow_queries = _documents_table("slow_queries", Column("total_ms", Float))
+Index("slow_queries_total_ms", slow_queries.c.total_ms.desc())
+# every other collection
+documents = Table(
+    "documents", metadata,
+    Column("collection", String, primary_key=True),
+    Column("_id", String, primary_key=True),
+    Column("document", Text, nullable=False),
+)
+
+TABLES = {table.name: table for table in (users, products, orders, order_summaries, sales_product_daily, slow_queries)}
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+COMPARISONS = {"$eq": operator.eq, "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+'''
+Documents as rows
+'''
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": _bson_datetime(value).isoformat(timespec="milliseconds")}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return json_util.default(value)
+
+
+def _json_hook(obj):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if next(iter(obj)).startswith("$"):
+            return json_util.object_hook(obj)
+    return obj
+
+
+def encode(doc):
+    return json.dumps(doc, default=_json_default, separators=(",", ":"))
+
+
+def decode(text):
+    return json.loads(text, object_hook=_json_hook)
+
+
+def _bson_datetime(value):
+    """What a datetime becomes in BSON: naive UTC, millisecond precision"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def as_stored(value):
+    """``value`` with its datetimes as BSON keeps them, for comparing with stored documents"""
+    if isinstance(value, dict):
+        return {k: as_stored(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [as_stored(v) for v in value]
+    return _bson_datetime(value) if isinstance(value, datetime) else value
+
+
+def id_key(value):
+    """Primary key of an _id: its Extended JSON, so "1", 1 and ObjectId values never collide"""
+    return encode(value)
+
+
+def _fits(column, value):
+    """Whether ``value`` can be stored in, or compared with, ``column``"""
+    kind = column.type.python_type
+    if isinstance(value, bool):
+        return kind is bool
+    if kind is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, kind)
+
+
+def _column_value(column, value):
+    if not _fits(column, value):
+        return None
+    return _bson_datetime(value) if isinstance(value, datetime) else value
+
+
+class SqlCursor:
+    """Lazily evaluated find(); iterating runs the query"""
+
+    def __init__(self, collection, query, projection, sort=None, limit=0, skip=0):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = sort_spec(sort)
+        self._limit = limit or 0
+        self._skip = skip or 0
+        self._rows = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else sort_spec(key_or_list)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        if self._rows is not None:
+            self._rows.close()
+
+    def __iter__(self):
+        self._rows = self.collection._iterate(self.query, self._sort, self._limit, self._skip)
+        return (project(doc, self.projection, shared=False) for doc in self._rows)
+
+
+class SqlCollection:
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.table = TABLES.get(name, documents)
+        self.columns = {c.name: c for c in self.table.c if c.name not in ("_id", "document", "collection")}
+
+    def __repr__(self):
+        return f"SqlCollection({self.name!r})"
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _scope(self, statement):
+        return statement.where(documents.c.collection == self.name) if self.table is documents else statement
+
+    def _row(self, doc):
+        row = {"_id": id_key(doc["_id"]), "document": encode(doc)}
+        for field, column in self.columns.items():
+            row[field] = _column_value(column, first_value(doc, field))
+        if self.table is documents:
+            row["collection"] = self.name
+        return row
+
+    '''
+    Queries
+    '''
+
+    def _where(self, query):
+        """(SQL conditions narrowing ``query``, True when they are the whole filter)"""
+        clauses, exact = [], True
+        for field, condition in (query or {}).items():
+            operators = isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition)
+            if field == "_id":
+                if not operators:
+                    clauses.append(self.table.c._id == id_key(condition))
+                elif set(condition) == {"$in"}:
+                    clauses.append(self.table.c._id.in_([id_key(v) for v in condition["$in"]]))
+                else:
+                    exact = False
+                continue
+            column = self.columns.get(field)
+            if column is None:
+                exact = False
+            elif not operators:
+                if _fits(column, condition):
+                    clauses.append(column == _column_value(column, condition))
+                else:
+                    exact = False
+            else:
+                for op, operand in condition.items():
+                    if op in COMPARISONS and _fits(column, operand):
+                        clauses.append(COMPARISONS[op](column, _column_value(column, operand)))
+                    elif op == "$in" and operand and all(_fits(column, v) for v in operand):
+                        clauses.append(column.in_([_column_value(column, v) for v in operand]))
+                    elif op == "$ne" and _fits(column, operand):
+                        # NULL is a missing field or a value of another type, checked in Python
+                        clauses.append(or_(column != _column_value(column, operand), column.is_(None)))
+                        exact = False
+                    else:
+                        exact = False
+        return clauses, exact
+
+    def _select(self, conn, query, sort=(), limit=0, skip=0, for_update=False):
+        """Matching documents, sorted, at most ``limit`` of them after skipping ``skip``"""
+        query = query or {}
+        clauses, exact = self._where(query)
+        statement = self._scope(select(self.table.c.document)).where(*clauses)
+        in_sql = all(field in self.columns for field, _ in sort)
+        if sort and in_sql:
+            statement = statement.order_by(*(self.columns[f].desc() if d == -1 else self.columns[f].asc()
+                                             for f, d in sort))
+        if exact and in_sql:
+            # the database returns exactly the page
+            if limit:
+                statement = statement.limit(limit)
+            if skip:
+                statement = statement.offset(skip)
+            skip = limit = 0
+        if for_update:
+            statement = statement.with_for_update()
+
+        result = conn.execute(statement)
+        try:
+            docs = (decode(text) for text in result.scalars())
+            if not exact:
+                stored_query = as_stored(query)
+                docs = (doc for doc in docs if matches(doc, stored_query))
+            if not in_sql:
+                docs = list(docs)
+                for field, direction in reversed(sort):
+                    docs.sort(key=lambda doc: sort_key(first_value(doc, field)), reverse=direction == -1)
+            for i, doc in enumerate(docs):
+                if limit and i >= skip + limit:
+                    break
+                if i >= skip:
+                    yield doc
+        finally:
+            result.close()
+
+    def _iterate(self, query, sort, limit, skip):
+        with self.database.read() as conn:
+            yield from self._select(conn, query, sort, limit, skip)
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, skip=0, **kwargs):
+        return SqlCursor(self, filter, projection, sort, limit, skip)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        with self.database.read() as conn:
+            docs = list(self._select(conn, filter, sort_spec(sort), 1))
+        return project(docs[0], projection, shared=False) if docs else None
+
+    def count_documents(self, filter, **kwargs):
+        clauses, exact = self._where(filter)
+        with self.database.read() as conn:
+            if exact:
+                return conn.execute(self._scope(select(func.count()).select_from(self.table)).where(*clauses)).scalar()
+            return sum(1 for _ in self._select(conn, filter))
+
+    def estimated_document_count(self, **kwargs):
+        return self.count_documents({})
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        with self.database.read() as conn:
+            for doc in self._select(conn, filter):
+                for value in candidates(field_values(doc, key)):
+                    if not isinstance(value, list) and value not in values:
+                        values.append(value)
+        return values
+
+    def aggregate(self, pipeline, **kwargs):
+        """Run ``pipeline`` on the documents (db/documents.py), a leading $match being the SQL filter.
+
+        A final $merge is written in the same transaction as the read, so a
+        rebuild is all or nothing; it holds the write lock while it runs.
+        """
+        pipeline = list(pipeline)
+        merge = pipeline.pop()["$merge"] if pipeline and "$merge" in pipeline[-1] else None
+        query = pipeline.pop(0)["$match"] if pipeline and "$match" in pipeline[0] else None
+        if merge is None:
+            with self.database.read() as conn:
+                return iter(list(aggregate_documents(self._select(conn, query), pipeline)))
+
+        target = self.database[merge_target(merge)]
+        with self.database.write() as conn:
+            for op in merge_operations(aggregate_documents(self._select(conn, query), pipeline), merge):
+                target._update(conn, op._filter, op._doc, op._upsert, replacement=isinstance(op, ReplaceOne))
+        return iter([])
+
+    '''
+    Writes (each public method is one transaction)
+    '''
+
+    def _insert(self, conn, doc):
+        conn.execute(insert(self.table), [self._row(doc)])
+
+    def _replace(self, conn, doc):
+        row = self._row(doc)
+        key = row.pop("_id")
+        row.pop("collection", None)
+        conn.execute(self._scope(update(self.table)).where(self.table.c._id == key).values(**row))
+
+    def _update(self, conn, filter, update, upsert=False, many=False, replacement=False):
+        docs = list(self._select(conn, filter, (), 0 if many else 1, for_update=True))
+        if not docs:
+            if upsert:
+                doc = upserted_document(filter or {}, update, replacement)
+                doc.setdefault("_id", ObjectId())
+                self._insert(conn, doc)
+                return UpdateResult({"n": 1, "nModified": 0, "upserted": doc["_id"]}, True)
+            return UpdateResult({"n": 0, "nModified": 0}, True)
+        modified = 0
+        for doc in docs:
+            changed = as_stored(updated_document(doc, update, replacement))
+            if changed != doc:
+                self._replace(conn, changed)
+                modified += 1
+        return UpdateResult({"n": len(docs), "nModified": modified}, True)
+
+    def _delete(self, conn, filter, many):
+        keys = [id_key(doc["_id"]) for doc in self._select(conn, filter, (), 0 if many else 1, for_update=True)]
+        if keys:
+            conn.execute(self._scope(delete(self.table)).where(self.table.c._id.in_(keys)))
+        return DeleteResult({"n": len(keys)}, True)
+
+    def insert_one(self, document, **kwargs):
+        # like pymongo, the caller's document gets its _id
+        document.setdefault("_id", ObjectId())
+        with self.database.write() as conn:
+            self._insert(conn, document)
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        try:
+            with self.database.write() as conn:
+                conn.execute(insert(self.table), [self._row(document) for document in documents])
+        except DuplicateKeyError:
+            # find out which documents failed, one savepoint each
+            self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            return self._update(conn, filter, update, upsert)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            return self._update(conn, filter, update, upsert, many=True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            return self._update(conn, filter, replacement, upsert, replacement=True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self.database.write() as conn:
+            docs = list(self._select(conn, filter, sort_spec(sort), 1, for_update=True))
+            if not docs:
+                if not upsert:
+                    return None
+                doc = upserted_document(filter, update)
+                doc.setdefault("_id", ObjectId())
+                self._insert(conn, doc)
+                return project(doc, projection, shared=False) if return_document == ReturnDocument.AFTER else None
+            doc = docs[0]
+            changed = as_stored(updated_document(doc, update))
+            if changed != doc:
+                self._replace(conn, changed)
+        return project(changed if return_document == ReturnDocument.AFTER else doc, projection, shared=False)
+
+    def delete_one(self, filter, **kwargs):
+        with self.database.write() as conn:
+            return self._delete(conn, filter, many=False)
+
+    def delete_many(self, filter, **kwargs):
+        with self.database.write() as conn:
+            return self._delete(conn, filter, many=True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """All the operations in one transaction, each in a savepoint so a failing one is reported alone"""
+        result = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nUpserted": 0, "nRemoved": 0, "upserted": [],
+                  "writeErrors": []}
+        with self.database.write() as conn:
+            for i, op in enumerate(requests):
+                kind = type(op).__name__
+                try:
+                    with conn.begin_nested():
+                        if kind == "InsertOne":
+                            op._doc.setdefault("_id", ObjectId())
+                            self._insert(conn, op._doc)
+                            result["nInserted"] += 1
+                            continue
+                        if kind in ("DeleteOne", "DeleteMany"):
+                            result["nRemoved"] += self._delete(conn, op._filter, kind == "DeleteMany").deleted_count
+                            continue
+                        outcome = self._update(conn, op._filter, op._doc, op._upsert, many=kind == "UpdateMany",
+                                               replacement=kind == "ReplaceOne")
+                except IntegrityError as e:
+                    result["writeErrors"].append({"index": i, "code": 11000, "errmsg": _duplicate_message(self.name, e),
+                                                  "op": getattr(op, "_doc", None) or getattr(op, "_filter", None)})
+                    if ordered:
+                        break
+                    continue
+                result["nMatched"] += outcome.matched_count
+                result["nModified"] += outcome.modified_count
+                if outcome.upserted_id is not None:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": i, "_id": outcome.upserted_id})
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        del result["writeErrors"]
+        return BulkWriteResult(result, True)
+
+    '''
+    Indexes (created by the migrations)
+    '''
+
+    def index_information(self):
+        """The indexes present in the database, named and shaped like pymongo reports them"""
+        info = {"_id_": {"key": [("_id", 1)]}}
+        declared = {index.name: index for index in self.table.indexes}
+        prefix = f"{self.table.name}_"
+        for found in inspect(self.database.engine).get_indexes(self.table.name):
+            # SQLite does not report key directions: they come from the declaration
+            directions = _directions(declared[found["name"]]) if found["name"] in declared else {}
+            spec = {"key": [(name, directions.get(name, 1)) for name in found["column_names"]]}
+            if found["unique"]:
+                spec["unique"] = True
+            name = found["name"][len(prefix):] if found["name"].startswith(prefix) else found["name"]
+            info[name] = spec
+        return info
+
+    def create_indexes(self, models, **kwargs):
+        raise OperationFailure("indexes of the SQL backend are created by the migrations (python -m db.sql_db upgrade)")
+
+    def create_index(self, keys, **kwargs):
+        raise OperationFailure("indexes of the SQL backend are created by the migrations (python -m db.sql_db upgrade)")
+
+    def drop(self):
+        with self.database.write() as conn:
+            conn.execute(self._scope(delete(self.table)))
+
+
+def _directions(index):
+    # a descending key is a desc() expression around the column
+    return {getattr(e, "element", e).name: -1 if hasattr(e, "element") else 1 for e in index.expressions}
+
+
+def _duplicate_message(name, error):
+    return f"E11000 duplicate key error collection: {name} ({error.orig})"
+
+
+class SqlDatabase:
+    """Collections are tables of documents, created by the migrations"""
+
+    def __init__(self, uri, busy_timeout_ms=5000, name="inventory"):
+        self.uri = uri
+        self.name = name
+        self.engine = create_engine(uri)
+        self._collections = {}
+        if self.engine.dialect.name == "sqlite":
+            self._configure_sqlite(busy_timeout_ms)
+
+    def _configure_sqlite(self, busy_timeout_ms):
+        @event.listens_for(self.engine, "connect")
+        def connect(dbapi_connection, record):
+            # transactions are started by the begin hook below, not by the driver
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+            cursor.close()
+
+        @event.listens_for(self.engine, "begin")
+        def begin(conn):
+            # writers take the write lock up front instead of failing to upgrade a read lock
+            conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.get_execution_options().get("write") else "BEGIN")
+
+    @contextmanager
+    def read(self):
+        try:
+            with self.engine.connect() as conn:
+                yield conn
+        except SQLAlchemyError as e:
+            raise OperationFailure(str(e)) from e
+
+    @contextmanager
+    def write(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execution_options(write=True)
+                with conn.begin():
+                    yield conn
+        except IntegrityError as e:
+            raise DuplicateKeyError(_duplicate_message(self.name, e), 11000) from e
+        except SQLAlchemyError as e:
+            raise OperationFailure(str(e)) from e
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SqlCollection(self, name)
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self):
+        with self.read() as conn:
+            names = [name for name, table in TABLES.items() if conn.execute(select(table.c._id).limit(1)).first()]
+            names += conn.execute(select(documents.c.collection).distinct()).scalars().all()
+        return names
+
+    def drop_collection(self, name):
+        self[name].drop()
+
+    def command(self, command, *args, **kwargs):
+        if command == "ping" or command == {"ping": 1}:
+            with self.read() as conn:
+                conn.exec_driver_sql("SELECT 1")
+            return {"ok": 1.0}
+        # what a server answers to a command it does not know
+        raise OperationFailure(f"no such command: {command!r} on the SQL backend", 59)
+
+    def close(self):
+        self.engine.dispose()
+
+
+'''
+Migrations
+'''
+
+
+def alembic_config(uri):
+    from alembic.config import Config
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.set_main_option("sqlalchemy.url", uri.replace("%", "%%"))
+    return config
+
+
+def upgrade(uri, revision="head"):
+    """Bring the schema of ``uri`` to ``revision``"""
+    from alembic import command
+    command.upgrade(alembic_config(uri), revision)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the schema of the SQL storage backend")
+    parser.add_argument("action", choices=["upgrade", "downgrade", "current"])
+    parser.add_argument("revision", nargs="?", help="target revision (upgrade: head, downgrade: -1)")
+    parser.add_argument("--uri", default=os.getenv("SQL_DATABASE_URI", "sqlite:///inventory.db"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from alembic import command
+    config = alembic_config(args.uri)
+    try:
+        if args.action == "upgrade":
+            command.upgrade(config, args.revision or "head")
+        elif args.action == "downgrade":
+            command.downgrade(config, args.revision or "-1")
+        else:
+            command.current(config)
+    except SQLAlchemyError as e:
+        print(f"Migration failed: {e}")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
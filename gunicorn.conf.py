@@ -0,0 +1,41 @@
+import os
+import threading
+
+'''
+gunicorn settings, picked up automatically by ``gunicorn app:app``.
+
+The app is loaded once in the master (preload_app) and the workers are
+forked from it. MongoDB clients are per process (db/mongo_db.py): the
+master closes the one it used for the startup index/admin bootstrap before
+forking, and each worker warms its own pool on a background thread, so
+neither the master nor a worker's first request waits on the connection.
+Each worker also starts its health prober right away.
+'''
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+
+def on_starting(server):
+    # metrics files of the previous run's workers (see utils/metrics.py)
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        for name in os.listdir(metrics_dir) if os.path.isdir(metrics_dir) else []:
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(server):
+    from db.mongo_db import db_instance
+    # the workers are forked after this: none of them may inherit an open client
+    db_instance.close()
+
+
+def post_fork(server, worker):
+    from db.mongo_db import db_instance
+    from utils.health import health_monitor
+    threading.Thread(target=db_instance.warm, name="mongo-warmup", daemon=True).start()
+    health_monitor.start()
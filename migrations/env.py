@@ -0,0 +1,42 @@
+import os
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from db.sql_db import metadata
+
+'''
+Alembic environment of the SQL storage backend.
+
+The URL comes from SQL_DATABASE_URI, else from the configuration (alembic.ini
+or db.sql_db.alembic_config). ``metadata`` is what autogenerate compares the
+database with.
+'''
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+url = os.getenv("SQL_DATABASE_URI") if config.config_file_name else None
+url = url or config.get_main_option("sqlalchemy.url")
+
+
+def run_migrations_offline():
+    context.configure(url=url, target_metadata=metadata, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        # batch mode: SQLite can only ALTER a table by copying it
+        context.configure(connection=connection, target_metadata=metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,67 @@
+"""document tables of the users, products and orders and their read models
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _documents_table(name, *columns):
+    op.create_table(
+        name,
+        sa.Column("_id", sa.String(), primary_key=True),
+        *columns,
+        sa.Column("document", sa.Text(), nullable=False),
+    )
+
+
+def upgrade():
+    _documents_table("users", sa.Column("user_id", sa.String()), sa.Column("user_name", sa.String()))
+    op.create_index("users_user_id_unique", "users", ["user_id"], unique=True)
+    op.create_index("users_user_name_unique", "users", ["user_name"], unique=True)
+
+    _documents_table("products", sa.Column("sku", sa.String()), sa.Column("product_id", sa.String()),
+                     sa.Column("product_type", sa.String()), sa.Column("product_price", sa.Float()),
+                     sa.Column("is_active", sa.Boolean()))
+    op.create_index("products_sku_unique", "products", ["sku"], unique=True)
+    op.create_index("products_product_id_unique", "products", ["product_id"], unique=True)
+    # keyset pagination of /product/get_products filtered by type
+    op.create_index("products_product_type_sku", "products", ["product_type", "sku"])
+
+    _documents_table("orders", sa.Column("order_id", sa.String()), sa.Column("user_id", sa.String()),
+                     sa.Column("user_name", sa.String()), sa.Column("created_at", sa.DateTime()))
+    op.create_index("orders_order_id_unique", "orders", ["order_id"], unique=True)
+    op.create_index("orders_user_id_created_at", "orders", ["user_id", sa.text("created_at DESC")])
+
+    _documents_table("order_summaries", sa.Column("order_id", sa.String()), sa.Column("user_id", sa.String()),
+                     sa.Column("order_status", sa.String()), sa.Column("created_at", sa.DateTime()))
+    op.create_index("order_summaries_order_id_unique", "order_summaries", ["order_id"], unique=True)
+    # newest first pages of /orders/user_order_summaries
+    op.create_index("order_summaries_user_id_created_at_order_id", "order_summaries",
+                    ["user_id", sa.text("created_at DESC"), sa.text("order_id DESC")])
+
+    _documents_table("sales_product_daily", sa.Column("day", sa.String()), sa.Column("product_id", sa.String()))
+    op.create_index("sales_product_daily_day_product_id_unique", "sales_product_daily", ["day", "product_id"], unique=True)
+
+    _documents_table("slow_queries", sa.Column("total_ms", sa.Float()))
+    op.create_index("slow_queries_total_ms", "slow_queries", [sa.text("total_ms DESC")])
+
+    # every other collection (versions, sales_daily)
+    op.create_table(
+        "documents",
+        sa.Column("collection", sa.String(), primary_key=True),
+        sa.Column("_id", sa.String(), primary_key=True),
+        sa.Column("document", sa.Text(), nullable=False),
+    )
+
+
+def downgrade():
+    for table in ("documents", "slow_queries", "sales_product_daily", "order_summaries", "orders", "products", "users"):
+        op.drop_table(table)
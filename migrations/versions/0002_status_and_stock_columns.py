@@ -0,0 +1,40 @@
+"""order_status and quantity_present columns, so the guarded order updates and the stock updates filter in SQL
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _backfill(table, field, kind):
+    # a value of another type stays NULL, as the backend writes it
+    bind = op.get_bind()
+    documents = sa.table(table, sa.column("_id", sa.String()), sa.column("document", sa.Text()), sa.column(field))
+    rows = bind.execute(sa.select(documents.c._id, documents.c.document)).all()
+    for _id, document in rows:
+        value = json.loads(document).get(field)
+        if isinstance(value, kind) and not isinstance(value, bool):
+            bind.execute(documents.update().where(documents.c._id == _id).values({field: value}))
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("order_status", sa.String()))
+    op.add_column("products", sa.Column("quantity_present", sa.Float()))
+    _backfill("orders", "order_status", str)
+    _backfill("products", "quantity_present", (int, float))
+
+
+def downgrade():
+    # SQLite before 3.35 cannot drop a column in place
+    with op.batch_alter_table("products") as batch:
+        batch.drop_column("quantity_present")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("order_status")
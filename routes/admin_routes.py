@@ -0,0 +1,77 @@
+import json
+from flask import send_file
+from flask_smorest import Blueprint,abort
+from flask.views import MethodView
+from flask_jwt_extended import jwt_required,get_jwt
+from db.mongo_db import db
+from schema.admin_schema import *
+from utils.slow_queries import report,slow_query_log
+from utils.profiling import request_profiler
+
+#operational reports for admins
+admin_app = Blueprint("admin",__name__,url_prefix="/admin")
+
+#download formats of a stored request profile
+PROFILE_FORMATS = {
+    "json":(".json","application/json"),
+    "pstats":(".prof","application/octet-stream"),
+    "callgrind":(".callgrind","text/plain")
+}
+
+
+def admin_only():
+    claims = get_jwt()
+    if claims.get("role")!="admin":
+        abort(403,message="Admins only")
+
+
+@admin_app.route("/slow_queries")
+class Slow_Queries(MethodView):
+
+    @jwt_required()
+    @admin_app.arguments(Slow_Queries_Query_Schema,location="query",description="Slowest MongoDB command shapes, with collection scans flagged")
+    @admin_app.response(200)
+    def get(self,args):
+        admin_only()
+        if args["explain"]:
+            slow_query_log.flush(db)
+            slow_query_log.explain_slowest(db,force=True)
+        queries = report(db,args["limit"],args["collscan"])
+        for q in queries:
+            q["id"] = q.pop("_id")
+        return {"threshold_ms":slow_query_log.threshold_ms,"queries":queries}
+
+
+@admin_app.route("/profiles")
+class Profiles(MethodView):
+
+    @jwt_required()
+    @admin_app.arguments(Profiles_Query_Schema,location="query",description="Stored request profiles, newest first")
+    @admin_app.response(200)
+    def get(self,args):
+        admin_only()
+        profiles = []
+        for path in request_profiler.reports()[:args["limit"]]:
+            with open(path) as f:
+                profile = json.load(f)
+            profile.pop("top",None)
+            profiles.append(profile)
+        return {"profiles":profiles}
+
+
+@admin_app.route("/profiles/<profile_id>")
+class Single_Profile(MethodView):
+
+    @jwt_required()
+    @admin_app.arguments(Profile_Download_Schema,location="query",description="json report, pstats dump or callgrind file")
+    @admin_app.response(200)
+    def get(self,args,profile_id):
+        admin_only()
+        suffix,mimetype = PROFILE_FORMATS[args["format"]]
+        path = request_profiler.path(profile_id,suffix)
+        if path is None:
+            abort(404,message="Profile not found")
+        if args["format"]=="json":
+            with open(path) as f:
+                return json.load(f)
+        return send_file(path,mimetype=mimetype,as_attachment=True,download_name=f"{profile_id}{suffix}")
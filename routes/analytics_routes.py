@@ -0,0 +1,79 @@
+import datetime
+from flask_smorest import Blueprint,abort
+from flask.views import MethodView
+from flask_jwt_extended import jwt_required,get_jwt
+from db.mongo_db import db
+from schema.analytics_schema import *
+from utils.sales_rollups import DAY_FORMAT
+
+#served from the sales rollups (utils/sales_rollups.py), never from the orders
+analytics_app = Blueprint("analytics",__name__,url_prefix="/analytics")
+
+sales_daily_collection = db.sales_daily
+sales_product_daily_collection = db.sales_product_daily
+
+#days covered when no range is given
+DEFAULT_DAYS = 30
+
+
+def day_range(args):
+    """(first, last) day of the requested range as rollup day strings"""
+    end = args.get("end") or datetime.date.today()
+    start = args.get("start") or end-datetime.timedelta(days=DEFAULT_DAYS-1)
+    if start>end:
+        abort(400,message="start must not be after end")
+    return start.strftime(DAY_FORMAT),end.strftime(DAY_FORMAT)
+
+
+@analytics_app.route("/daily_sales")
+class Daily_Sales(MethodView):
+
+    @jwt_required()
+    @analytics_app.arguments(Analytics_Range_Schema,location="query",description="Units, revenue and orders per day")
+    @analytics_app.response(200)
+    def get(self,args):
+        claims = get_jwt()
+        if claims.get("role")!="admin":
+            abort(403,message="Admins only")
+        start,end = day_range(args)
+        days = list(sales_daily_collection.find({"_id":{"$gte":start,"$lte":end}},sort=[("_id",1)]))
+        for d in days:
+            d["day"] = d.pop("_id")
+        return {
+            "start":start,
+            "end":end,
+            "units":sum(d.get("units",0) for d in days),
+            "revenue":sum(d.get("revenue",0) for d in days),
+            "orders":sum(d.get("orders",0) for d in days),
+            "days":days
+        }
+
+
+@analytics_app.route("/top_sellers")
+class Top_Sellers(MethodView):
+
+    @jwt_required()
+    @analytics_app.arguments(Top_Sellers_Query_Schema,location="query",description="Best selling products in a date range")
+    @analytics_app.response(200)
+    def get(self,args):
+        claims = get_jwt()
+        if claims.get("role")!="admin":
+            abort(403,message="Admins only")
+        start,end = day_range(args)
+        products = list(sales_product_daily_collection.aggregate([
+            {"$match":{"day":{"$gte":start,"$lte":end}}},
+            #latest name/sku of each product wins
+            {"$sort":{"day":1}},
+            {"$group":{
+                "_id":"$product_id",
+                "sku":{"$last":"$sku"},
+                "product_name":{"$last":"$product_name"},
+                "units":{"$sum":"$units"},
+                "revenue":{"$sum":"$revenue"},
+                "orders":{"$sum":"$orders"}
+            }},
+            {"$sort":{args["by"]:-1,"_id":1}},
+            {"$limit":args["limit"]},
+            {"$project":{"_id":0,"product_id":"$_id","sku":1,"product_name":1,"units":1,"revenue":1,"orders":1}}
+        ]))
+        return {"start":start,"end":end,"by":args["by"],"products":products}
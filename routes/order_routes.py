@@ -1,18 +1,23 @@
 import uuid
-import re
-import bcrypt
-from db import db
+import logging
 from flask_smorest import Blueprint,abort
 from flask.views import MethodView
 from schema.order_schema import*
 from db.mongo_db import db
 import os
 from dotenv import load_dotenv,find_dotenv
-from flask_jwt_extended import create_access_token,jwt_required,get_jwt,get_jwt_identity
+from flask_jwt_extended import jwt_required,get_jwt,get_jwt_identity
 import datetime
 from routes.user_routes import user_collection
 from routes.product_routes import product_collection
 from flask import current_app
+from pymongo import ReturnDocument
+from schema.export_schema import ExportQuerySchema
+from utils.export import export_response
+from utils.product_cache import product_cache
+from utils.stock import InsufficientStock,order_quantities,place_order,release_stock,reserve_stock
+from utils.order_hooks import after_order_write
+from utils.etags import document_etag,etag_header,listing_etag,not_modified
 
 load_dotenv(find_dotenv())
 admin_name = os.getenv("ADMINNAME")
@@ -22,6 +27,196 @@ order_app = Blueprint("order",__name__,url_prefix="/orders")
 
 #add a collection
 order_collection = db.orders
+#compact per-order read model for order lists (utils/order_summaries.py)
+order_summary_collection = db.order_summaries
+
+#fields returned by the admin order listing and export
+ORDER_FIELDS = ["order_id","user_name","user_id","products","order_quantity","order_price","order_status",
+                "payment_status","payment_method","shipping_address","created_at","reason","updated_timestamp"]
+
+#only the product fields needed to price an order
+PRICING_PROJECTION = {"_id":0,"product_id":1,"sku":1,"product_name":1,"product_price":1,"quantity_present":1,"is_active":1}
+
+
+def price_order_lines(lines,products):
+    """Validate and price the requested lines against the resolved products (keyed by sku).
+
+    Every failing line is reported instead of stopping at the first one.
+    Returns (enriched lines, order price, errors).
+    """
+    #a sku may appear on several lines, stock is checked against the total
+    requested = {}
+    for p in lines:
+        requested[p["sku"]] = requested.get(p["sku"],0)+p["product_quantity"]
+
+    enrich_products=[]
+    order_price=0
+    errors=[]
+    for index,p in enumerate(lines):
+        product = products.get(p["sku"])
+        if not product:
+            errors.append({"line":index,"sku":p["sku"],"error":"Product not found"})
+            continue
+        #Check if product is active
+        if not product.get("is_active", False):
+            errors.append({"line":index,"sku":p["sku"],"error":f"Product {product['product_name']} is not available"})
+            continue
+        #Check stock availability (cached products carry no stock, see reservation_failed)
+        available_qty = product.get("quantity_present")
+        if available_qty is not None and available_qty < requested[p["sku"]]:
+            errors.append({"line":index,"sku":p["sku"],
+                           "error":f"Insufficient stock for {product['product_name']}. Available: {available_qty}"})
+            continue
+
+        unit_price = product["product_price"]
+        total_price = p["product_quantity"]*unit_price
+
+        enrich_products.append({
+            "product_id":product["product_id"],
+            "sku":p["sku"],
+            "product_name":p["product_name"],
+            "product_type":p["product_type"],
+            "product_price":unit_price,
+            "product_quantity":p["product_quantity"],
+            "total_price":total_price
+        })
+        order_price+=total_price
+
+    return enrich_products,order_price,errors
+
+
+def order_error_status(errors):
+    return 404 if any(e["error"]=="Product not found" for e in errors) else 400
+
+
+'''
+Shared by the views and the async handlers in asgi.py
+'''
+
+def admin_only():
+    if get_jwt().get("role")!="admin":
+        abort(403,message="Admins Only")
+
+
+def admin_listing_query():
+    """find() arguments of the admin order listing"""
+    return {"user_name":{"$ne":admin_name}},{field:1 for field in ORDER_FIELDS}
+
+
+def user_orders_query(user_id):
+    return {"user_id":user_id},{"_id":0}
+
+
+def user_orders_response(orders):
+    if not orders:
+        return "No orders placed yet"
+    for o in orders:
+        o.pop("_id",None)
+    return orders
+
+
+def order_skus(lines):
+    return list({p["sku"] for p in lines})
+
+
+def new_order(data,session_user,user,products):
+    """Price the order against the resolved products (keyed by sku) and build its document.
+
+    Aborts with every failing line; the stock is reserved by the caller.
+    """
+    if not user:
+        abort(404,message="User not found")
+
+    #enrich products
+    enrich_products,order_price,errors = price_order_lines(data["products"],products)
+    if errors:
+        abort(order_error_status(errors),message="Order cannot be placed",errors={"products":errors})
+
+    return {
+        "order_id":str(uuid.uuid4()),
+        "user_name": user["user_name"],
+        "user_id": session_user,
+        "products":enrich_products,
+        "order_quantity":sum(p["product_quantity"] for p in data["products"]),
+        "order_price":order_price,
+        "order_status":"Pending",
+        "payment_status":"Pending",
+        "payment_method":data["payment_method"],
+        "shipping_address":data["shipping_address"],
+        "created_at":datetime.datetime.now(),
+        "version":1
+    }
+
+
+def reservation_failed(lines,products):
+    """Abort for an order whose stock reservation failed, ``products`` being a fresh read of its skus.
+
+    Cached products carry no stock, so the lines are checked again against
+    the stock as it is now.
+    """
+    errors = price_order_lines(lines,products)[2]
+    if errors:
+        abort(order_error_status(errors),message="Order cannot be placed",errors={"products":errors})
+    abort(400,message="Insufficient stock for one or more products, please try again")
+
+
+def guarded_update(query,update):
+    """Apply ``update`` to the order matching ``query``, which carries the allowed-status guard.
+
+    One round trip; returns the order as it was before the write, or None
+    when nothing matched.
+    """
+    return order_collection.find_one_and_update(query,update,projection={"_id":0},
+                                                return_document=ReturnDocument.BEFORE)
+
+
+def current_order(query):
+    """Read the order only to explain why a guarded update matched nothing"""
+    return order_collection.find_one(query,{"_id":0,"order_status":1,"products.product_id":1})
+
+
+def quantity_update(product_id,quantity,updated_timestamp):
+    """Update pipeline setting the quantity of the first line of ``product_id`` and recomputing the totals"""
+    line = {"$indexOfArray":["$products.product_id",product_id]}
+    return [
+        {"$set":{
+            "products":{"$let":{"vars":{"line":line},"in":{"$map":{
+                "input":{"$range":[0,{"$size":"$products"}]},
+                "as":"i",
+                "in":{"$cond":[
+                    {"$eq":["$$i","$$line"]},
+                    {"$mergeObjects":[
+                        {"$arrayElemAt":["$products","$$i"]},
+                        {"product_quantity":quantity,
+                         "total_price":{"$multiply":[quantity,{"$arrayElemAt":["$products.product_price","$$i"]}]}}
+                    ]},
+                    {"$arrayElemAt":["$products","$$i"]}
+                ]}
+            }}}},
+            "updated_timestamp":updated_timestamp,
+            "version":{"$add":[{"$ifNull":["$version",0]},1]}
+        }},
+        {"$set":{
+            "order_quantity":{"$sum":"$products.product_quantity"},
+            "order_price":{"$sum":"$products.total_price"}
+        }}
+    ]
+
+
+def with_quantity(order,product_id,quantity,updated_timestamp):
+    """The order as quantity_update leaves it"""
+    products = [dict(p) for p in order["products"]]
+    line = next(p for p in products if p["product_id"]==product_id)
+    line["product_quantity"] = quantity
+    line["total_price"] = quantity*line["product_price"]
+    return {
+        **order,
+        "products":products,
+        "order_quantity":sum(p["product_quantity"] for p in products),
+        "order_price":sum(p["total_price"] for p in products),
+        "updated_timestamp":updated_timestamp,
+        "version":order.get("version",0)+1
+    }
 
 
 '''
@@ -34,32 +229,19 @@ class Get_Order(MethodView):
     @jwt_required()
     @order_app.response(200,OrderSchema(many=True))
     def get(self):
-        claims = get_jwt()
-        if claims.get("role")!="admin":
-            abort(403,message="Admins Only")
-        orders = []
-        for o in order_collection.find({}):
-            order={
-                "order_id":o.get("order_id"),
-                "user_name":o.get("user_name"),
-                "user_id":o.get("user_id"),
-                "products":o.get("products"),
-                "order_quantity":o.get("order_quantity"),
-                "order_price":o.get("order_price"),
-                "order_status":o.get("order_status"),
-                "payment_status":o.get("payment_status"),
-                "payment_method":o.get("payment_method"),
-                "shipping_address":o.get("shipping_address"),
-                "created_at":o.get("created_at"),
-                "reason":o.get("reason"),
-                "updated_timestamp":o.get("updated_timestamp")
-            }
-            if not order["user_name"]==admin_name:
-
-                orders.append(order)
-
-
-        return orders    
+        admin_only()
+        return list(order_collection.find(*admin_listing_query()))
+
+
+@order_app.route("/export")
+class Export_Orders(MethodView):
+
+    @jwt_required()
+    @order_app.arguments(ExportQuerySchema,location="query",description="Stream every order as NDJSON or CSV")
+    def get(self,args):
+        admin_only()
+        return export_response(order_collection,admin_listing_query()[0],ORDER_FIELDS,args["format"],"orders")
+
     
 @order_app.route("/create_order")
 class PostOrder(MethodView):
@@ -71,64 +253,21 @@ class PostOrder(MethodView):
     @order_app.response(201)
     def post(self,data):
         session_user = get_jwt_identity()
-        curr_user = data["user_id"]
         user = user_collection.find_one({"user_id":session_user}) 
-        if not user:
-            abort(404,message="User not found")
 
-        #create order id 
-        order_id = str(uuid.uuid4())
-        
-        #enrich products
-        order_price=0
-        order_quantity=sum(p["product_quantity"] for p in data["products"])
-        enrich_products=[]
-        for p in data["products"]:
-            product = product_collection.find_one({"sku":p["sku"]})
-            if not product:
-                abort(404,message="Product not found")
-            #Check if product is active
-            if not product.get("is_active", False):
-                abort(400, message=f"Product {product['product_name']} is not available")
-            
-            #Check stock availability
-            available_qty = product.get("quantity_present", 0)
-            if available_qty < p["product_quantity"]:
-                abort(400, message=f"Insufficient stock for {product['product_name']}. Available: {available_qty}")
-                
-            unit_price = product["product_price"]
-            total_price = p["product_quantity"]*unit_price
-
-            enrich_products.append({
-                "product_id":product["product_id"],
-                "sku":p["sku"],
-                "product_name":p["product_name"],
-                "product_type":p["product_type"],
-                "product_price":unit_price,
-                "product_quantity":p["product_quantity"],
-                "total_price":total_price
-            })
-            order_price+=total_price
-
-        #create order time    
-        order_created = datetime.datetime.now()
-
-        #insert order
-        order_doc = {
-            "order_id":order_id,
-            "user_name": user["user_name"],
-            "user_id": session_user,
-            "products":enrich_products,
-            "order_quantity":order_quantity,
-            "order_price":order_price,
-            "order_status":"Pending",
-            "payment_status":"Pending",
-            "payment_method":data["payment_method"],
-            "shipping_address":data["shipping_address"],
-            "created_at":order_created
-        }    
-        result=order_collection.insert_one(order_doc)      
+        #resolve every sku of the order in a single query (or from the product cache)
+        skus = order_skus(data["products"])
+        products = product_cache.get_many(product_collection,"sku",skus,PRICING_PROJECTION)
+        order_doc = new_order(data,session_user,user,products)
+
+        #reserve the stock and insert the order, stock is checked again atomically
+        try:
+            place_order(product_collection,order_collection,order_doc,
+                        use_transaction=current_app.config.get("ORDER_TRANSACTIONS",False))
+        except InsufficientStock:
+            reservation_failed(data["products"],{p["sku"]:p for p in product_collection.find({"sku":{"$in":skus}},PRICING_PROJECTION)})
         order_doc.pop("_id",None)
+        after_order_write(None,order_doc)
 
         return {"order_details":order_doc}  
 
@@ -145,44 +284,31 @@ class CancelOrder(MethodView):
             abort(403,message="Only user can delete the order")
 
         session_user = get_jwt_identity()
-        # curr_user = user_id
-        # user = user_collection.find_one({"user_id":session_user}) 
-        # if not user:
-        #     abort(404,message="User not found")
-
-        # order = order_collection.find_one({"order_id":order_id})
-        # user = user_collection.find_one({"user_id":session_user})
-        order = order_collection.find_one({
-            "order_id": order_id,
-            "user_id": session_user
-        })
-        
-        if not order:
-            abort(404, message="Order not found or you don't have permission to cancel it")
-        
-        current_status = order.get("order_status")
-        if current_status in ["Delivered", "Cancelled"]:
-            abort(400, message=f"Cannot cancel order with status: {current_status}")
-        
-        if current_status == "Shipped":
-            abort(400, message="Cannot cancel order that has already shipped")
-        # if not user:
-        #     abort(404,message="User not found")   
-
-        # if not bcrypt.checkpw(data["user_password"].encode("utf-8"),user["user_password"].encode("utf-8")):
-        #     abort(403,message="Password does not match")    
-
-        # order_collection.delete_one({"order_id":order_id})
+        query = {"order_id":order_id,"user_id":session_user}
         updated_timestamp = datetime.datetime.now()
-        order_collection.update_one(
-            {"order_id":order_id},
+        #the status guard makes sure a concurrent cancel releases the stock only once
+        order = guarded_update(
+            {**query,"order_status":{"$nin":["Delivered","Cancelled","Shipped"]}},
             {"$set":{
                 "order_status":"Cancelled",
                 "reason":data["reason"],
                 "updated_timestamp":updated_timestamp
-            }
-        })
-
+            },"$inc":{"version":1}}
+        )
+        if not order:
+            order = current_order(query)
+            if not order:
+                abort(404, message="Order not found or you don't have permission to cancel it")
+            current_status = order.get("order_status")
+            if current_status in ["Delivered", "Cancelled"]:
+                abort(400, message=f"Cannot cancel order with status: {current_status}")
+            if current_status == "Shipped":
+                abort(400, message="Cannot cancel order that has already shipped")
+            abort(409, message="Order status changed, please try again")
+
+        release_stock(product_collection,order_quantities(order["products"]))
+        after_order_write(order,{**order,"order_status":"Cancelled","reason":data["reason"],
+                                 "updated_timestamp":updated_timestamp,"version":order.get("version",0)+1})
 
         return f"order cancelled successfully"     
 
@@ -196,49 +322,53 @@ class Update_Quantity(MethodView):
     @order_app.response(200)
     def patch(self,data,order_id,product_id):
         session_user = get_jwt_identity()
-        print(f"session user: {session_user}")
-        order = order_collection.find_one({"order_id":order_id,"user_id":session_user})
-        if not order:
-            abort(404,message="For the given user,there is no such order present")
-
-        shipping_status = order["order_status"]
-        if shipping_status=="Delivered":
-            abort(403,message="Order has been delivered")
-        if shipping_status in ["Shipped", "Cancelled"]:
-            abort(403,message=f"Order cannot be updated as it is {shipping_status}")    
-
-
-        #find product in the given order
-        product = None
-        for p in order["products"]:
-            if p["product_id"]==product_id:
-                product=p
-                break
-        if not product:
-            abort(404,message="product not found")
-
         new_quantity = data["product_quantity"]
-        product["product_quantity"] = new_quantity
-        product["total_price"] = new_quantity*product["product_price"]
-
-        order_quantity = sum(p["product_quantity"] for p in order["products"])
-        order_price = sum(p["total_price"] for p in order["products"])            
-
         updated_timestamp = datetime.datetime.now()
+        editable = {"order_status":{"$nin":["Delivered","Shipped","Cancelled"]}}
 
-        order_collection.update_one(
-            {"order_id": order_id},
-            {"$set": {
-                "products": order["products"],
-                "order_quantity": order_quantity,
-                "order_price": order_price,
-                "updated_timestamp": updated_timestamp
-            }}
+        order = guarded_update(
+            {"order_id":order_id,"user_id":session_user,"products.product_id":product_id,**editable},
+            quantity_update(product_id,new_quantity,updated_timestamp)
         )
+        if not order:
+            order = current_order({"order_id":order_id,"user_id":session_user})
+            if not order:
+                abort(404,message="For the given user,there is no such order present")
+            shipping_status = order["order_status"]
+            if shipping_status=="Delivered":
+                abort(403,message="Order has been delivered")
+            if shipping_status in ["Shipped", "Cancelled"]:
+                abort(403,message=f"Order cannot be updated as it is {shipping_status}")
+            if product_id not in [p["product_id"] for p in order["products"]]:
+                abort(404,message="product not found")
+            abort(409,message="Order status changed, please try again")
+
+        updated_order = with_quantity(order,product_id,new_quantity,updated_timestamp)
+        old_quantity = next(p["product_quantity"] for p in order["products"] if p["product_id"]==product_id)
+        delta = new_quantity-old_quantity
+
+        #the order already holds the new quantity, the extra stock is reserved after
+        if delta>0:
+            try:
+                reserve_stock(product_collection,str(uuid.uuid4()),{product_id:delta})
+            except InsufficientStock:
+                reverted = order_collection.update_one(
+                    {"order_id":order_id,**editable,
+                     "products":{"$elemMatch":{"product_id":product_id,"product_quantity":new_quantity}}},
+                    quantity_update(product_id,old_quantity,updated_timestamp)
+                )
+                if reverted.matched_count==0:
+                    #the order moved on with the new quantity (shipped, cancelled or edited again),
+                    #stock is left alone rather than decremented without a guard
+                    logging.warning(f"Order {order_id} changed while reverting {product_id} to {old_quantity}, "
+                                    f"{delta} units were not reserved")
+                    after_order_write(order,updated_order)
+                    abort(409,message="Order changed while the quantity was updated, please check the order")
+                abort(400,message="Insufficient stock to increase the quantity")
+        if delta<0:
+            release_stock(product_collection,{product_id:-delta})
+        after_order_write(order,updated_order)
 
-        # return updated order
-        updated_order = order_collection.find_one({"order_id": order_id})
-        updated_order.pop("_id", None)
         return updated_order
 
 
@@ -250,35 +380,31 @@ class Update_Address(MethodView):
     @order_app.response(200)
     def patch(self,data,order_id):
         session_user = get_jwt_identity()
-        print(f"session user: {session_user}")
-        order = order_collection.find_one({"order_id":order_id,"user_id":session_user})
-        if not order:
-            abort(404,message="For the given user,there is no such order present")
-
-        shipping_status = order["order_status"]
-        if shipping_status=="Delivered":
-            abort(403,message="Order has been delivered")
-        if shipping_status=="Cancelled":
-            abort(403,message=f"Order cannot be updated as it is {shipping_status}")    
-
-
-        #update the shipping address
-        current_address = order["shipping_address"]
+        query = {"order_id":order_id,"user_id":session_user}
         updated_address = data["update_shipping_address"]
-
         updated_timestamp = datetime.datetime.now()
 
-        order_collection.update_one(
-            {"order_id": order_id},
+        order = guarded_update(
+            {**query,"order_status":{"$nin":["Delivered","Cancelled"]}},
             {"$set": {
                 "shipping_address": updated_address,
                 "updated_timestamp": updated_timestamp
-            }}
+            },"$inc":{"version":1}}
         )
-
-        # return updated order
-        updated_order = order_collection.find_one({"order_id": order_id})
-        updated_order.pop("_id", None)
+        if not order:
+            order = current_order(query)
+            if not order:
+                abort(404,message="For the given user,there is no such order present")
+            shipping_status = order["order_status"]
+            if shipping_status=="Delivered":
+                abort(403,message="Order has been delivered")
+            if shipping_status=="Cancelled":
+                abort(403,message=f"Order cannot be updated as it is {shipping_status}")
+            abort(409,message="Order status changed, please try again")
+
+        updated_order = {**order,"shipping_address":updated_address,"updated_timestamp":updated_timestamp,
+                         "version":order.get("version",0)+1}
+        after_order_write(order,updated_order)
         return updated_order
     
 
@@ -288,14 +414,71 @@ class UserOrderStatus(MethodView):
        @order_app.response(200)
        def get(self):
         current_user = get_jwt_identity()
-
-        orders = list(order_collection.find({"user_id":current_user}))
-        if not orders:
-            return "No orders placed yet"
-        for o in orders:
-            o.pop("_id",None)
-        return orders
+        return user_orders_response(list(order_collection.find(*user_orders_query(current_user))))
        
+
+@order_app.route("/user_order_summaries")
+class UserOrderSummaries(MethodView):
+
+    @jwt_required()
+    @order_app.arguments(OrderSummaryQuerySchema,location="query",description="Page through the current user's orders, newest first")
+    @order_app.response(200)
+    def get(self,args):
+        current_user = get_jwt_identity()
+        limit = args["limit"]
+        # fetch one extra summary to know if there is a next page
+        summaries = list(order_summary_collection.find(
+            summary_filter(current_user,args),
+            {"_id":0,"user_id":0},
+            sort=[("created_at",-1),("order_id",-1)],
+            limit=limit+1
+        ))
+        headers = {}
+        if len(summaries) > limit:
+            summaries = summaries[:limit]
+            last = summaries[-1]
+            headers["X-Next-Cursor"] = f"{last['created_at'].isoformat()}|{last['order_id']}"
+        etag = listing_etag(summaries,"order_id",args,headers.get("X-Next-Cursor"))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        headers.update(etag_header(etag))
+        return summaries, headers
+
+
+def summary_filter(user_id,args):
+    """Mongo filter for a page of order summaries (keyset on created_at, order_id)"""
+    query = {"user_id":user_id}
+    if "order_status" in args:
+        query["order_status"] = args["order_status"]
+    if "cursor" in args:
+        try:
+            created_at,last_order_id = args["cursor"].split("|",1)
+            created_at = datetime.datetime.fromisoformat(created_at)
+        except ValueError:
+            abort(400,message="Invalid cursor")
+        query["$or"] = [
+            {"created_at":{"$lt":created_at}},
+            {"created_at":created_at,"order_id":{"$lt":last_order_id}}
+        ]
+    return query
+
+
+@order_app.route("/user_order/<order_id>")
+class UserOrderDetail(MethodView):
+
+    @jwt_required()
+    @order_app.response(200)
+    def get(self,order_id):
+        order = order_collection.find_one({"order_id":order_id,"user_id":get_jwt_identity()},{"_id":0})
+        if not order:
+            abort(404,message="Order not found")
+        etag = document_etag(order)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        return order, etag_header(etag)
+
 @order_app.route("/update_order_status/<order_id>")
 class Update_Order_Status(MethodView):
 
@@ -308,43 +491,35 @@ class Update_Order_Status(MethodView):
         if claims.get("role")!="admin":
             abort(403,message="Admins only")
 
-        order = order_collection.find_one({"order_id":order_id})
-        if not order:
-            abort(404,message="Order does not exist")
-
         new_status = data["order_status"]
-        current_status = order.get("order_status")
-        if current_status=="Cancelled" or current_status=="Delivered":
-            abort(400,message=f"Cannot change status of order which is {current_status}")
-
-        # Simple status flow validation
-        valid_transitions = {
-            "Pending": ["Confirmed", "Cancelled"],
-            "Confirmed": ["Shipped", "Cancelled"],
-            "Shipped": ["Delivered"],
-            "Delivered": [],
-            "Cancelled": []
-        }
-
-        if new_status not in valid_transitions.get(current_status, []):
-            abort(400, message=f"Invalid status transition from {current_status} to {new_status}")
-
+        #only orders in a status that may move to new_status are updated
+        sources = [status for status,targets in VALID_TRANSITIONS.items() if new_status in targets]
         updated_timestamp = datetime.datetime.now()
 
-        order_collection.update_one(
-            {"order_id": order_id},
+        order = guarded_update(
+            {"order_id":order_id,"order_status":{"$in":sources}},
             {"$set": {
                 "order_status": new_status,
                 "updated_timestamp": updated_timestamp
-            }}
+            },"$inc":{"version":1}}
         )
-
-        updated_order = order_collection.find_one({"order_id": order_id})
-        updated_order.pop("_id", None)
+        if not order:
+            order = current_order({"order_id":order_id})
+            if not order:
+                abort(404,message="Order does not exist")
+            current_status = order.get("order_status")
+            if current_status=="Cancelled" or current_status=="Delivered":
+                abort(400,message=f"Cannot change status of order which is {current_status}")
+            if new_status not in VALID_TRANSITIONS.get(current_status, []):
+                abort(400, message=f"Invalid status transition from {current_status} to {new_status}")
+            abort(409,message="Order status changed, please try again")
+
+        after_order_write(order,{**order,"order_status":new_status,"updated_timestamp":updated_timestamp,
+                                 "version":order.get("version",0)+1})
         return {
             "message": "Order status updated successfully",
             "order_id": order_id,
-            "old_status": current_status,
+            "old_status": order["order_status"],
             "new_status": new_status
         }       
-        
\ No newline at end of file
+        
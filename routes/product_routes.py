@@ -1,21 +1,28 @@
 import uuid
-import re
-import bcrypt
-from db import db
 from flask_smorest import Blueprint,abort
 from flask.views import MethodView
 from schema.product_schema import *
 from db.mongo_db import db
-import os
-from dotenv import load_dotenv,find_dotenv
-from flask_jwt_extended import create_access_token,jwt_required,get_jwt
+from flask_jwt_extended import jwt_required,get_jwt
 from datetime import datetime
-from bson import ObjectId
+from schema.export_schema import ExportQuerySchema
+from utils.export import export_response
+from utils.product_cache import product_cache
+from utils.product_import import import_products, read_rows
+from utils.stock import bulk_adjust_stock
+from flask import request, current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.etags import document_etag, etag_header, if_match_filter, listing_etag, not_modified
 
 prouct_app = Blueprint("product","__name__",url_prefix="/product")
 
 product_collection = db.products
 
+#fields written by the product export
+PRODUCT_FIELDS = ["product_id","product_type","product_name","product_desc","product_price",
+                  "quantity_present","is_active","sku","timestamp","updated_timestamp"]
+
 # product_collection.delete_many({})
 
 '''
@@ -26,23 +33,162 @@ Get product details
 class Get_Product(MethodView):
 
     @jwt_required()
+    @prouct_app.arguments(Product_Query_Schema,location="query",description="Filter and page through products")
     @prouct_app.response(200)
-    def get(self):
+    def get(self,args):
         claims = get_jwt()
         is_admin = claims.get("role") == "admin"
         # if claims.get("role") != "admin":
         #     abort(403, message="Admins only")
-        
-        products = list(product_collection.find({}))
-        for p in products:
-            p["_id"] = str(p["_id"])
-            if not is_admin:
-                p.pop("_id",None)
-                p.pop("product_id",None)
-                p.pop("timestamp")
-        return products
+
+        query,options = listing_query(args,is_admin)
+        products = list(product_collection.find(*query,**options))
+        return listing_page(products,args,is_admin)
+
+
+@prouct_app.route("/get_product/<product_id>")
+class Get_Single_Product(MethodView):
+
+    @jwt_required()
+    @prouct_app.response(200)
+    def get(self,product_id):
+        claims = get_jwt()
+        is_admin = claims.get("role") == "admin"
+        product = product_collection.find_one({"product_id":product_id},product_projection(is_admin))
+        if not product:
+            abort(404,message="Product does not exist")
+
+        # the ETag to send back in If-Match when updating the product
+        etag = document_etag(product)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        return response_product(product,is_admin), etag_header(etag)
+
+
+def product_filter(args):
+    """Build the mongo filter for a product listing (keyset on the unique sku)"""
+    query = {}
+    if "after" in args:
+        query["sku"] = {"$gt":args["after"]}
+    if "product_type" in args:
+        query["product_type"] = args["product_type"]
+    if "is_active" in args:
+        query["is_active"] = args["is_active"]
+    price = {}
+    if "min_price" in args:
+        price["$gte"] = args["min_price"]
+    if "max_price" in args:
+        price["$lte"] = args["max_price"]
+    if price:
+        query["product_price"] = price
+    return query
+
+
+def product_projection(is_admin):
+    """Non-admins never get internal ids or timestamps, nobody gets in-flight stock operation tags.
+    The version is fetched for the ETag; response_product drops it for non-admins"""
+    if is_admin:
+        return {"reservations":0,"adjustments":0}
+    return {"_id":0,"product_id":0,"timestamp":0,"reservations":0,"adjustments":0}
+
+
+def response_product(product,is_admin):
+    """A product fetched with product_projection, as it is sent back once its ETag is computed"""
+    if is_admin:
+        product["_id"] = str(product["_id"])
+        return product
+    return {k:v for k,v in product.items() if k!="version"}
+
+
+def listing_query(args,is_admin):
+    """find() arguments of a listing page, shared with the async handler in asgi.py"""
+    # fetch one extra document to know if there is a next page
+    return (product_filter(args),product_projection(is_admin)),{"sort":[("sku",1)],"limit":args["limit"]+1}
+
+
+def listing_page(products,args,is_admin):
+    """The response to a listing page fetched with listing_query, or a 304"""
+    limit = args["limit"]
+    headers = {}
+    if len(products) > limit:
+        products = products[:limit]
+        headers["X-Next-Cursor"] = products[-1]["sku"]
+
+    # answered from the versions of the page, before anything is serialized
+    etag = listing_etag(products,"sku",is_admin,args,headers.get("X-Next-Cursor"))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    headers.update(etag_header(etag))
+
+    return [response_product(p,is_admin) for p in products], headers
     
 
+@prouct_app.route("/export")
+class Export_Products(MethodView):
+
+    @jwt_required()
+    @prouct_app.arguments(ExportQuerySchema,location="query",description="Stream the whole catalog as NDJSON or CSV")
+    def get(self,args):
+        claims = get_jwt()
+        if claims.get("role") != "admin":
+            abort(403, message="Admins only")
+        return export_response(product_collection,{},PRODUCT_FIELDS,args["format"],"products")
+
+
+@prouct_app.route("/cache_stats")
+class Product_Cache_Stats(MethodView):
+
+    @jwt_required()
+    @prouct_app.response(200)
+    def get(self):
+        claims = get_jwt()
+        if claims.get("role") != "admin":
+            abort(403, message="Admins only")
+        return product_cache.stats()
+
+
+@prouct_app.route("/import")
+class Import_Products(MethodView):
+
+    @jwt_required()
+    @prouct_app.arguments(Product_Import_Query_Schema,location="query",
+                          description="Upsert products by sku from an NDJSON or CSV request body")
+    @prouct_app.response(200)
+    def post(self,args):
+        claims = get_jwt()
+        if claims.get("role") != "admin":
+            abort(403, message="Admins only")
+        # the body is read row by row, never loaded whole
+        result = import_products(
+            product_collection,
+            read_rows(request.stream,args["format"]),
+            chunk_size=current_app.config.get("IMPORT_CHUNK_SIZE",1000)
+        )
+        if result["inserted"] or result["updated"]:
+            product_cache.invalidate()
+        return result
+
+
+@prouct_app.route("/stock_adjust")
+class Adjust_Stock(MethodView):
+
+    @jwt_required()
+    @prouct_app.arguments(Stock_Adjust_Schema,description="Receive (delta) or count (set) stock for many skus",example={
+        "adjustments":[{"sku":"APPLE-MBP-001","delta":25},{"sku":"APPLE-MBP-002","set":12}]})
+    @prouct_app.response(200)
+    def post(self,data):
+        claims = get_jwt()
+        if claims.get("role") != "admin":
+            abort(403, message="Admins only")
+        return bulk_adjust_stock(
+            product_collection,
+            data["adjustments"],
+            chunk_size=current_app.config.get("STOCK_ADJUST_CHUNK_SIZE",1000)
+        )
+
+
 '''
 Add Products
 '''
@@ -104,9 +250,15 @@ class Add_Product(MethodView):
             "quantity_present":prd_quantity,
             "is_active":prd_status,
             "sku":sku,
-            "timestamp":tmst
+            "timestamp":tmst,
+            "version":1
         }   
-        product_collection.insert_one(product_to_be_inserted)
+        #the unique sku index settles two adds of the same sku racing past the check above
+        try:
+            product_collection.insert_one(product_to_be_inserted)
+        except DuplicateKeyError:
+            abort(409,message="sku exists")
+        product_cache.invalidate()
 
         return {"product_id":product_id,
                 "product_type":prd_type,
@@ -130,6 +282,7 @@ class Delete_Product(MethodView):
             abort(404,message="Product not found")
 
         product_collection.delete_one({"product_id":product_id})
+        product_cache.invalidate()
         return {"message": "Product deleted successfully"}    
 
 '''
@@ -146,22 +299,31 @@ class Update_Products(MethodView):
         claims = get_jwt()
         if claims.get("role") != "admin":
             abort(403, message="Admins only")
-        if not product_collection.find_one({"product_id":product_id}):
-            abort(404,message="Product does not exists")
 
-        product_collection.update_one(
-            {"product_id":product_id},
-            {"$set":{
-                "product_name":data["product_name"],
-                "product_desc":data["product_desc"],
-                "product_price":data["product_price"],
-                "quantity_present":data["quantity_present"],
-                "is_active":data["is_active"],
-                "sku":data["sku"],
-                "updated_timestamp": datetime.now()
-            }}
-        ) 
-        return {"message": "Product updated successfully"}
+        # with If-Match the write only happens on the version the client has seen
+        try:
+            product = product_collection.find_one_and_update(
+                {"product_id":product_id,**if_match_filter()},
+                {"$set":{
+                    "product_name":data["product_name"],
+                    "product_desc":data["product_desc"],
+                    "product_price":data["product_price"],
+                    "quantity_present":data["quantity_present"],
+                    "is_active":data["is_active"],
+                    "sku":data["sku"],
+                    "updated_timestamp": datetime.now()
+                },
+                "$inc":{"version":1}},
+                projection={"_id":0,"version":1},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            abort(409,message="sku exists")
+        if not product:
+            precondition_failed(product_id)
+            abort(404,message="Product does not exists")
+        product_cache.invalidate()
+        return {"message": "Product updated successfully"}, etag_header(document_etag(product))
 
     
 @prouct_app.route("/update/<product_id>")
@@ -176,15 +338,6 @@ class Update_Product(MethodView):
         if claims.get("role") != "admin":
             abort(403, message="Admins only")
 
-        product = product_collection.find_one({"product_id": product_id})
-        if not product:
-            abort(404, message="Product does not exist")
-
-        # Save old values for response
-        old_price = product.get("product_price")
-        old_quantity = product.get("quantity_present")
-        old_is_active = product.get("is_active")
-
         # Update fields dynamically
         update_fields = {}
         if "product_price" in data:
@@ -196,10 +349,22 @@ class Update_Product(MethodView):
 
         update_fields["updated_timestamp"] = datetime.now()
 
-        product_collection.update_one(
-            {"product_id": product_id},
-            {"$set": update_fields}
+        # one round trip, returning the old values; with If-Match only on the version the client has seen
+        product = product_collection.find_one_and_update(
+            {"product_id": product_id, **if_match_filter()},
+            {"$set": update_fields, "$inc": {"version": 1}},
+            projection={"_id": 0, "product_price": 1, "quantity_present": 1, "is_active": 1, "version": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if not product:
+            precondition_failed(product_id)
+            abort(404, message="Product does not exist")
+        product_cache.invalidate()
+
+        # Save old values for response
+        old_price = product.get("product_price")
+        old_quantity = product.get("quantity_present")
+        old_is_active = product.get("is_active")
 
         return {
             "old_price": old_price,
@@ -208,4 +373,10 @@ class Update_Product(MethodView):
             "new_quantity": data.get("quantity_present", old_quantity),
             "old_active_status": old_is_active,
             "new_active_status": data.get("is_active", old_is_active)
-        }
\ No newline at end of file
+        }, etag_header(str(product.get("version", 0) + 1))
+
+
+def precondition_failed(product_id):
+    """412 when an If-Match write missed only because the product has moved on"""
+    if request.if_match and product_collection.find_one({"product_id":product_id},{"_id":1}):
+        abort(412,message="Product was modified, reload it and retry")
@@ -1,6 +1,5 @@
 import uuid
 import re
-import bcrypt
 from flask import g
 from db import db
 from flask_smorest import Blueprint,abort
@@ -13,6 +12,10 @@ from flask_jwt_extended import create_access_token,jwt_required,get_jwt,get_jwt_
 # from flask_limiter import Limiter     
 # from flask_limiter.util import get_remote_address
 from utils.rate_limiter import limiter
+from utils.passwords import password_hasher
+from schema.export_schema import ExportQuerySchema
+from utils.export import export_response
+from pymongo.errors import DuplicateKeyError
 
 
 
@@ -48,6 +51,18 @@ class Get_User(MethodView):
             u.pop("_id",None)
         return users
 
+@user_app.route("/export")
+class Export_Users(MethodView):
+
+    @jwt_required()
+    @user_app.arguments(ExportQuerySchema,location="query",description="Stream every buyer as NDJSON or CSV")
+    def get(self,args):
+        claims = get_jwt()
+        if claims.get("role")!="admin":
+            abort(403,message="Admins Only")
+        # password hashes are never exported
+        return export_response(user_collection,{"user_id":{"$ne":admin_id}},["user_id","user_name","user_role"],args["format"],"users")
+
 '''
 Create User
 '''
@@ -81,12 +96,14 @@ class Create_User(MethodView):
         if not re.match(password_pattern,data["user_password"]):
             abort(400,message="Password should contain atleast one upper case, one lower case, one special character and one numerical character")
 
-        password_hash = bcrypt.hashpw(data["user_password"].encode("utf-8"),bcrypt.gensalt())
-        data["user_password"] = password_hash.decode("utf-8")
+        data["user_password"] = password_hasher.hash(data["user_password"])
 
         try:
             result = user_collection.insert_one(data) 
 
+        except DuplicateKeyError:
+            #the unique user_name index caught a sign-up that raced the check above
+            abort(400,message="Username already present.Please select other")
         except Exception as e:
             print(f"Unable to create user: {e}")  
             abort(500,message="Unable to create User")
@@ -114,10 +131,10 @@ class Reset_User_Password(MethodView):
         if not user:
             abort(404,message="No such username present")
 
-        if not bcrypt.checkpw(data["user_password"].encode("utf-8"), user["user_password"].encode("utf-8")):
+        if not password_hasher.check(data["user_password"], user["user_password"]):
             abort(401,message="Bad Request,password does not match")   
 
-        updated_password = bcrypt.hashpw(data["new_password"].encode("utf-8"),bcrypt.gensalt()).decode("utf-8") 
+        updated_password = password_hasher.hash(data["new_password"])
         user_collection.update_one(
             {
                 "user_name":user_name
@@ -145,9 +162,16 @@ class Create_Access_Token(MethodView):
         if not user:
             abort(404,message="User not found")
 
-        if not bcrypt.checkpw(data["user_password"].encode("utf-8"),user["user_password"].encode("utf-8")):
+        if not password_hasher.check(data["user_password"],user["user_password"]):
             abort(401,message="Bad request, password does not match")    
 
+        #upgrade hashes made with an outdated cost while we know the password
+        if password_hasher.needs_rehash(user["user_password"]):
+            user_collection.update_one(
+                {"user_id":user["user_id"],"user_password":user["user_password"]},
+                {"$set":{"user_password":password_hasher.hash(data["user_password"])}}
+            )
+
         token = create_access_token(identity=str(user["user_id"]),
                                     additional_claims={"role":"admin" if user["user_name"]==admin_name else "user"}
                                     )
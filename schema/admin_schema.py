@@ -0,0 +1,16 @@
+from marshmallow import Schema,fields,validate
+
+
+class Slow_Queries_Query_Schema(Schema):
+    limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=200))
+    collscan = fields.Bool(load_default=False)
+    #explain the slowest shapes seen by this worker before answering
+    explain = fields.Bool(load_default=False)
+
+
+class Profiles_Query_Schema(Schema):
+    limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=200))
+
+
+class Profile_Download_Schema(Schema):
+    format = fields.Str(load_default="json", validate=validate.OneOf(["json", "pstats", "callgrind"]))
@@ -0,0 +1,11 @@
+from marshmallow import Schema,fields,validate
+
+
+class Analytics_Range_Schema(Schema):
+    start = fields.Date()
+    end = fields.Date()
+
+
+class Top_Sellers_Query_Schema(Analytics_Range_Schema):
+    limit = fields.Int(load_default=10, validate=validate.Range(min=1, max=100))
+    by = fields.Str(load_default="units", validate=validate.OneOf(["units", "revenue", "orders"]))
@@ -0,0 +1,132 @@
+from marshmallow import Schema, fields, missing
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.utils import ensure_text_type
+
+'''
+Compiled dump functions for the hot response schemas.
+
+marshmallow dumps every document by walking the schema's fields and calling
+each field's get_value/serialize through several layers of generic code.
+For the schemas mixing in CompiledDumpMixin, the fields are read once when
+the schema is first instantiated and turned into the source of one plain function
+per schema (nested schemas get their own), which does exactly the same
+lookups and conversions inline. Anything the generator does not know how
+to inline exactly is either delegated to the field's own _serialize, or
+the whole schema keeps using marshmallow.
+'''
+
+# dict attributes that marshmallow would find through getattr on a missing key
+_DICT_ATTRIBUTES = set(dir(dict))
+
+# the dumpers already generated, keyed by schema class and dumped fields
+_dumpers = {}
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+def _plain_schema(schema):
+    """True when dumping ``schema`` is only a matter of its fields"""
+    # hooks are keyed by (tag, pass_many)
+    dump_hooks = [key for key, names in schema._hooks.items() if names and key[0] in (PRE_DUMP, POST_DUMP)]
+    return (
+        not dump_hooks
+        and type(schema).get_attribute is Schema.get_attribute
+        and schema.dict_class is dict
+    )
+
+
+class _Generator:
+
+    def __init__(self):
+        self.namespace = {"missing": missing, "text": ensure_text_type}
+        self.functions = []
+        self.counter = 0
+
+    def name(self, prefix):
+        self.counter += 1
+        return f"{prefix}_{self.counter}"
+
+    def value(self, field, attr_name, v):
+        """Expression serializing ``v`` (known not to be missing) like ``field`` does"""
+        kind = type(field)
+        if kind is fields.String:
+            return f"(None if {v} is None else {v} if {v}.__class__ is str else text({v}))"
+        if kind is fields.Integer and not field.as_string:
+            return f"(None if {v} is None else {v} if {v}.__class__ is int else int({v}))"
+        if kind is fields.Float and not field.as_string:
+            return f"(None if {v} is None else float({v}))"
+        if kind is fields.DateTime and (field.format or field.DEFAULT_FORMAT) in ("iso", "iso8601"):
+            return f"(None if {v} is None else {v}.isoformat())"
+        # the field objects belong to the schema instance, they are looked up on the one dumping
+        bound = f"schema.dump_fields[{attr_name!r}]"
+        if kind is fields.Nested and not field.many and not field.schema.many:
+            nested = self.schema(field.schema)
+            return f"(None if {v} is None else {nested}({v}, {bound}.schema))"
+        if kind is fields.List and type(field.inner) is fields.Nested \
+                and not field.inner.many and not field.inner.schema.many:
+            nested = self.schema(field.inner.schema)
+            return (f"(None if {v} is None else [None if x is None else {nested}(x, nested) "
+                    f"for nested in ({bound}.inner.schema,) for x in {v}])")
+        # exact by construction, just not inlined
+        return f"{bound}._serialize({v}, {attr_name!r}, obj)"
+
+    def schema(self, schema):
+        """Generate the dump function of ``schema``, returning its name"""
+        if not _plain_schema(schema):
+            raise _NotCompilable(type(schema).__name__)
+        function = self.name(f"dump_{type(schema).__name__}")
+        lines = [f"def {function}(obj, schema):",
+                 "    if obj.__class__ is not dict:",
+                 "        return schema._serialize(obj)",
+                 "    out = {}"]
+        for attr_name, field in schema.dump_fields.items():
+            key = field.attribute or attr_name
+            out_key = field.data_key if field.data_key is not None else attr_name
+            if not field._CHECK_ATTRIBUTE:
+                # Method/Function fields compute their value from the whole object
+                lines += [f"    v = schema.dump_fields[{attr_name!r}]._serialize(None, {attr_name!r}, obj)",
+                          "    if v is not missing:",
+                          f"        out[{out_key!r}] = v"]
+                continue
+            if "." in key or key in _DICT_ATTRIBUTES or field.dump_default is not missing:
+                raise _NotCompilable(f"{type(schema).__name__}.{attr_name}")
+            lines += [f"    v = obj.get({key!r}, missing)",
+                      "    if v is not missing:",
+                      f"        out[{out_key!r}] = {self.value(field, attr_name, 'v')}"]
+        lines.append("    return out")
+        self.functions.append("\n".join(lines))
+        return function
+
+    def build(self, schema):
+        function = self.schema(schema)
+        exec("\n\n".join(self.functions), self.namespace)
+        return self.namespace[function]
+
+
+def compile_dump(schema):
+    """A function dumping one document like ``schema.dump`` does, None when it needs marshmallow"""
+    key = (type(schema), tuple(schema.dump_fields))
+    if key not in _dumpers:
+        try:
+            _dumpers[key] = _Generator().build(schema)
+        except _NotCompilable:
+            _dumpers[key] = None
+    return _dumpers[key]
+
+
+class CompiledDumpMixin:
+    """Dump with a generated function instead of the generic field machinery (same output)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled_dump = compile_dump(self)
+
+    def dump(self, obj, *, many=None):
+        if self._compiled_dump is None:
+            return super().dump(obj, many=many)
+        many = self.many if many is None else bool(many)
+        if many and obj is not None:
+            return [self._compiled_dump(doc, self) for doc in obj]
+        return self._compiled_dump(obj, self)
@@ -0,0 +1,5 @@
+from marshmallow import Schema,fields,validate
+
+
+class ExportQuerySchema(Schema):
+    format = fields.Str(load_default="ndjson",validate=validate.OneOf(["ndjson", "csv"]))
@@ -1,6 +1,16 @@
 from marshmallow import Schema,fields,validate
 # from marshmallow_enum import EnumField
 import enum
+from schema.compiled import CompiledDumpMixin
+
+#order status flow, used as the update guard of /orders/update_order_status
+VALID_TRANSITIONS = {
+    "Pending": ["Confirmed", "Cancelled"],
+    "Confirmed": ["Shipped", "Cancelled"],
+    "Shipped": ["Delivered"],
+    "Delivered": [],
+    "Cancelled": []
+}
 
 class ProductInOrderSchema(Schema):
     product_id = fields.Str(required=True)
@@ -18,7 +28,7 @@ class ProductPostOrderSchema(Schema):
     product_quantity = fields.Int(required=True)
 
 
-class OrderSchema(Schema):
+class OrderSchema(CompiledDumpMixin,Schema):
 
     order_id = fields.Str(required=True)
     user_name = fields.Str(required=True)
@@ -62,3 +72,7 @@ class UpdateOrderStatusSchema(Schema):
     order_status = fields.Str(required=True,validate=validate.OneOf(["Pending", "Confirmed", "Shipped", "Delivered"]))    
 
 
+class OrderSummaryQuerySchema(Schema):
+    limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=100))
+    cursor = fields.Str()
+    order_status = fields.Str(validate=validate.OneOf(["Pending", "Confirmed", "Shipped", "Delivered", "Cancelled"]))
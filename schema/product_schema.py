@@ -1,4 +1,4 @@
-from marshmallow import Schema,fields,validate
+from marshmallow import Schema,fields,validate,validates_schema,ValidationError
 # from marshmallow_enum import EnumField
 import enum
 
@@ -34,4 +34,33 @@ class Update_Product_Schema(Product_Schema):
 class Patch_Product_Schema(Schema):
     product_price = fields.Float()
     quantity_present = fields.Int()
-    is_active = fields.Bool()    
\ No newline at end of file
+    is_active = fields.Bool()
+
+
+class Product_Query_Schema(Schema):
+    limit = fields.Int(load_default=50, validate=validate.Range(min=1, max=500))
+    after = fields.Str()
+    product_type = fields.Str(validate=validate.OneOf(["Laptop", "Smartphone", "TV", "Refrigerator", "WashingMachine"]))
+    min_price = fields.Float(validate=validate.Range(min=0))
+    max_price = fields.Float(validate=validate.Range(min=0))
+    is_active = fields.Bool()
+
+
+class Product_Import_Query_Schema(Schema):
+    format = fields.Str(load_default="ndjson", validate=validate.OneOf(["ndjson", "csv"]))
+
+
+class Stock_Adjustment_Schema(Schema):
+    sku = fields.Str(required=True)
+    delta = fields.Int()
+    set = fields.Int(validate=validate.Range(min=0))
+
+    @validates_schema
+    def one_of_delta_or_set(self, data, **kwargs):
+        if ("delta" in data) == ("set" in data):
+            raise ValidationError("Give either delta or set")
+
+
+class Stock_Adjust_Schema(Schema):
+    adjustments = fields.List(fields.Nested(Stock_Adjustment_Schema), required=True,
+                              validate=validate.Length(min=1, max=10000))
@@ -1,6 +1,7 @@
 from marshmallow import Schema,fields
+from schema.compiled import CompiledDumpMixin
 
-class User_Schema(Schema):
+class User_Schema(CompiledDumpMixin,Schema):
 
     user_id = fields.Str()
     user_name = fields.Str()
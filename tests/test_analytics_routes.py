@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+class TestAnalyticsRoutes:
+    """Test suite for the analytics routes"""
+
+    @pytest.fixture
+    def rollups(self, app):
+        daily, products = MagicMock(), MagicMock()
+        with patch('routes.analytics_routes.sales_daily_collection', daily):
+            with patch('routes.analytics_routes.sales_product_daily_collection', products):
+                yield daily, products
+
+    def test_daily_sales(self, client, admin_token, rollups):
+        """Test that daily sales are read from the rollups for the requested range"""
+        daily, _ = rollups
+        daily.find.return_value = [
+            {"_id": "2026-03-01", "orders": 2, "units": 3, "revenue": 30.0},
+            {"_id": "2026-03-02", "orders": 1, "units": 1, "revenue": 5.0},
+        ]
+
+        response = client.get(
+            '/analytics/daily_sales?start=2026-03-01&end=2026-03-07',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert (data['orders'], data['units'], data['revenue']) == (3, 4, 35.0)
+        assert data['days'][0]['day'] == '2026-03-01'
+        assert daily.find.call_args[0][0] == {"_id": {"$gte": "2026-03-01", "$lte": "2026-03-07"}}
+
+    def test_top_sellers(self, client, admin_token, rollups):
+        _, products = rollups
+        products.aggregate.return_value = [{"product_id": "p1", "sku": "A", "units": 9}]
+
+        response = client.get(
+            '/analytics/top_sellers?start=2026-03-01&end=2026-03-31&by=revenue&limit=5',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['products'][0]['sku'] == 'A'
+        pipeline = products.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"day": {"$gte": "2026-03-01", "$lte": "2026-03-31"}}}
+        assert {"$limit": 5} in pipeline
+        assert next(s for s in pipeline if "$sort" in s and "revenue" in s["$sort"])
+
+    def test_invalid_range(self, client, admin_token, rollups):
+        response = client.get(
+            '/analytics/daily_sales?start=2026-03-07&end=2026-03-01',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+
+        assert response.status_code == 400
+
+    def test_admin_only(self, client, user_token, rollups):
+        response = client.get(
+            '/analytics/top_sellers',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+
+        assert response.status_code == 403
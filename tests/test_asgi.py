@@ -0,0 +1,218 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+from flask_jwt_extended import create_access_token
+
+
+class FakeCursor:
+    """Minimal AsyncCursor: to_list() and async iteration"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+    def __aiter__(self):
+        self._it = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """Records calls like a MagicMock but with awaitable methods"""
+
+    def __init__(self, docs=None, one=None, matched_count=1):
+        self.docs = docs or []
+        self.one = one
+        self.calls = []
+        self.matched_count = matched_count
+
+    def find(self, *args, **kwargs):
+        self.calls.append(("find", args, kwargs))
+        return FakeCursor(self.docs)
+
+    async def find_one(self, *args, **kwargs):
+        self.calls.append(("find_one", args, kwargs))
+        return self.one
+
+    async def insert_one(self, doc, **kwargs):
+        self.calls.append(("insert_one", (doc,), kwargs))
+
+    async def bulk_write(self, ops, **kwargs):
+        self.calls.append(("bulk_write", (ops,), kwargs))
+        return MagicMock(matched_count=self.matched_count)
+
+    async def update_many(self, *args, **kwargs):
+        self.calls.append(("update_many", args, kwargs))
+
+
+class TestAsgi:
+    """Test suite for the async (ASGI) request handling mode"""
+
+    @pytest.fixture
+    def asgi_mod(self, app, monkeypatch):
+        import asgi
+        fake = MagicMock()
+        monkeypatch.setattr(asgi, "adb", lambda: fake)
+        asgi.fake_db = fake
+        return asgi
+
+    def _token(self, asgi_mod, identity, role):
+        with asgi_mod.flask_app.app_context():
+            return create_access_token(identity=identity, additional_claims={"role": role})
+
+    def _call(self, asgi_mod, method, path, token=None, body=None, query=b"", extra_headers=()):
+        headers = [(b"content-type", b"application/json")]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        headers += [(k.encode(), v.encode()) for k, v in extra_headers]
+        scope = {"type": "http", "method": method, "path": path, "query_string": query,
+                 "headers": headers, "client": ("10.0.0.1", 1234), "server": ("localhost", 80)}
+        payload = json.dumps(body).encode() if body is not None else b""
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(asgi_mod.app(scope, receive, send))
+        start = messages[0]
+        raw = b"".join(m.get("body", b"") for m in messages[1:])
+        return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, raw
+
+    def test_get_products_async(self, asgi_mod, sample_product):
+        """Test the async product listing pushes filters and projection to Mongo"""
+        projected = {k: v for k, v in sample_product.items() if k not in ("_id", "product_id", "timestamp")}
+        asgi_mod.fake_db.products = FakeCollection(docs=[projected, {**projected, "sku": "Z"}])
+
+        status, headers, raw = self._call(asgi_mod, "GET", "/product/get_products",
+                                          token=self._token(asgi_mod, "user-001", "user"),
+                                          query=b"limit=1&product_type=Laptop")
+
+        assert status == 200
+        assert len(json.loads(raw)) == 1
+        assert headers["x-next-cursor"] == sample_product["sku"]
+        _, args, kwargs = asgi_mod.fake_db.products.calls[0]
+        assert args == ({"product_type": "Laptop"}, {"_id": 0, "product_id": 0, "timestamp": 0, "reservations": 0, "adjustments": 0})
+        assert kwargs == {"sort": [("sku", 1)], "limit": 2}
+
+    def test_get_products_async_etag(self, asgi_mod, client, mock_db, sample_product):
+        """Test that the async listing sends the sync listing's ETag and answers If-None-Match with a 304"""
+        projected = {k: v for k, v in sample_product.items() if k not in ("_id", "product_id", "timestamp")}
+        asgi_mod.fake_db.products = FakeCollection(docs=[{**projected, "version": 3}])
+        mock_db.products.find.return_value = [{**projected, "version": 3}]
+        token = self._token(asgi_mod, "user-001", "user")
+
+        status, headers, _ = self._call(asgi_mod, "GET", "/product/get_products", token=token, query=b"limit=5")
+        sync_etag = client.get('/product/get_products?limit=5', headers={'Authorization': f'Bearer {token}'}).headers['ETag']
+        assert status == 200
+        assert headers["etag"] == sync_etag
+
+        status, headers, raw = self._call(asgi_mod, "GET", "/product/get_products", token=token, query=b"limit=5",
+                                          extra_headers=[("if-none-match", sync_etag)])
+        assert (status, raw, headers["etag"]) == (304, b"", sync_etag)
+
+        asgi_mod.fake_db.products = FakeCollection(docs=[{**projected, "version": 4}])
+        status, _, _ = self._call(asgi_mod, "GET", "/product/get_products", token=token, query=b"limit=5",
+                                  extra_headers=[("if-none-match", sync_etag)])
+        assert status == 200
+
+    def test_missing_token(self, asgi_mod):
+        """Test that async handlers require a JWT"""
+        status, _, raw = self._call(asgi_mod, "GET", "/product/get_products")
+
+        assert status == 401
+
+    def test_get_orders_admin_only(self, asgi_mod):
+        """Test that the async order listing is admin only"""
+        status, _, _ = self._call(asgi_mod, "GET", "/orders/get_orders",
+                                  token=self._token(asgi_mod, "user-001", "user"))
+
+        assert status == 403
+
+    def test_invalid_query(self, asgi_mod):
+        """Test that query validation matches the sync route"""
+        status, _, raw = self._call(asgi_mod, "GET", "/product/get_products",
+                                    token=self._token(asgi_mod, "user-001", "user"), query=b"limit=0")
+
+        assert status == 422
+        assert "limit" in json.loads(raw)["errors"]["query"]
+
+    def test_create_order_async(self, asgi_mod, sample_user, sample_product):
+        """Test async order creation reserves stock and inserts the order"""
+        asgi_mod.fake_db.users = FakeCollection(one=sample_user)
+        asgi_mod.fake_db.products = FakeCollection(docs=[sample_product])
+        asgi_mod.fake_db.orders = FakeCollection()
+
+        status, _, raw = self._call(asgi_mod, "POST", "/orders/create_order",
+                                    token=self._token(asgi_mod, "user-001", "user"),
+                                    body={"user_id": "user-001",
+                                          "products": [{"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15",
+                                                        "product_type": "Laptop", "product_quantity": 2}],
+                                          "payment_method": "Credit Card", "shipping_address": "123 Test Street"})
+
+        assert status == 201
+        assert json.loads(raw)["order_details"]["order_quantity"] == 2
+        assert [c[0] for c in asgi_mod.fake_db.products.calls] == ["find", "bulk_write", "update_many"]
+        assert [c[0] for c in asgi_mod.fake_db.orders.calls] == ["insert_one"]
+
+    def test_other_routes_fall_back_to_flask(self, asgi_mod):
+        """Test that routes without an async handler are served by the Flask app"""
+        status, _, raw = self._call(asgi_mod, "GET", "/product/cache_stats",
+                                    token=self._token(asgi_mod, "admin-001", "admin"))
+
+        assert status == 200
+        assert "hits" in json.loads(raw)
+
+    def test_rate_limits_shared_with_flask(self, asgi_mod, mock_db, monkeypatch):
+        """Test that the async handlers count against the sync routes' limits and answer 429 like them"""
+        from app import create_app
+        from utils.rate_limiter import limiter
+        monkeypatch.setattr(limiter, "enabled", True)
+        limited = create_app('testing')
+        monkeypatch.setattr(asgi_mod, "flask_app", limited)
+        client = limited.test_client()
+        mock_db.products.find.return_value = []
+        asgi_mod.fake_db.products = FakeCollection()
+        token = self._token(asgi_mod, "user-001", "user")
+        headers = {'Authorization': f'Bearer {token}'}
+        address = {'REMOTE_ADDR': '10.0.0.1'}
+
+        # 50 per hour, whichever mode serves the requests
+        for _ in range(49):
+            assert client.get('/product/get_products', headers=headers, environ_base=address).status_code == 200
+        status, _, _ = self._call(asgi_mod, "GET", "/product/get_products", token=token)
+        assert status == 200
+
+        status, _, raw = self._call(asgi_mod, "GET", "/product/get_products", token=token)
+        sync = client.get('/product/get_products', headers=headers, environ_base=address)
+        assert status == sync.status_code == 429
+        assert json.loads(raw) == sync.json
+
+    def test_create_order_async_errors_match_sync(self, asgi_mod, client, mock_db, sample_user, sample_product):
+        """Test that a failing async order gets the sync route's per-line error payload"""
+        asgi_mod.fake_db.users = FakeCollection(one=sample_user)
+        asgi_mod.fake_db.products = FakeCollection(docs=[{**sample_product, "quantity_present": 1}])
+        mock_db.users.find_one.return_value = sample_user
+        mock_db.products.find.return_value = [{**sample_product, "quantity_present": 1}]
+        token = self._token(asgi_mod, "user-001", "user")
+        body = {"user_id": "user-001",
+                "products": [{"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15",
+                              "product_type": "Laptop", "product_quantity": 2}],
+                "payment_method": "Credit Card", "shipping_address": "123 Test Street"}
+
+        status, _, raw = self._call(asgi_mod, "POST", "/orders/create_order", token=token, body=body)
+        sync = client.post('/orders/create_order', headers={'Authorization': f'Bearer {token}'}, json=body)
+
+        assert status == sync.status_code == 400
+        assert json.loads(raw) == sync.json
+        assert json.loads(raw)["errors"]["products"][0]["sku"] == "DELL-XPS-15-001"
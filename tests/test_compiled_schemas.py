@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime
+from marshmallow import Schema, fields, post_dump
+from schema.compiled import CompiledDumpMixin, compile_dump
+from schema.order_schema import OrderSchema
+from schema.user_schema import User_Schema
+
+
+class Line:
+    """An object rather than a dict, dumped through attribute access"""
+
+    def __init__(self, sku):
+        self.sku = sku
+
+
+class TestCompiledSchemas:
+    """Test suite for the compiled dump functions"""
+
+    @pytest.fixture
+    def orders(self, sample_order):
+        sample_order['updated_timestamp'] = datetime(2026, 3, 1, 12, 30)
+        return [
+            sample_order,
+            {**sample_order, "order_id": "order-002", "reason": None, "created_at": None},
+            {k: v for k, v in sample_order.items() if k not in ("products", "created_at")},
+            {**sample_order, "products": [None, {"sku": 7, "product_price": "12", "extra": 1}]},
+        ]
+
+    def test_order_dump_matches_marshmallow(self, orders):
+        """Test that the compiled dump gives exactly marshmallow's output, key order included"""
+        schema = OrderSchema(many=True)
+        assert schema._compiled_dump is not None
+
+        expected = Schema.dump(schema, orders)
+        dumped = schema.dump(orders)
+        assert dumped == expected
+        assert [list(d) for d in dumped] == [list(d) for d in expected]
+        assert dumped[0]["products"][0]["product_price"] == int(orders[0]["products"][0]["product_price"])
+
+    def test_single_and_non_dict(self, sample_user):
+        schema = User_Schema()
+        assert schema.dump(sample_user) == {"user_id": "user-001", "user_name": "testuser"}
+        assert schema.dump(Line("x")) == Schema.dump(schema, Line("x")) == {}
+
+    def test_uncompilable_schema_uses_marshmallow(self):
+        """Test that a schema with dump hooks is left to marshmallow"""
+
+        class Hooked(CompiledDumpMixin, Schema):
+            sku = fields.Str()
+
+            @post_dump
+            def upper(self, data, **kwargs):
+                return {"sku": data["sku"].upper()}
+
+        schema = Hooked()
+        assert schema._compiled_dump is None
+        assert schema.dump({"sku": "abc"}) == {"sku": "ABC"}
+
+    def test_generic_fields_are_delegated(self):
+        """Test that fields without an inlined form go through their own _serialize"""
+
+        class Mixed(CompiledDumpMixin, Schema):
+            price = fields.Decimal(as_string=True)
+            active = fields.Bool(data_key="is_active")
+            label = fields.Method("make_label")
+
+            def make_label(self, obj):
+                return f"#{obj['price']}"
+
+        doc = {"price": 12.5, "active": "yes"}
+        schema = Mixed()
+        assert compile_dump(schema) is schema._compiled_dump is not None
+        assert schema.dump(doc) == Schema.dump(schema, doc) == {"price": "12.5", "is_active": True, "label": "#12.5"}
@@ -0,0 +1,108 @@
+import gzip
+import json
+import pytest
+from werkzeug.http import parse_accept_header
+from utils.compression import ResponseCompressor, compressor, strip_coding
+
+
+class TestCompression:
+    """Test suite for negotiated response compression"""
+
+    @pytest.fixture
+    def catalog(self, mock_db, sample_product):
+        sample_product.pop('_id')
+        sample_product['version'] = 1
+        products = [{**sample_product, "sku": f"SKU-{i:04d}"} for i in range(50)]
+        mock_db.products.reset_mock()
+        mock_db.products.find.return_value = products
+        return products
+
+    def test_listing_is_gzipped(self, client, user_token, catalog):
+        """Test that a large listing is gzipped with a coding-specific ETag"""
+        response = client.get(
+            '/product/get_products?limit=50',
+            headers={'Authorization': f'Bearer {user_token}', 'Accept-Encoding': 'gzip'}
+        )
+
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.headers['ETag'].endswith('-gzip"')
+        body = gzip.decompress(response.data)
+        assert len(json.loads(body)) == 50
+        assert int(response.headers['Content-Length']) == len(response.data) < len(body)
+
+    def test_identity_without_accept_encoding(self, client, user_token, catalog):
+        response = client.get(
+            '/product/get_products?limit=50',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_json()) == 50
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+    def test_small_body_not_compressed(self, client, user_token, catalog):
+        """Test that bodies under the minimum size are sent as is"""
+        del catalog[1:]
+        response = client.get(
+            '/product/get_products',
+            headers={'Authorization': f'Bearer {user_token}', 'Accept-Encoding': 'gzip'}
+        )
+
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_json()) == 1
+
+    def test_compressed_etag_revalidates(self, client, user_token, catalog):
+        """Test that the ETag of a compressed listing still gets a 304"""
+        headers = {'Authorization': f'Bearer {user_token}', 'Accept-Encoding': 'gzip'}
+        etag = client.get('/product/get_products?limit=50', headers=headers).headers['ETag']
+
+        response = client.get('/product/get_products?limit=50', headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_streamed_export_is_compressed(self, client, admin_token, mock_db, sample_order):
+        """Test that a streamed export is compressed chunk by chunk"""
+        sample_order.pop('_id')
+        orders = [{**sample_order, "order_id": f"order-{i}"} for i in range(200)]
+        mock_db.orders.find.return_value.__iter__.return_value = iter(orders)
+
+        response = client.get(
+            '/orders/export',
+            headers={'Authorization': f'Bearer {admin_token}', 'Accept-Encoding': 'gzip'},
+            buffered=False
+        )
+
+        assert response.is_streamed
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        lines = gzip.decompress(b"".join(response.response)).decode().splitlines()
+        assert [json.loads(l)["order_id"] for l in lines] == [o["order_id"] for o in orders]
+
+    def test_negotiation(self):
+        """Test that the best installed coding the client accepts is picked"""
+        codec = ResponseCompressor()
+        codec.available = ["zstd", "br", "gzip"]
+        assert codec.negotiate(parse_accept_header('gzip, br, zstd')) == 'zstd'
+        assert codec.negotiate(parse_accept_header('gzip;q=1, br;q=0.5')) == 'gzip'
+        assert codec.negotiate(parse_accept_header('gzip;q=0, identity')) is None
+
+        codec.available = ["gzip"]
+        assert codec.negotiate(parse_accept_header('br, gzip')) == 'gzip'
+        codec.enabled = False
+        assert codec.negotiate(parse_accept_header('gzip')) is None
+
+    def test_encode_body(self):
+        """Test the whole-body helper used by the ASGI handlers"""
+        body = json.dumps([{"sku": f"SKU-{i}", "product_price": 10.0} for i in range(200)]).encode()
+
+        compressed, coding = compressor.encode_body('gzip', body)
+        assert coding == 'gzip'
+        assert gzip.decompress(compressed) == body
+        assert compressor.encode_body('', body) == (body, None)
+        assert compressor.encode_body('gzip', b'[]') == (b'[]', None)
+
+    def test_strip_coding(self):
+        assert strip_coding('3-gzip') == '3'
+        assert strip_coding('3-br') == '3'
+        assert strip_coding('3') == '3'
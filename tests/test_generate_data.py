@@ -0,0 +1,71 @@
+import json
+import random
+import bcrypt
+from datetime import datetime
+from schema.order_schema import VALID_TRANSITIONS, OrderSchema
+from schema.product_schema import Add_Product_Schema
+from utils.generate_data import (DEFAULT_END, Popularity, generate, hash_password, lifecycle, order, password,
+                                 product, user)
+
+
+def context(users=50, products=20):
+    return {"end": DEFAULT_END, "days": 365, "users": users, "products": products, "hashes": ["hash"],
+            "popularity": Popularity(products)}
+
+
+class TestGenerateData:
+    """Test suite for the synthetic data generator"""
+
+    def test_documents_are_deterministic(self):
+        assert order(42, 7, context()) == order(42, 7, context())
+        assert order(42, 7, context()) != order(43, 7, context())
+        assert product(42, 3, DEFAULT_END) == product(42, 3, DEFAULT_END)
+        assert user(42, 5, ["h"])["user_id"] == user(42, 5, ["h"])["user_id"]
+
+    def test_real_bcrypt_hashes(self):
+        hashed = hash_password(42, 3, 4)
+
+        assert hashed == hash_password(42, 3, 4)
+        assert bcrypt.checkpw(password(3 + 256, 256).encode(), hashed.encode())
+
+    def test_documents_pass_the_api_schemas(self):
+        item = product(42, 1, DEFAULT_END)
+        api_fields = {k: v for k, v in item.items() if k in Add_Product_Schema().fields}
+        assert Add_Product_Schema().validate(api_fields) == {}
+        assert OrderSchema().validate(OrderSchema().dump(order(42, 1, context()))) == {}
+
+    def test_lifecycle_follows_valid_transitions(self):
+        """Test that every generated history is a path of VALID_TRANSITIONS ending before now"""
+        rng = random.Random(1)
+        placed, now = datetime(2025, 6, 1), datetime(2026, 1, 1)
+        finals = set()
+        for _ in range(500):
+            status, history = lifecycle(rng, placed, now)
+            previous, at = "Pending", placed
+            for step, when in history:
+                assert step in VALID_TRANSITIONS[previous]
+                assert at < when <= now
+                previous, at = step, when
+            assert status == previous
+            finals.add(status)
+        assert finals == {"Delivered", "Cancelled"}
+        # just placed: still pending
+        assert lifecycle(rng, now, now) == ("Pending", [])
+
+    def test_popular_products_dominate(self):
+        popularity = Popularity(1000)
+        rng = random.Random(3)
+        picks = [popularity.sample(rng) for _ in range(5000)]
+
+        assert sum(1 for p in picks if p < 10) > sum(1 for p in picks if p >= 500)
+
+    def test_ndjson_target(self, tmp_path):
+        written = generate({"users": 30, "products": 10, "orders": 25}, seed=1, target="ndjson", out=str(tmp_path),
+                           batch=10, processes=1, passwords=2, bcrypt_rounds=4)
+
+        assert written == {"users": 30, "products": 10, "orders": 25}
+        assert sorted(p.name for p in tmp_path.iterdir())[:3] == ["orders-00000.ndjson", "orders-00001.ndjson",
+                                                                   "orders-00002.ndjson"]
+        first = json.loads((tmp_path / "orders-00000.ndjson").read_text().splitlines()[0])
+        assert "$date" in first["created_at"]
+        assert first["user_name"].startswith("loaduser")
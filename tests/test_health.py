@@ -0,0 +1,85 @@
+import pytest
+import time
+from unittest.mock import patch
+from pymongo.errors import ServerSelectionTimeoutError
+from db.pool_stats import PoolStats, pool_stats
+from utils.health import health_monitor
+
+
+class TestHealth:
+    """Test suite for the cached liveness/readiness probes"""
+
+    @pytest.fixture(autouse=True)
+    def no_prober(self):
+        # the tests drive probe() themselves
+        with patch.object(health_monitor, "start"):
+            yield
+        health_monitor._status = None
+        health_monitor._last_error = None
+        pool_stats.reset()
+
+    def test_liveness_never_touches_mongo(self, client, mock_db):
+        response = client.get('/health/live')
+
+        assert response.status_code == 200
+        assert response.get_json()["status"] == "alive"
+        mock_db.command.assert_not_called()
+
+    def test_ready_from_cached_status(self, client, mock_db):
+        """Test that readiness reads the last probe instead of pinging"""
+        health_monitor.probe()
+        mock_db.command.reset_mock()
+
+        for path in ('/health/ready', '/health'):
+            response = client.get(path)
+            assert response.status_code == 200
+            body = response.get_json()
+            assert body["status"] == "ready"
+            assert body["database"] == "connected"
+            assert body["ping_ms"] >= 0
+            assert body["pool"]["max_size"] > 0
+        mock_db.command.assert_not_called()
+
+    def test_not_ready_before_first_probe(self, client):
+        response = client.get('/health/ready')
+
+        assert response.status_code == 503
+        assert response.get_json()["problems"] == ["no probe has completed yet"]
+
+    def test_not_ready_when_mongo_unreachable(self, client, mock_db):
+        """Test that a failed ping flips readiness and is reported as the last error"""
+        mock_db.command.side_effect = ServerSelectionTimeoutError("no servers")
+        health_monitor.probe()
+
+        response = client.get('/health/ready')
+        body = response.get_json()
+        assert response.status_code == 503
+        assert body["database"] == "unreachable"
+        assert body["last_error"]["type"] == "ServerSelectionTimeoutError"
+
+        # recovered, the last error stays visible
+        mock_db.command.side_effect = None
+        health_monitor.probe()
+        body = client.get('/health/ready').get_json()
+        assert body["status"] == "ready"
+        assert body["last_error"]["message"] == "no servers"
+
+    def test_not_ready_when_degraded_saturated_or_stale(self, client, mock_db):
+        status = health_monitor.probe()
+
+        assert health_monitor.problems({**status, "ping_ms": health_monitor.max_ping_ms + 1})[0].startswith("database degraded")
+        saturated = {**status, "pool": {**status["pool"], "utilization": 1.0}}
+        assert health_monitor.problems(saturated) == ["connection pool saturated"]
+        stale = {**status, "checked_at": time.time() - 4 * health_monitor.interval}
+        assert health_monitor.problems(stale) == ["status is stale"]
+
+    def test_pool_stats_count_checkouts(self):
+        stats = PoolStats()
+        stats.connection_created(None)
+        stats.connection_created(None)
+        stats.connection_checked_out(None)
+        stats.connection_check_out_failed(None)
+
+        assert stats.snapshot() == {"open": 2, "checked_out": 1, "checkout_failures": 1, "pools_cleared": 0}
+        stats.connection_checked_in(None)
+        assert stats.snapshot()["checked_out"] == 0
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import MagicMock
+from db.indexes import INDEXES, ensure_indexes, index_drift
+
+
+class TestIndexes:
+    """Test suite for the index manager"""
+
+    def _db_with(self, existing):
+        """Mock database whose collections report the given index_information"""
+        collections = {name: MagicMock() for name in INDEXES}
+        for name, coll in collections.items():
+            coll.index_information.return_value = existing.get(name, {"_id_": {"key": [("_id", 1)]}})
+        mock_database = MagicMock()
+        mock_database.__getitem__.side_effect = collections.__getitem__
+        return mock_database, collections
+
+    def test_ensure_indexes_creates_missing(self):
+        """Test that every declared index is created on an empty database"""
+        mock_database, collections = self._db_with({})
+
+        report = ensure_indexes(mock_database)
+
+        assert set(report) == set(INDEXES)
+        for name, coll in collections.items():
+            created = coll.create_indexes.call_args[0][0]
+            assert [m.document["name"] for m in created] == [m.document["name"] for m in INDEXES[name]]
+
+    def test_ensure_indexes_is_idempotent(self):
+        """Test that nothing is created when the indexes already exist"""
+        existing = {
+            name: {m.document["name"]: {"key": list(m.document["key"].items()), "unique": m.document.get("unique", False)}
+                   for m in models}
+            for name, models in INDEXES.items()
+        }
+        mock_database, collections = self._db_with(existing)
+
+        report = ensure_indexes(mock_database)
+
+        assert report == {}
+        for coll in collections.values():
+            coll.create_indexes.assert_not_called()
+
+    def test_index_drift_reports_mismatch_and_extra(self):
+        """Test that a non-unique sku index and an unknown index are reported"""
+        products = {m.document["name"]: {"key": list(m.document["key"].items()), "unique": m.document.get("unique", False)}
+                    for m in INDEXES["products"]}
+        products["sku_unique"] = {"key": [("sku", 1)]}
+        products["product_name_1"] = {"key": [("product_name", 1)]}
+        existing = {"products": products}
+        mock_database, collections = self._db_with(existing)
+
+        report = index_drift(mock_database)
+
+        assert report["products"] == {"missing": [], "mismatched": ["sku_unique"], "extra": ["product_name_1"]}
+        collections["products"].create_indexes.assert_not_called()
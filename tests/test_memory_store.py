@@ -0,0 +1,90 @@
+import random
+import pytest
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from benchmarks.bench_handlers import seed
+from benchmarks.memory_store import MemoryDatabase, matches
+from db.indexes import INDEXES, ensure_indexes, index_drift
+from schema.product_schema import Add_Product_Schema
+
+
+class TestMemoryStore:
+    """Test suite for the in-process document store behind the handler benchmarks"""
+
+    @pytest.fixture
+    def store(self):
+        store = MemoryDatabase()
+        ensure_indexes(store)
+        store.products.insert_many([
+            {"product_id": f"p-{i}", "sku": f"SKU-{i:03d}", "product_type": "TV" if i % 2 else "Laptop",
+             "product_price": i * 10, "quantity_present": 5, "is_active": True}
+            for i in range(20)
+        ])
+        return store
+
+    def test_filters(self):
+        doc = {"a": 5, "tags": ["x", "y"], "lines": [{"sku": "A", "n": 2}, {"sku": "B", "n": 7}]}
+
+        assert matches(doc, {"a": {"$gte": 5, "$lt": 6}, "tags": "x", "lines.sku": "B"})
+        assert matches(doc, {"lines": {"$elemMatch": {"sku": "B", "n": {"$gt": 5}}}})
+        assert not matches(doc, {"lines": {"$elemMatch": {"sku": "A", "n": {"$gt": 5}}}})
+        assert matches(doc, {"missing": {"$ne": 1}, "$or": [{"a": 1}, {"tags": {"$in": ["y"]}}]})
+        assert not matches(doc, {"a": {"$nin": [5]}})
+        # numbers never compare with strings
+        assert not matches(doc, {"a": {"$gt": "1"}})
+
+    def test_sorted_page_uses_index(self, store):
+        """Test that a keyset page sorted on the indexed sku comes back in order"""
+        page = list(store.products.find({"sku": {"$gt": "SKU-005"}}, {"_id": 0, "sku": 1}, sort=[("sku", 1)], limit=3))
+
+        assert page == [{"sku": "SKU-006"}, {"sku": "SKU-007"}, {"sku": "SKU-008"}]
+        tvs = list(store.products.find({"product_type": "TV"}, {"sku": 1, "_id": 0}).sort("sku", -1).limit(2))
+        assert tvs == [{"sku": "SKU-019"}, {"sku": "SKU-017"}]
+
+    def test_reservation_bulk_write(self, store):
+        """Test the guarded $inc/$addToSet/$pull round trip of utils/stock.py"""
+        result = store.products.bulk_write([
+            UpdateOne({"product_id": "p-1", "quantity_present": {"$gte": 3}, "reservations": {"$ne": "r1"}},
+                      {"$inc": {"quantity_present": -3}, "$addToSet": {"reservations": "r1"}}),
+            UpdateOne({"product_id": "p-2", "quantity_present": {"$gte": 30}}, {"$inc": {"quantity_present": -30}}),
+        ], ordered=False)
+
+        assert result.matched_count == 1
+        assert store.products.find_one({"reservations": "r1"})["product_id"] == "p-1"
+        store.products.update_many({"product_id": {"$in": ["p-1", "p-2"]}}, {"$pull": {"reservations": "r1"}})
+        assert store.products.find_one({"reservations": "r1"}) is None
+        assert store.products.find_one({"product_id": "p-1"}, {"_id": 0, "quantity_present": 1}) == {"quantity_present": 2}
+
+    def test_upserts_and_unique_indexes(self, store):
+        store.sales_daily.bulk_write([UpdateOne({"_id": "2026-01-01"}, {"$inc": {"units": 2}}, upsert=True)] * 2)
+        assert store.sales_daily.find_one("2026-01-01") == {"_id": "2026-01-01", "units": 4}
+
+        with pytest.raises(DuplicateKeyError):
+            store.products.insert_one({"sku": "SKU-001", "product_id": "p-new"})
+        # the failed insert left nothing behind in the other indexes
+        assert store.products.find_one({"product_id": "p-new"}) is None
+
+        after = store.products.find_one_and_update({"sku": "SKU-003"}, {"$set": {"is_active": False}},
+                                                   projection={"_id": 0, "is_active": 1},
+                                                   return_document=ReturnDocument.AFTER)
+        assert after == {"is_active": False}
+        assert store.products.count_documents({"is_active": True}) == 19
+
+    def test_insert_sets_id_and_indexes_match_declared(self, store):
+        order = {"order_id": "o-1", "user_id": "u-1"}
+        store.orders.bulk_write([InsertOne(order)])
+
+        assert "_id" in order
+        assert store.orders.find_one({"order_id": "o-1"}, {"_id": 0}) == {"order_id": "o-1", "user_id": "u-1"}
+        assert index_drift(store) == {}
+        assert set(store.list_collection_names()) >= set(INDEXES)
+
+    def test_benchmark_products_pass_the_api_schema(self):
+        """Test that the handler benchmarks seed only products the API could have created"""
+        store = MemoryDatabase()
+        _, products = seed(store, 50, random.Random(1))
+
+        fields = set(Add_Product_Schema().fields)
+        errors = Add_Product_Schema(many=True).validate([{k: v for k, v in p.items() if k in fields} for p in products])
+        assert errors == {}
+        assert len({p["product_type"] for p in products}) > 1
@@ -0,0 +1,121 @@
+import json
+import os
+import pytest
+from types import SimpleNamespace
+from utils.metrics import CommandMetrics, Metrics, command_collection, metrics
+from utils.rate_limiter import count_rejection
+
+
+class TestMetrics:
+    """Test suite for the Prometheus metrics"""
+
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        metrics.reset()
+        yield
+        metrics.reset()
+
+    def test_metrics_admin_only(self, client, admin_token, user_token):
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': f'Bearer {user_token}'}).status_code == 403
+
+        response = client.get('/metrics', headers={'Authorization': f'Bearer {admin_token}'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+
+    def test_metrics_token(self, app, client):
+        """Test that a scraper can use the static METRICS_TOKEN instead of a JWT"""
+        app.config['METRICS_TOKEN'] = 'scrape-me'
+        assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 422
+
+    def test_route_latency_and_status(self, client, admin_token, user_token, mock_db, sample_product):
+        """Test that requests are counted per blueprint, route template and status"""
+        sample_product.pop('_id')
+        mock_db.products.find.return_value = [sample_product]
+        client.get('/product/get_products', headers={'Authorization': f'Bearer {user_token}'})
+        client.get('/orders/get_orders', headers={'Authorization': f'Bearer {user_token}'})
+
+        text = client.get('/metrics', headers={'Authorization': f'Bearer {admin_token}'}).get_data(as_text=True)
+        labels = 'blueprint="product",method="GET",route="/product/get_products"'
+        assert f'http_requests_total{{{labels},status="200"}} 1' in text
+        assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+        assert f'http_request_duration_seconds_count{{{labels}}} 1' in text
+        assert 'http_requests_total{blueprint="order",method="GET",route="/orders/get_orders",status="403"} 1' in text
+        assert '# TYPE http_requests_in_flight gauge' in text
+
+    def test_mongo_command_durations(self):
+        """Test that command events are recorded per command and collection"""
+        listener = CommandMetrics(metrics)
+        listener.started(SimpleNamespace(request_id=1, connection_id=("h", 1), command_name="find",
+                                         command={"find": "products", "filter": {}}))
+        listener.succeeded(SimpleNamespace(request_id=1, connection_id=("h", 1), command_name="find",
+                                           duration_micros=1500))
+        listener.started(SimpleNamespace(request_id=2, connection_id=("h", 1), command_name="insert",
+                                         command={"insert": "orders"}))
+        listener.failed(SimpleNamespace(request_id=2, connection_id=("h", 1), command_name="insert",
+                                        duration_micros=300))
+
+        text = metrics.exposition()
+        assert 'mongo_command_duration_seconds_bucket{collection="products",command="find",le="0.001"} 0' in text
+        assert 'mongo_command_duration_seconds_bucket{collection="products",command="find",le="0.0025"} 1' in text
+        assert 'mongo_command_failures_total{collection="orders",command="insert"} 1' in text
+        assert command_collection("getMore", {"getMore": 7, "collection": "orders"}) == "orders"
+        assert command_collection("ping", {"ping": 1}) == ""
+
+    def test_rate_limit_rejections(self, app):
+        with app.test_request_context('/product/get_products'):
+            count_rejection(None)
+
+        assert 'rate_limit_rejections_total{endpoint="product.Get_Product"} 1' in metrics.exposition()
+
+    def test_workers_are_added_up(self, tmp_path):
+        """Test that every worker's file counts, and gauges of exited workers are dropped"""
+        registry = Metrics()
+        registry.directory = str(tmp_path)
+        registry.inc("http_requests_total", {"status": "200"}, 2)
+        registry.add_gauge("http_requests_in_flight", {}, 1)
+        registry.observe("http_request_duration_seconds", {}, 0.02)
+        exited = {
+            "pid": 2 ** 22 + 1,
+            "worker": "4194305-exited",
+            "started": 1.0,
+            "counters": [["http_requests_total", [["status", "200"]], 3]],
+            "gauges": [["http_requests_in_flight", [], 5]],
+            "histograms": [["http_request_duration_seconds", [],
+                            {"buckets": [0.01, 0.1], "counts": [1, 0, 0], "sum": 0.005, "count": 1}]]
+        }
+        (tmp_path / "worker-4194305-exited.json").write_text(json.dumps(exited))
+        registry.observe("http_request_duration_seconds", {}, 0.005)
+        registry._histograms[("http_request_duration_seconds", ())]["buckets"] = [0.01, 0.1]
+        registry._histograms[("http_request_duration_seconds", ())]["counts"] = [1, 1, 0]
+
+        text = registry.exposition()
+        assert 'http_requests_total{status="200"} 5' in text
+        assert 'http_requests_in_flight 1' in text
+        assert 'http_request_duration_seconds_bucket{le="0.01"} 2' in text
+        assert 'http_request_duration_seconds_bucket{le="+Inf"} 3' in text
+        assert os.path.exists(tmp_path / f"worker-{registry.worker_id}.json")
+        # the exited worker now lives in the archive
+        assert not os.path.exists(tmp_path / "worker-4194305-exited.json")
+        assert registry.exposition() == text
+
+    def test_reused_pid_does_not_lose_counts(self, tmp_path):
+        """Test that a new worker on the pid of an exited one does not replace its counters"""
+        registry = Metrics()
+        registry.directory = str(tmp_path)
+        registry.inc("http_requests_total", {"status": "200"}, 2)
+        # the previous worker that had this pid
+        previous = {"pid": os.getpid(), "worker": f"{os.getpid()}-previous", "started": registry.started - 60,
+                    "counters": [["http_requests_total", [["status", "200"]], 7]],
+                    "gauges": [["http_requests_in_flight", [], 4]], "histograms": []}
+        (tmp_path / f"worker-{os.getpid()}-previous.json").write_text(json.dumps(previous))
+
+        text = registry.exposition()
+        assert 'http_requests_total{status="200"} 9' in text
+        assert 'http_requests_in_flight' not in text
+        assert sorted(os.listdir(tmp_path)) == ["archive.json", "archive.json.lock", f"worker-{registry.worker_id}.json"]
+
+        # the counters keep going up from the archived total
+        registry.inc("http_requests_total", {"status": "200"})
+        assert 'http_requests_total{status="200"} 10' in registry.exposition()
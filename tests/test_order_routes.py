@@ -1,5 +1,8 @@
 import pytest
-from unittest.mock import MagicMock
+import csv
+import io
+import json
+from unittest.mock import MagicMock, patch
 from datetime import datetime
 
 
@@ -10,7 +13,8 @@ class TestOrderRoutes:
         """Test creating order successfully"""
         # Mock database responses
         mock_db.users.find_one.return_value = sample_user
-        mock_db.products.find_one.return_value = sample_product
+        mock_db.products.find.return_value = [sample_product]
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=1)
         mock_db.orders.insert_one.return_value = MagicMock(inserted_id="mock_id")
         
         response = client.post(
@@ -39,7 +43,7 @@ class TestOrderRoutes:
         """Test creating order with insufficient stock"""
         sample_product['quantity_present'] = 1
         mock_db.users.find_one.return_value = sample_user
-        mock_db.products.find_one.return_value = sample_product
+        mock_db.products.find.return_value = [sample_product]
         
         response = client.post(
             '/orders/create_order',
@@ -65,7 +69,7 @@ class TestOrderRoutes:
     def test_create_order_product_not_found(self, client, user_token, mock_db, sample_user):
         """Test creating order with non-existent product"""
         mock_db.users.find_one.return_value = sample_user
-        mock_db.products.find_one.return_value = None
+        mock_db.products.find.return_value = []
         
         response = client.post(
             '/orders/create_order',
@@ -92,7 +96,7 @@ class TestOrderRoutes:
         """Test creating order with inactive product"""
         sample_product['is_active'] = False
         mock_db.users.find_one.return_value = sample_user
-        mock_db.products.find_one.return_value = sample_product
+        mock_db.products.find.return_value = [sample_product]
         
         response = client.post(
             '/orders/create_order',
@@ -115,6 +119,357 @@ class TestOrderRoutes:
         assert response.status_code == 400
     
     
+    def test_create_order_resolves_skus_in_one_query(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that every sku is looked up with a single $in query"""
+        mock_db.products.reset_mock()
+        mock_db.users.find_one.return_value = sample_user
+        other = {**sample_product, "sku": "DELL-XPS-13-001", "product_id": "prod-002"}
+        mock_db.products.find.return_value = [sample_product, other]
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=2)
+        mock_db.orders.insert_one.return_value = MagicMock(inserted_id="mock_id")
+        
+        response = client.post(
+            '/orders/create_order',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={
+                "user_id": "user-001",
+                "products": [
+                    {"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 2},
+                    {"sku": "DELL-XPS-13-001", "product_name": "Dell XPS 13", "product_type": "Laptop", "product_quantity": 1}
+                ],
+                "payment_method": "Credit Card",
+                "shipping_address": "123 Test Street, Test City, 12345"
+            }
+        )
+        
+        assert response.status_code == 201
+        assert mock_db.products.find.call_count == 1
+        mock_db.products.find_one.assert_not_called()
+        query = mock_db.products.find.call_args[0][0]
+        assert sorted(query["sku"]["$in"]) == ["DELL-XPS-13-001", "DELL-XPS-15-001"]
+        order = response.json["order_details"]
+        assert order["order_quantity"] == 3
+        assert order["order_price"] == sample_product["product_price"] * 3
+    
+    
+    def test_create_order_reports_every_failing_line(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that missing and out of stock lines are reported together"""
+        sample_product['quantity_present'] = 1
+        mock_db.users.find_one.return_value = sample_user
+        mock_db.products.find.return_value = [sample_product]
+        
+        response = client.post(
+            '/orders/create_order',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={
+                "user_id": "user-001",
+                "products": [
+                    {"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 5},
+                    {"sku": "NONEXISTENT-SKU", "product_name": "Test Product", "product_type": "Laptop", "product_quantity": 1}
+                ],
+                "payment_method": "Credit Card",
+                "shipping_address": "123 Test Street, Test City, 12345"
+            }
+        )
+        
+        assert response.status_code == 404
+        errors = response.json["errors"]["products"]
+        assert [e["line"] for e in errors] == [0, 1]
+        assert errors[0]["error"].startswith("Insufficient stock")
+        assert errors[1]["error"] == "Product not found"
+        mock_db.orders.insert_one.assert_not_called()
+
+
+    def test_create_order_cached_products_report_stock_per_line(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that with the product cache on, a failed reservation still reports the failing lines"""
+        from utils.product_cache import product_cache
+        product = {**sample_product, "quantity_present": 1}
+        # the cache projects the stock out, a plain read gets it
+        mock_db.products.find.side_effect = lambda query, projection: [
+            {k: v for k, v in product.items() if projection.get(k) != 0}
+        ]
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=0)
+        mock_db.users.find_one.return_value = sample_user
+        versions = MagicMock()
+        versions.find_one.return_value = {"_id": "products", "version": 1}
+
+        with patch.object(product_cache, "enabled", True), patch.object(product_cache, "_versions", versions):
+            product_cache.clear()
+            response = client.post(
+                '/orders/create_order',
+                headers={'Authorization': f'Bearer {user_token}'},
+                json={
+                    "user_id": "user-001",
+                    "products": [{"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 5}],
+                    "payment_method": "Credit Card",
+                    "shipping_address": "123 Test Street, Test City, 12345"
+                }
+            )
+            product_cache.clear()
+
+        assert response.status_code == 400
+        assert response.json["errors"]["products"] == [
+            {"line": 0, "sku": "DELL-XPS-15-001", "error": "Insufficient stock for Dell XPS 15. Available: 1"}
+        ]
+        assert mock_db.products.find.call_args_list[0][0][1]["quantity_present"] == 0
+        mock_db.orders.insert_one.assert_not_called()
+
+    
+    def test_create_order_reserves_stock(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that stock is decremented with a guarded $inc before the insert"""
+        mock_db.products.reset_mock()
+        mock_db.users.find_one.return_value = sample_user
+        mock_db.products.find.return_value = [sample_product]
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=1)
+        
+        response = client.post(
+            '/orders/create_order',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={
+                "user_id": "user-001",
+                "products": [
+                    {"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 2}
+                ],
+                "payment_method": "Credit Card",
+                "shipping_address": "123 Test Street, Test City, 12345"
+            }
+        )
+        
+        assert response.status_code == 201
+        ops = mock_db.products.bulk_write.call_args[0][0]
+        assert len(ops) == 1
+        assert ops[0]._filter["quantity_present"] == {"$gte": 2}
+        assert ops[0]._doc["$inc"] == {"quantity_present": -2, "version": 1}
+        mock_db.orders.insert_one.assert_called_once()
+    
+    
+    def test_create_order_reservation_lost_race(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that a failed reservation is compensated and no order is inserted"""
+        mock_db.products.reset_mock()
+        mock_db.orders.reset_mock()
+        mock_db.users.find_one.return_value = sample_user
+        mock_db.products.find.return_value = [sample_product]
+        # another order took the stock between the lookup and the reservation
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=0)
+        
+        response = client.post(
+            '/orders/create_order',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={
+                "user_id": "user-001",
+                "products": [
+                    {"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 2}
+                ],
+                "payment_method": "Credit Card",
+                "shipping_address": "123 Test Street, Test City, 12345"
+            }
+        )
+        
+        assert response.status_code == 400
+        # reservation + compensation of the tagged products
+        assert mock_db.products.bulk_write.call_count == 2
+        compensation = mock_db.products.bulk_write.call_args[0][0]
+        assert compensation[0]._doc["$inc"] == {"quantity_present": 2, "version": 1}
+        mock_db.orders.insert_one.assert_not_called()
+    
+    
+    def test_cancel_order_releases_stock(self, client, user_token, mock_db, sample_order):
+        """Test that cancelling gives the reserved stock back"""
+        mock_db.products.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        
+        response = client.patch(
+            '/orders/cancel_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"reason": "Changed my mind"}
+        )
+        
+        assert response.status_code == 200
+        ops = mock_db.products.bulk_write.call_args[0][0]
+        assert ops[0]._filter == {"product_id": "prod-001"}
+        assert ops[0]._doc == {"$inc": {"quantity_present": 2, "version": 1}}
+    
+    
+    def test_cancel_order_twice_releases_once(self, client, user_token, mock_db, sample_order):
+        """Test that a cancel losing the race does not release stock again"""
+        mock_db.products.reset_mock()
+        # the status guard no longer matches: the other cancel got there first
+        mock_db.orders.find_one_and_update.return_value = None
+        mock_db.orders.find_one.return_value = {**sample_order, "order_status": "Cancelled"}
+        
+        response = client.patch(
+            '/orders/cancel_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"reason": "Changed my mind"}
+        )
+        
+        assert response.status_code == 400
+        mock_db.products.bulk_write.assert_not_called()
+    
+    
+    def test_cancel_order_guard_in_filter(self, client, user_token, mock_db, sample_order):
+        """Test that the cancel is one find_one_and_update guarded by status"""
+        mock_db.orders.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        
+        response = client.patch(
+            '/orders/cancel_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"reason": "Changed my mind"}
+        )
+        
+        assert response.status_code == 200
+        query = mock_db.orders.find_one_and_update.call_args[0][0]
+        assert query == {"order_id": "order-001", "user_id": "user-001",
+                         "order_status": {"$nin": ["Delivered", "Cancelled", "Shipped"]}}
+        mock_db.orders.find_one.assert_not_called()
+        mock_db.orders.update_one.assert_not_called()
+    
+    
+    def test_create_order_updates_sales_rollups(self, client, user_token, mock_db, sample_user, sample_product):
+        """Test that a new order is added to the daily and product rollups"""
+        mock_db.sales_daily.reset_mock()
+        mock_db.users.find_one.return_value = sample_user
+        mock_db.products.find.return_value = [sample_product]
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=1)
+        
+        response = client.post(
+            '/orders/create_order',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={
+                "user_id": "user-001",
+                "products": [
+                    {"sku": "DELL-XPS-15-001", "product_name": "Dell XPS 15", "product_type": "Laptop", "product_quantity": 2}
+                ],
+                "payment_method": "Credit Card",
+                "shipping_address": "123 Test Street, Test City, 12345"
+            }
+        )
+        
+        assert response.status_code == 201
+        daily = mock_db.sales_daily.bulk_write.call_args[0][0][0]
+        assert daily._filter == {"_id": datetime.now().strftime("%Y-%m-%d")}
+        assert daily._doc["$inc"] == {"orders": 1, "units": 2, "revenue": 2599.98, "orders_by_status.Pending": 1}
+        line = mock_db.sales_product_daily.bulk_write.call_args[0][0][0]
+        assert line._doc["$inc"] == {"orders": 1, "units": 2, "revenue": 2599.98}
+    
+    
+    def test_cancel_order_reverts_sales_rollups(self, client, user_token, mock_db, sample_order):
+        """Test that a cancelled order is taken out of the sales totals"""
+        mock_db.sales_daily.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        
+        response = client.patch(
+            '/orders/cancel_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"reason": "Changed my mind"}
+        )
+        
+        assert response.status_code == 200
+        daily = mock_db.sales_daily.bulk_write.call_args[0][0][0]
+        assert daily._doc["$inc"] == {"orders": -1, "units": -2, "revenue": -2599.98,
+                                      "orders_by_status.Pending": -1, "orders_by_status.Cancelled": 1}
+    
+    
+    def test_order_writes_sync_summary(self, client, user_token, mock_db, sample_order):
+        """Test that an order write replaces the compact summary of the order"""
+        mock_db.order_summaries.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        
+        response = client.patch(
+            '/orders/cancel_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"reason": "Changed my mind"}
+        )
+        
+        assert response.status_code == 200
+        query, summary = mock_db.order_summaries.replace_one.call_args[0]
+        assert query == {"order_id": "order-001", "$or": [{"version": {"$lt": summary["version"]}},
+                                                          {"version": {"$exists": False}}]}
+        assert summary["order_status"] == "Cancelled"
+        assert summary["item_count"] == 1
+        assert "products" not in summary and "shipping_address" not in summary
+    
+    
+    def test_user_order_summaries_page(self, client, user_token, mock_db):
+        """Test that summaries are paged newest first with a keyset cursor"""
+        summaries = MagicMock()
+        summaries.find.return_value = [
+            {"order_id": f"order-{i}", "order_status": "Pending", "order_price": 10.0,
+             "created_at": datetime(2026, 3, 10 - i)}
+            for i in range(3)
+        ]
+        with patch('routes.order_routes.order_summary_collection', summaries):
+            response = client.get(
+                '/orders/user_order_summaries?limit=2&cursor=2026-03-20T00:00:00|order-9',
+                headers={'Authorization': f'Bearer {user_token}'}
+            )
+        
+        assert response.status_code == 200
+        assert len(response.get_json()) == 2
+        assert response.headers['X-Next-Cursor'] == '2026-03-09T00:00:00|order-1'
+        query, projection = summaries.find.call_args[0]
+        assert query['user_id'] == 'user-001'
+        assert query['$or'][1] == {"created_at": datetime(2026, 3, 20), "order_id": {"$lt": "order-9"}}
+        assert summaries.find.call_args[1]['limit'] == 3
+    
+    
+    def test_user_order_summaries_invalid_cursor(self, client, user_token):
+        with patch('routes.order_routes.order_summary_collection', MagicMock()):
+            response = client.get(
+                '/orders/user_order_summaries?cursor=yesterday',
+                headers={'Authorization': f'Bearer {user_token}'}
+            )
+        
+        assert response.status_code == 400
+    
+    
+    def test_user_order_detail(self, client, user_token, mock_db, sample_order):
+        """Test that a single order is loaded in full for its owner only"""
+        sample_order.pop('_id', None)
+        mock_db.orders.find_one.return_value = sample_order
+        
+        response = client.get(
+            '/orders/user_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()['products'][0]['sku'] == 'DELL-XPS-15-001'
+        assert mock_db.orders.find_one.call_args[0][0] == {"order_id": "order-001", "user_id": "user-001"}
+        
+        mock_db.orders.find_one.return_value = None
+        response = client.get(
+            '/orders/user_order/order-002',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        assert response.status_code == 404
+    
+    
+    def test_user_order_detail_not_modified(self, client, user_token, mock_db, sample_order):
+        """Test that an order the client already has is answered with a 304"""
+        sample_order.pop('_id', None)
+        sample_order['version'] = 3
+        mock_db.orders.find_one.return_value = sample_order
+        
+        response = client.get(
+            '/orders/user_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        assert response.headers['ETag'] == '"3"'
+        
+        response = client.get(
+            '/orders/user_order/order-001',
+            headers={'Authorization': f'Bearer {user_token}', 'If-None-Match': '"3"'}
+        )
+        assert response.status_code == 304
+        assert response.data == b''
+    
+    
     def test_get_orders_admin(self, client, admin_token, mock_db, sample_order):
         """Test getting all orders as admin"""
         mock_db.orders.find.return_value = [sample_order]
@@ -128,6 +483,66 @@ class TestOrderRoutes:
         assert isinstance(response.json, list)
     
     
+    def test_get_orders_excludes_admin_in_query(self, client, admin_token, mock_db, sample_order):
+        """Test that the admin's own orders are filtered out by the query"""
+        mock_db.orders.find.return_value = [sample_order]
+        
+        response = client.get(
+            '/orders/get_orders',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert mock_db.orders.find.call_args[0][0] == {"user_name": {"$ne": "admin"}}
+    
+    
+    def test_export_orders_ndjson(self, client, admin_token, mock_db, sample_order):
+        """Test streaming orders as NDJSON"""
+        sample_order.pop('_id')
+        mock_db.orders.find.return_value.__iter__.return_value = iter([sample_order, {**sample_order, "order_id": "order-002"}])
+        
+        response = client.get(
+            '/orders/export',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(l)["order_id"] for l in lines] == ["order-001", "order-002"]
+        args, kwargs = mock_db.orders.find.call_args
+        assert args[0] == {"user_name": {"$ne": "admin"}}
+        assert args[1]["_id"] == 0
+        assert kwargs["batch_size"] > 0
+    
+    
+    def test_export_orders_csv(self, client, admin_token, mock_db, sample_order):
+        """Test streaming orders as CSV with nested products as JSON"""
+        sample_order.pop('_id')
+        mock_db.orders.find.return_value.__iter__.return_value = iter([sample_order])
+        
+        response = client.get(
+            '/orders/export?format=csv',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        assert len(rows) == 1
+        assert rows[0]["order_id"] == "order-001"
+        assert json.loads(rows[0]["products"])[0]["sku"] == "DELL-XPS-15-001"
+    
+    
+    def test_export_orders_unauthorized(self, client, user_token):
+        """Test that only admins can export orders"""
+        response = client.get(
+            '/orders/export',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        
+        assert response.status_code == 403
+    
+    
     def test_get_orders_unauthorized(self, client, user_token):
         """Test getting all orders as regular user"""
         response = client.get(
@@ -153,7 +568,8 @@ class TestOrderRoutes:
     
     def test_cancel_order_success(self, client, user_token, mock_db, sample_order):
         """Test cancelling order"""
-        mock_db.orders.find_one.return_value = sample_order
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
         
         response = client.patch(
             '/orders/cancel_order/order-001',
@@ -170,6 +586,7 @@ class TestOrderRoutes:
     def test_cancel_order_already_delivered(self, client, user_token, mock_db, sample_order):
         """Test cancelling delivered order"""
         sample_order['order_status'] = 'Delivered'
+        mock_db.orders.find_one_and_update.return_value = None
         mock_db.orders.find_one.return_value = sample_order
         
         response = client.patch(
@@ -185,6 +602,7 @@ class TestOrderRoutes:
     
     def test_cancel_order_not_found(self, client, user_token, mock_db):
         """Test cancelling non-existent order"""
+        mock_db.orders.find_one_and_update.return_value = None
         mock_db.orders.find_one.return_value = None
         
         response = client.patch(
@@ -200,8 +618,9 @@ class TestOrderRoutes:
     
     def test_update_order_quantity(self, client, user_token, mock_db, sample_order, sample_product):
         """Test updating product quantity in order"""
-        mock_db.orders.find_one.side_effect = [sample_order, sample_order]
-        mock_db.products.find_one.return_value = sample_product
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=1)
         
         response = client.patch(
             '/orders/update_quantity/order-001/prod-001',
@@ -213,11 +632,83 @@ class TestOrderRoutes:
         
         assert response.status_code == 200
         # assert 'order' in response.json
+        line = mock_db.sales_product_daily.bulk_write.call_args[0][0][0]
+        assert line._doc["$inc"] == {"units": 1, "revenue": pytest.approx(1299.99)}
+        assert response.get_json()['order_quantity'] == 3
+    
+    
+    def test_update_order_quantity_single_round_trip(self, client, user_token, mock_db, sample_order):
+        """Test that the line and the totals are recomputed by one guarded pipeline update"""
+        mock_db.orders.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        
+        response = client.patch(
+            '/orders/update_quantity/order-001/prod-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"product_quantity": 1}
+        )
+        
+        assert response.status_code == 200
+        query, update = mock_db.orders.find_one_and_update.call_args[0]
+        assert query["products.product_id"] == "prod-001"
+        assert query["order_status"] == {"$nin": ["Delivered", "Shipped", "Cancelled"]}
+        assert isinstance(update, list)
+        assert update[1]["$set"]["order_price"] == {"$sum": "$products.total_price"}
+        mock_db.orders.find_one.assert_not_called()
+        # the quantity went down by one, that unit goes back into stock
+        ops = mock_db.products.bulk_write.call_args[0][0]
+        assert ops[0]._doc == {"$inc": {"quantity_present": 1, "version": 1}}
+    
+    
+    def test_update_order_quantity_insufficient_stock_reverts(self, client, user_token, mock_db, sample_order):
+        """Test that the line is put back when the extra stock cannot be reserved"""
+        mock_db.orders.reset_mock()
+        mock_db.products.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        mock_db.orders.update_one.return_value = MagicMock(matched_count=1)
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=0)
+        
+        response = client.patch(
+            '/orders/update_quantity/order-001/prod-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"product_quantity": 5}
+        )
+        
+        assert response.status_code == 400
+        query, update = mock_db.orders.update_one.call_args[0]
+        assert query["products"] == {"$elemMatch": {"product_id": "prod-001", "product_quantity": 5}}
+        assert update[0]["$set"]["products"]["$let"]["in"]["$map"]["in"]["$cond"][1]["$mergeObjects"][1]["product_quantity"] == 2
+        # reservation + compensation only, no stock taken
+        assert mock_db.products.bulk_write.call_count == 2
+    
+    
+    def test_update_order_quantity_revert_missed_leaves_stock(self, client, user_token, mock_db, sample_order, caplog):
+        """Test that stock is not decremented when the order moved on before the line could be put back"""
+        mock_db.orders.reset_mock()
+        mock_db.products.reset_mock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
+        mock_db.orders.update_one.return_value = MagicMock(matched_count=0)
+        mock_db.products.bulk_write.return_value = MagicMock(matched_count=0)
+        
+        response = client.patch(
+            '/orders/update_quantity/order-001/prod-001',
+            headers={'Authorization': f'Bearer {user_token}'},
+            json={"product_quantity": 5}
+        )
+        
+        assert response.status_code == 409
+        assert "order-001 changed while reverting prod-001" in caplog.text
+        # reservation + compensation only, no unguarded decrement
+        assert mock_db.products.bulk_write.call_count == 2
     
     
     def test_update_order_quantity_shipped(self, client, user_token, mock_db, sample_order):
         """Test updating quantity of shipped order"""
         sample_order['order_status'] = 'Shipped'
+        mock_db.orders.find_one_and_update.return_value = None
         mock_db.orders.find_one.return_value = sample_order
         
         response = client.patch(
@@ -233,7 +724,8 @@ class TestOrderRoutes:
     
     def test_update_shipping_address(self, client, user_token, mock_db, sample_order):
         """Test updating shipping address"""
-        mock_db.orders.find_one.side_effect = [sample_order, sample_order]
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
         
         response = client.patch(
             '/orders/update_shipping_address/order-001',
@@ -250,6 +742,7 @@ class TestOrderRoutes:
     def test_update_shipping_address_delivered(self, client, user_token, mock_db, sample_order):
         """Test updating address of delivered order"""
         sample_order['order_status'] = 'Delivered'
+        mock_db.orders.find_one_and_update.return_value = None
         mock_db.orders.find_one.return_value = sample_order
         
         response = client.patch(
@@ -269,8 +762,8 @@ class TestOrderRoutes:
         
         # Set to Confirmed so Shipped is a valid transition
         sample_order['order_status'] = 'Confirmed'
-        mock_db.orders.find_one.return_value = sample_order
-        mock_db.orders.update_one.return_value = MagicMock()
+        sample_order.pop('_id')
+        mock_db.orders.find_one_and_update.return_value = sample_order
         
         response = client.patch(
             '/orders/update_order_status/order-001',
@@ -284,7 +777,24 @@ class TestOrderRoutes:
         data = response.get_json()
         assert 'new_status' in data
         assert data['new_status'] == 'Shipped'
-    
+        assert data['old_status'] == 'Confirmed'
+        query = mock_db.orders.find_one_and_update.call_args[0][0]
+        assert query == {"order_id": "order-001", "order_status": {"$in": ["Confirmed"]}}
+        mock_db.products.bulk_write.assert_not_called()
+
+    def test_update_order_status_rejects_cancelled(self, client, admin_token, mock_db):
+        """Test that cancelling is left to the cancel endpoint, which gives the stock back"""
+        mock_db.orders.reset_mock()
+
+        response = client.patch(
+            '/orders/update_order_status/order-001',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            json={"order_status": "Cancelled"}
+        )
+
+        assert response.status_code == 422
+        mock_db.orders.find_one_and_update.assert_not_called()
+
     def test_update_order_status_unauthorized(self, client, user_token, mock_db):
         """Test regular user trying to update order status"""
         response = client.patch(
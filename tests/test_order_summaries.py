@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+from benchmarks.memory_store import MemoryDatabase
+from db.indexes import ensure_indexes
+from utils.order_summaries import order_summary, rebuild, sync_summary
+
+
+class TestOrderSummaries:
+    """Test suite for the per-user order summary read model"""
+
+    def test_summary_drops_heavy_fields(self, sample_order):
+        summary = order_summary(sample_order)
+
+        assert set(summary) == {"order_id", "user_id", "order_status", "payment_status", "order_price",
+                                "order_quantity", "created_at", "item_count"}
+        assert summary["item_count"] == 1
+
+    def test_rebuild_merges_on_order_id(self):
+        db = MagicMock()
+
+        rebuild(db)
+
+        pipeline = db.orders.aggregate.call_args[0][0]
+        assert "products" not in pipeline[0]["$project"]
+        assert "shipping_address" not in pipeline[0]["$project"]
+        assert pipeline[-1]["$merge"]["on"] == "order_id"
+
+    def test_older_write_does_not_overwrite_newer_summary(self, sample_order):
+        """Test that writers finishing out of order leave the newest version"""
+        db = MemoryDatabase()
+        ensure_indexes(db)
+        order = {k: v for k, v in sample_order.items() if k != "_id"}
+
+        sync_summary(db, {**order, "order_status": "Cancelled", "version": 3})
+        sync_summary(db, {**order, "order_status": "Confirmed", "version": 2})
+        assert db.order_summaries.find_one({"order_id": order["order_id"]})["order_status"] == "Cancelled"
+
+        sync_summary(db, {**order, "order_status": "Cancelled", "version": 4, "payment_status": "Refunded"})
+        summary = db.order_summaries.find_one({"order_id": order["order_id"]})
+        assert (summary["version"], summary["payment_status"]) == (4, "Refunded")
+        assert db.order_summaries.count_documents({}) == 1
@@ -0,0 +1,66 @@
+import pytest
+import threading
+import bcrypt
+from unittest.mock import patch
+from flask import Flask
+from utils.passwords import PasswordHasher, PasswordQueueFull, calibrate_rounds, hash_cost
+
+
+class TestPasswordHasher:
+    """Test suite for the off-thread password hasher"""
+
+    @pytest.fixture
+    def hasher(self):
+        app = Flask(__name__)
+        app.config.update(BCRYPT_ROUNDS=4, BCRYPT_MAX_WORKERS=1, BCRYPT_MAX_QUEUE=1)
+        hasher = PasswordHasher()
+        hasher.init_app(app)
+        return hasher
+
+    def test_hash_and_check(self, hasher):
+        """Test that hashes use the configured cost and verify"""
+        hashed = hasher.hash("Test@123")
+
+        assert hash_cost(hashed) == 4
+        assert hasher.check("Test@123", hashed)
+        assert not hasher.check("Wrong@123", hashed)
+        assert threading.current_thread().name != "bcrypt"
+
+    def test_needs_rehash(self, hasher):
+        """Test that only hashes below the current cost need a rehash"""
+        hasher.rounds = 6
+        assert hasher.needs_rehash(bcrypt.hashpw(b"x", bcrypt.gensalt(4)).decode())
+        assert not hasher.needs_rehash(bcrypt.hashpw(b"x", bcrypt.gensalt(6)).decode())
+        assert not hasher.needs_rehash("not-a-bcrypt-hash")
+
+    def test_queue_limit(self, hasher):
+        """Test that hashes beyond workers + queue are rejected"""
+        release = threading.Event()
+
+        def slow(*args):
+            release.wait(5)
+            return True
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(hasher._run(slow))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        # both slots (1 worker + 1 queued) are taken now
+        for _ in range(100):
+            if hasher._slots._value == 0:
+                break
+            threading.Event().wait(0.01)
+        with pytest.raises(PasswordQueueFull):
+            hasher._run(slow)
+        release.set()
+        for t in threads:
+            t.join()
+        assert results == [True, True]
+
+    def test_calibrate_rounds(self):
+        """Test that the calibrated cost follows the measured hash time"""
+        # 8 rounds take 10ms -> 11 rounds take 80ms, 12 rounds 160ms
+        with patch("utils.passwords.time.perf_counter", side_effect=[0.0, 0.010]):
+            assert calibrate_rounds(100, min_rounds=4) == 11
+        with patch("utils.passwords.time.perf_counter", side_effect=[0.0, 0.010]):
+            assert calibrate_rounds(100, min_rounds=12) == 12
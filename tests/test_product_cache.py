@@ -0,0 +1,136 @@
+import pytest
+import threading
+from unittest.mock import MagicMock, patch
+from flask import Flask
+from utils.product_cache import ProductCache
+
+
+class TestProductCache:
+    """Test suite for the product cache"""
+
+    @pytest.fixture
+    def versions(self):
+        versions = MagicMock()
+        versions.find_one.return_value = {"_id": "products", "version": 1}
+        versions.find_one_and_update.return_value = {"_id": "products", "version": 2}
+        return versions
+
+    @pytest.fixture
+    def cache(self, versions):
+        app = Flask(__name__)
+        app.config.update(PRODUCT_CACHE_ENABLED=True, PRODUCT_CACHE_SIZE=4,
+                          PRODUCT_CACHE_TTL=60, PRODUCT_CACHE_VERSION_INTERVAL=0)
+        cache = ProductCache()
+        cache.init_app(app, versions)
+        return cache
+
+    def _products(self, *skus):
+        collection = MagicMock()
+        collection.find.side_effect = lambda query, projection: [
+            {"sku": sku, "product_id": f"id-{sku}", "product_price": 10}
+            for sku in query[next(iter(query))]["$in"] if sku in skus
+        ]
+        return collection
+
+    def test_read_through(self, cache):
+        """Test that only missing skus hit the collection"""
+        collection = self._products("A", "B")
+
+        assert set(cache.get_many(collection, "sku", ["A"])) == {"A"}
+        assert set(cache.get_many(collection, "sku", ["A", "B"])) == {"A", "B"}
+
+        assert collection.find.call_count == 2
+        assert collection.find.call_args[0][0] == {"sku": {"$in": ["B"]}}
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+
+    def test_stock_is_not_cached(self, cache):
+        """Test that stock and internal fields are projected out"""
+        collection = self._products("A")
+
+        cache.get_many(collection, "sku", ["A"])
+
+        projection = collection.find.call_args[0][1]
+        assert projection["quantity_present"] == 0
+        assert projection["_id"] == 0
+
+    def test_product_id_lookup_shares_entries(self, cache):
+        """Test that a product fetched by sku is also cached by product_id"""
+        collection = self._products("A")
+
+        cache.get_many(collection, "sku", ["A"])
+        found = cache.get_many(collection, "product_id", ["id-A"])
+
+        assert found["id-A"]["sku"] == "A"
+        assert collection.find.call_count == 1
+
+    def test_lru_eviction(self, cache):
+        """Test that the least recently used product is evicted first"""
+        collection = self._products("A", "B", "C")
+
+        cache.get_many(collection, "sku", ["A", "B"])
+        cache.get_many(collection, "sku", ["A"])
+        cache.get_many(collection, "sku", ["C"])
+
+        assert cache.stats()["evictions"] == 2
+        cache.get_many(collection, "sku", ["A"])
+        assert collection.find.call_count == 2
+
+    def test_ttl_expiry(self, cache):
+        """Test that expired entries are fetched again"""
+        collection = self._products("A")
+
+        with patch("utils.product_cache.time.monotonic", return_value=1000):
+            cache.get_many(collection, "sku", ["A"])
+        with patch("utils.product_cache.time.monotonic", return_value=1000 + 61):
+            cache.get_many(collection, "sku", ["A"])
+
+        assert collection.find.call_count == 2
+
+    def test_invalidation_from_another_worker(self, cache, versions):
+        """Test that a new version stamp in Mongo drops the local entries"""
+        collection = self._products("A")
+
+        cache.get_many(collection, "sku", ["A"])
+        versions.find_one.return_value = {"_id": "products", "version": 7}
+        cache.get_many(collection, "sku", ["A"])
+
+        assert collection.find.call_count == 2
+        assert cache.stats()["version"] == 7
+
+    def test_invalidate_bumps_shared_version(self, cache, versions):
+        """Test that a write invalidates locally and bumps the stamp"""
+        collection = self._products("A")
+        cache.get_many(collection, "sku", ["A"])
+
+        cache.invalidate()
+
+        versions.find_one_and_update.assert_called_once()
+        assert cache.stats()["size"] == 0
+        assert cache.stats()["version"] == 2
+
+    def test_read_during_invalidate_is_not_stored(self, cache, versions):
+        """Test that a reader whose query ran before a write does not cache the old document"""
+        versions.find_one.return_value = {"_id": "products", "version": 2}
+        clearing, stored = threading.Event(), threading.Event()
+
+        def bump(*args, **kwargs):
+            # the writer has cleared the entries, the reader stores before the stamp comes back
+            clearing.set()
+            stored.wait(5)
+            return {"_id": "products", "version": 2}
+        versions.find_one_and_update.side_effect = bump
+        writer = threading.Thread(target=cache.invalidate)
+
+        def stale_read(query, projection):
+            writer.start()
+            clearing.wait(5)
+            return [{"sku": "A", "product_id": "id-A", "product_price": 10}]
+        collection = MagicMock()
+        collection.find.side_effect = stale_read
+
+        cache.get_many(collection, "sku", ["A"])
+        stored.set()
+        writer.join(5)
+
+        assert cache.stats()["size"] == 0
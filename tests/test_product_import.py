@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import MagicMock
+from pymongo.errors import BulkWriteError
+from utils.product_import import import_products, ndjson_rows
+
+
+def _row(sku, **overrides):
+    row = {"product_type": "Laptop", "product_name": sku, "product_desc": "d", "product_price": 1,
+           "quantity_present": 1, "is_active": True, "sku": sku}
+    row.update(overrides)
+    return row
+
+
+class TestProductImport:
+    """Test suite for the bulk product import"""
+
+    @pytest.fixture
+    def collection(self):
+        collection = MagicMock()
+        collection.bulk_write.side_effect = lambda ops, ordered: MagicMock(
+            bulk_api_result={"nUpserted": len(ops), "nMatched": 0})
+        return collection
+
+    def test_chunks(self, collection):
+        """Test that rows are written in bulk_writes of chunk_size"""
+        rows = [(i, _row(f"SKU-{i}")) for i in range(1, 8)]
+
+        result = import_products(collection, rows, chunk_size=3)
+
+        assert [len(c[0][0]) for c in collection.bulk_write.call_args_list] == [3, 3, 1]
+        assert result["inserted"] == 7
+
+    def test_repeated_sku_goes_to_next_bulk(self, collection):
+        """Test that a sku is never upserted twice in one unordered bulk"""
+        rows = [(1, _row("A")), (2, _row("B")), (3, _row("A", product_price=2))]
+
+        import_products(collection, rows, chunk_size=10)
+
+        chunks = [[op._filter["sku"] for op in c[0][0]] for c in collection.bulk_write.call_args_list]
+        assert chunks == [["A", "B"], ["A"]]
+
+    def test_write_errors_are_reported_per_row(self, collection):
+        collection.bulk_write.side_effect = BulkWriteError({
+            "nUpserted": 1, "nMatched": 0,
+            "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"}]
+        })
+
+        result = import_products(collection, [(1, _row("A")), (2, _row("B"))])
+
+        assert (result["inserted"], result["failed"]) == (1, 1)
+        assert result["errors"][0]["line"] == 2
+        assert result["errors"][0]["sku"] == "B"
+
+    def test_error_details_are_capped(self, collection):
+        """Test that counts stay exact when the error list is truncated"""
+        rows = [(i, _row(f"SKU-{i}", product_type="Toaster")) for i in range(5)]
+
+        result = import_products(collection, rows, max_errors=2)
+
+        assert result["failed"] == 5
+        assert len(result["errors"]) == 2
+        assert result["errors_truncated"] is True
+        collection.bulk_write.assert_not_called()
+
+    def test_ndjson_rows_skip_blank_lines(self):
+        rows = list(ndjson_rows(['{"sku": "A"}\n', '\n', '[1]\n']))
+
+        assert rows == [(1, {"sku": "A"}), (3, None)]
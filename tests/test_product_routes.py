@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import MagicMock
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from bson import ObjectId
 
@@ -24,7 +25,9 @@ class TestProductRoutes:
     def test_get_products_as_user(self, client, user_token, mock_db, sample_product):
         """Test getting products as regular user (limited fields)"""
         mock_db.products.reset_mock()
-        mock_db.products.find.return_value = [sample_product]
+        # the projection strips internal fields on the server
+        projected = {k: v for k, v in sample_product.items() if k not in ("_id", "product_id", "timestamp")}
+        mock_db.products.find.return_value = [projected]
         
         response = client.get(
             '/product/get_products',
@@ -34,6 +37,251 @@ class TestProductRoutes:
         # Regular users CAN view products (just with limited fields)
         assert response.status_code == 200
         assert isinstance(response.get_json(), list)
+        projection = mock_db.products.find.call_args[0][1]
+        assert projection == {"_id": 0, "product_id": 0, "timestamp": 0, "reservations": 0, "adjustments": 0}
+    
+    
+    def test_get_products_not_modified(self, client, admin_token, mock_db, sample_product):
+        """Test that a listing is answered with a 304 until one of its products changes"""
+        mock_db.products.reset_mock()
+        sample_product['version'] = 1
+        mock_db.products.find.return_value = [sample_product]
+        headers = {'Authorization': f'Bearer {admin_token}'}
+        
+        etag = client.get('/product/get_products', headers=headers).headers['ETag']
+        response = client.get('/product/get_products', headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        sample_product['version'] = 2
+        response = client.get('/product/get_products', headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    
+    
+    def test_get_products_as_user_hides_version(self, client, user_token, mock_db, sample_product):
+        """Test that users get no version counter in the body while the listing ETag still follows it"""
+        mock_db.products.reset_mock()
+        projected = {k: v for k, v in sample_product.items() if k not in ("_id", "product_id", "timestamp")}
+        projected['version'] = 1
+        mock_db.products.find.return_value = [projected]
+        headers = {'Authorization': f'Bearer {user_token}'}
+        
+        response = client.get('/product/get_products', headers=headers)
+        assert response.status_code == 200
+        assert 'version' not in response.get_json()[0]
+        etag = response.headers['ETag']
+        
+        projected['version'] = 2
+        response = client.get('/product/get_products', headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    
+    
+    def test_get_single_product(self, client, user_token, mock_db, sample_product):
+        """Test that a single product carries its version as ETag"""
+        mock_db.products.reset_mock()
+        sample_product.pop('_id')
+        sample_product['version'] = 5
+        mock_db.products.find_one.return_value = sample_product
+        
+        response = client.get(
+            '/product/get_product/prod-001',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers['ETag'] == '"5"'
+        assert 'version' not in response.get_json()
+        
+        mock_db.products.find_one.return_value = None
+        response = client.get(
+            '/product/get_product/prod-002',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        assert response.status_code == 404
+    
+    
+    def test_get_products_filters_and_cursor(self, client, admin_token, mock_db, sample_product):
+        """Test that filters are pushed into the query and the next cursor is returned"""
+        mock_db.products.reset_mock()
+        second = {**sample_product, "_id": ObjectId(), "sku": "DELL-XPS-15-002"}
+        mock_db.products.find.return_value = [sample_product, second]
+        
+        response = client.get(
+            '/product/get_products?limit=1&after=A&product_type=Laptop&min_price=100&max_price=2000&is_active=true',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert len(response.get_json()) == 1
+        assert response.headers['X-Next-Cursor'] == sample_product["sku"]
+        args, kwargs = mock_db.products.find.call_args
+        assert args[0] == {
+            "sku": {"$gt": "A"},
+            "product_type": "Laptop",
+            "is_active": True,
+            "product_price": {"$gte": 100, "$lte": 2000}
+        }
+        assert kwargs == {"sort": [("sku", 1)], "limit": 2}
+    
+    
+    def test_get_products_last_page(self, client, admin_token, mock_db, sample_product):
+        """Test that the last page has no next cursor"""
+        mock_db.products.reset_mock()
+        mock_db.products.find.return_value = [sample_product]
+        
+        response = client.get(
+            '/product/get_products?limit=5',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert 'X-Next-Cursor' not in response.headers
+    
+    
+    def test_get_products_invalid_limit(self, client, admin_token, mock_db):
+        """Test that the page size is bounded"""
+        response = client.get(
+            '/product/get_products?limit=100000',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 422
+    
+    
+    def test_export_products(self, client, admin_token, mock_db, sample_product):
+        """Test streaming the catalog as NDJSON"""
+        mock_db.products.reset_mock()
+        sample_product.pop('_id')
+        mock_db.products.find.return_value.__iter__.return_value = iter([sample_product])
+        
+        response = client.get(
+            '/product/export',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).count("\n") == 1
+        assert 'attachment' in response.headers['Content-Disposition']
+    
+    
+    def test_cache_stats_admin_only(self, client, admin_token, user_token):
+        """Test that cache counters are exposed to admins only"""
+        response = client.get(
+            '/product/cache_stats',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        assert response.status_code == 200
+        assert {'hits', 'misses', 'size'} <= set(response.get_json())
+        
+        response = client.get(
+            '/product/cache_stats',
+            headers={'Authorization': f'Bearer {user_token}'}
+        )
+        assert response.status_code == 403
+    
+    
+    def test_import_products_ndjson(self, client, admin_token, mock_db):
+        """Test that valid rows are upserted by sku and invalid rows reported"""
+        mock_db.products.reset_mock()
+        mock_db.products.bulk_write.return_value = MagicMock(
+            bulk_api_result={"nUpserted": 1, "nMatched": 1})
+        body = "\n".join([
+            '{"product_type": "Laptop", "product_name": "A", "product_desc": "a", "product_price": 10, '
+            '"quantity_present": 1, "is_active": true, "sku": "SKU-A"}',
+            '{"product_type": "Laptop", "product_name": "B", "product_desc": "b", "product_price": "free", '
+            '"quantity_present": 1, "is_active": true, "sku": "SKU-B"}',
+            'not json',
+            '{"product_type": "TV", "product_name": "C", "product_desc": "c", "product_price": 5, '
+            '"quantity_present": 2, "is_active": false, "sku": "SKU-C"}',
+        ])
+        
+        response = client.post(
+            '/product/import',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            data=body
+        )
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert (data['received'], data['inserted'], data['updated'], data['failed']) == (4, 1, 1, 2)
+        assert [(e['line'], e['sku']) for e in data['errors']] == [(2, 'SKU-B'), (3, None)]
+        assert 'product_price' in data['errors'][0]['errors']
+        
+        ops = mock_db.products.bulk_write.call_args[0][0]
+        assert [op._filter for op in ops] == [{"sku": "SKU-A"}, {"sku": "SKU-C"}]
+        assert ops[0]._upsert is True
+        assert 'product_id' in ops[0]._doc['$setOnInsert']
+        assert mock_db.products.bulk_write.call_args[1]['ordered'] is False
+    
+    
+    def test_import_products_csv(self, client, admin_token, mock_db):
+        """Test importing a CSV, including the columns of a product export"""
+        mock_db.products.reset_mock()
+        mock_db.products.bulk_write.return_value = MagicMock(
+            bulk_api_result={"nUpserted": 1, "nMatched": 0})
+        body = (
+            "product_id,product_type,product_name,product_desc,product_price,quantity_present,is_active,sku\n"
+            "old-id,Smartphone,Phone,Nice phone,499.5,30,true,PHONE-1\n"
+        )
+        
+        response = client.post(
+            '/product/import?format=csv',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            data=body
+        )
+        
+        assert response.status_code == 200
+        assert response.get_json()['inserted'] == 1
+        op = mock_db.products.bulk_write.call_args[0][0][0]
+        assert op._doc['$set']['product_price'] == 499.5
+        assert op._doc['$set']['quantity_present'] == 30
+        assert 'product_id' not in op._doc['$set']
+    
+    
+    def test_import_products_unauthorized(self, client, user_token, mock_db):
+        """Test that only admins can import products"""
+        response = client.post(
+            '/product/import',
+            headers={'Authorization': f'Bearer {user_token}'},
+            data='{}'
+        )
+        
+        assert response.status_code == 403
+    
+    
+    def test_stock_adjust(self, client, admin_token, mock_db):
+        """Test that adjustments are sent as relative $inc in one unordered bulk"""
+        mock_db.products.reset_mock()
+        mock_db.products.find.side_effect = lambda query, projection: [
+            {"sku": "SKU-A", "quantity_present": 15,
+             "adjustments": [mock_db.products.bulk_write.call_args[0][0][0]._doc["$addToSet"]["adjustments"]]}
+        ]
+        
+        response = client.post(
+            '/product/stock_adjust',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            json={"adjustments": [{"sku": "SKU-A", "delta": 5}, {"sku": "SKU-B", "delta": -1}]}
+        )
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['results'] == [{"sku": "SKU-A", "quantity_present": 15}]
+        assert data['errors'] == [{"sku": "SKU-B", "error": "Product not found"}]
+        ops = mock_db.products.bulk_write.call_args[0][0]
+        assert ops[0]._doc['$inc'] == {"quantity_present": 5, "version": 1}
+        assert ops[1]._filter['quantity_present'] == {"$gte": 1}
+        mock_db.products.find.side_effect = None
+    
+    
+    def test_stock_adjust_needs_delta_or_set(self, client, admin_token, mock_db):
+        response = client.post(
+            '/product/stock_adjust',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            json={"adjustments": [{"sku": "SKU-A", "delta": 5, "set": 3}]}
+        )
+        
+        assert response.status_code == 422
     
     
     def test_add_product_success(self, client, admin_token, mock_db):
@@ -84,6 +332,30 @@ class TestProductRoutes:
         assert response.status_code == 409
     
     
+    def test_add_product_duplicate_sku_race(self, client, admin_token, mock_db):
+        """Test that an add losing the race to the unique sku index is a 409"""
+        mock_db.products.reset_mock()
+        mock_db.products.find_one.return_value = None
+        mock_db.products.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error index: sku_unique")
+        
+        response = client.post(
+            '/product/add_products',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            json={
+                "product_type": "Laptop",
+                "product_name": "MacBook Pro",
+                "product_desc": "Apple laptop",
+                "product_price": 2499.99,
+                "quantity_present": 5,
+                "is_active": True,
+                "sku": "APPLE-MBP-001"
+            }
+        )
+        
+        assert response.status_code == 409
+        assert response.get_json()["message"] == "sku exists"
+    
+    
     def test_add_product_unauthorized(self, client, user_token, mock_db):
         """Test adding product as regular user"""
         response = client.post(
@@ -106,9 +378,7 @@ class TestProductRoutes:
     def test_update_product_success(self, client, admin_token, mock_db, sample_product):
         """Test updating product"""
         mock_db.products.reset_mock()
-        # find_one called twice: once to check existence, once to check SKU
-        mock_db.products.find_one.side_effect = [sample_product, None]
-        mock_db.products.update_one.return_value = MagicMock()
+        mock_db.products.find_one_and_update.return_value = {"version": 4}
         
         response = client.put(
             '/product/update_product/prod-001',
@@ -124,11 +394,60 @@ class TestProductRoutes:
         )
         
         assert response.status_code == 201
+        assert response.headers['ETag'] == '"4"'
+    
+    
+    def test_update_product_if_match(self, client, admin_token, mock_db, sample_product):
+        """Test that If-Match makes the update conditional on the version"""
+        mock_db.products.reset_mock()
+        mock_db.products.find_one_and_update.return_value = None
+        mock_db.products.find_one.return_value = sample_product
+        
+        response = client.put(
+            '/product/update_product/prod-001',
+            headers={'Authorization': f'Bearer {admin_token}', 'If-Match': '"3"'},
+            json={
+                "product_name": "Dell XPS 15 Updated",
+                "product_desc": "Updated description",
+                "product_price": 1399.99,
+                "quantity_present": 15,
+                "is_active": True,
+                "sku": "DELL-XPS-15-001"
+            }
+        )
+        
+        assert response.status_code == 412
+        query, update = mock_db.products.find_one_and_update.call_args[0]
+        assert query == {"product_id": "prod-001", "version": 3}
+        assert update["$inc"] == {"version": 1}
+    
+    
+    def test_update_product_duplicate_sku(self, client, admin_token, mock_db):
+        """Test that changing the sku to one another product has is a 409"""
+        mock_db.products.reset_mock()
+        mock_db.products.find_one_and_update.side_effect = DuplicateKeyError("E11000 duplicate key error index: sku_unique")
+        
+        response = client.put(
+            '/product/update_product/prod-001',
+            headers={'Authorization': f'Bearer {admin_token}'},
+            json={
+                "product_name": "Dell XPS 15 Updated",
+                "product_desc": "Updated description",
+                "product_price": 1399.99,
+                "quantity_present": 15,
+                "is_active": True,
+                "sku": "APPLE-MBP-001"
+            }
+        )
+        
+        assert response.status_code == 409
+        assert response.get_json()["message"] == "sku exists"
     
     
     def test_update_product_not_found(self, client, admin_token, mock_db):
         """Test updating non-existent product"""
         mock_db.products.reset_mock()
+        mock_db.products.find_one_and_update.return_value = None
         mock_db.products.find_one.return_value = None
         
         response = client.put(
@@ -150,8 +469,9 @@ class TestProductRoutes:
     def test_patch_product_price(self, client, admin_token, mock_db, sample_product):
         """Test partially updating product (price only)"""
         mock_db.products.reset_mock()
-        mock_db.products.find_one.return_value = sample_product
-        mock_db.products.update_one.return_value = MagicMock()
+        sample_product.pop('_id')
+        sample_product['version'] = 2
+        mock_db.products.find_one_and_update.return_value = sample_product
         
         response = client.patch(
             '/product/update/prod-001',
@@ -0,0 +1,87 @@
+import os
+import pstats
+import pytest
+from unittest.mock import patch
+from utils.profiling import PROJECT_ROOT, breakdown, callgrind, request_profiler
+
+
+class TestProfiling:
+    """Test suite for the on-demand request profiler"""
+
+    @pytest.fixture(autouse=True)
+    def profile_dir(self, tmp_path):
+        with patch.object(request_profiler, "directory", str(tmp_path)):
+            yield tmp_path
+
+    @pytest.fixture
+    def products(self, mock_db, sample_product):
+        sample_product['_id'] = str(sample_product['_id'])
+        mock_db.products.find.return_value = [sample_product]
+
+    def test_unprofiled_requests_untouched(self, client, user_token, products, profile_dir):
+        response = client.get('/product/get_products', headers={'Authorization': f'Bearer {user_token}'})
+
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+        assert os.listdir(profile_dir) == []
+
+    def test_profiling_admin_only(self, client, user_token, products, profile_dir):
+        response = client.get('/product/get_products?_profile=1', headers={'Authorization': f'Bearer {user_token}'})
+
+        assert response.status_code == 403
+        assert os.listdir(profile_dir) == []
+
+    def test_profile_stored_and_downloadable(self, client, admin_token, products, profile_dir):
+        """Test that a profiled request keeps its body and its profile can be listed and downloaded"""
+        headers = {'Authorization': f'Bearer {admin_token}'}
+        response = client.get('/product/get_products', headers={**headers, 'X-Profile': '1'})
+
+        assert response.status_code == 200
+        assert response.get_json()[0]["sku"]
+        profile_id = response.headers['X-Profile-Id']
+        assert 'total;dur=' in response.headers['Server-Timing']
+        assert sorted(os.listdir(profile_dir)) == [f"{profile_id}.callgrind", f"{profile_id}.json", f"{profile_id}.prof"]
+
+        listed = client.get('/admin/profiles', headers=headers).get_json()["profiles"]
+        assert [p["id"] for p in listed] == [profile_id]
+        assert listed[0]["endpoint"] == "product.Get_Product"
+
+        report = client.get(f'/admin/profiles/{profile_id}', headers=headers).get_json()
+        assert report["top"][0]["cumtime_ms"] >= report["top"][-1]["cumtime_ms"]
+        assert "framework" in report["breakdown_ms"]
+
+        dump = client.get(f'/admin/profiles/{profile_id}?format=pstats', headers=headers)
+        path = profile_dir / "download.prof"
+        path.write_bytes(dump.get_data())
+        assert pstats.Stats(str(path)).total_tt > 0
+        grind = client.get(f'/admin/profiles/{profile_id}?format=callgrind', headers=headers)
+        assert grind.get_data(as_text=True).startswith("# callgrind format")
+        assert client.get('/admin/profiles/missing', headers=headers).status_code == 404
+
+    def test_inline_report(self, client, admin_token, products):
+        response = client.get('/product/get_products',
+                              headers={'Authorization': f'Bearer {admin_token}', 'X-Profile': 'inline'})
+
+        body = response.get_json()
+        assert response.status_code == 200
+        assert body["status"] == 200
+        assert body["path"] == "/product/get_products"
+        assert body["total_ms"] > 0
+        assert len(body["top"]) <= request_profiler.top
+
+    def test_breakdown_charges_builtins_to_their_caller(self):
+        """Test that a lock wait under the password pool counts as bcrypt time"""
+        hasher = (os.path.join(PROJECT_ROOT, "utils", "passwords.py"), 88, "_run")
+        view = (os.path.join(PROJECT_ROOT, "routes", "user_routes.py"), 10, "post")
+        find = ("/venv/site-packages/pymongo/collection.py", 1, "find_one")
+        wait = ("~", 0, "<method 'acquire' of '_thread.lock' objects>")
+        stats = {
+            view: (1, 1, 0.001, 0.5, {}),
+            hasher: (1, 1, 0.002, 0.4, {view: (1, 1, 0.002, 0.4)}),
+            find: (1, 1, 0.01, 0.09, {view: (1, 1, 0.01, 0.09)}),
+            wait: (2, 2, 0.47, 0.47, {hasher: (1, 1, 0.39, 0.39), find: (1, 1, 0.08, 0.08)}),
+        }
+
+        totals = breakdown(stats)
+        assert totals == {"view": 0.001, "bcrypt": pytest.approx(0.472), "mongo": 0.01}
+        assert "cfn=_run:88" in callgrind(stats)
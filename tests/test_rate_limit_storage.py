@@ -0,0 +1,135 @@
+import multiprocessing
+import pytest
+from unittest.mock import patch
+from limits import parse
+from limits.errors import ConfigurationError
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+from utils.rate_limit_storage import MmapStorage
+
+
+def _hammer(uri, hits, results):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    item = parse("100 per hour")
+    results.put(sum(limiter.hit(item, "client") for _ in range(hits)))
+
+
+class TestMmapStorage:
+    """Test suite for the shared memory-mapped rate limit storage"""
+
+    @pytest.fixture
+    def uri(self, tmp_path):
+        return f"mmap://{tmp_path}/ratelimit.mmap"
+
+    @pytest.fixture
+    def storage(self, uri):
+        storage = storage_from_string(uri, slots=64, windows=16, window_size=8)
+        yield storage
+        storage.close()
+
+    def test_scheme_is_registered(self, storage):
+        """Test that mmap:// URIs resolve to MmapStorage"""
+        assert isinstance(storage, MmapStorage)
+        assert storage.check()
+
+    def test_fixed_window(self, storage):
+        """Test that a fixed window allows `amount` hits then refuses"""
+        limiter = FixedWindowRateLimiter(storage)
+        item = parse("3 per minute")
+
+        assert [limiter.hit(item, "a") for _ in range(4)] == [True, True, True, False]
+        assert limiter.hit(item, "b")
+        assert limiter.get_window_stats(item, "a").remaining == 0
+
+    def test_fixed_window_expiry(self, storage):
+        """Test that the counter starts over once the window has passed"""
+        with patch("utils.rate_limit_storage.time.time", return_value=1000):
+            assert storage.incr("k", 60) == 1
+            assert storage.incr("k", 60) == 2
+            assert storage.get_expiry("k") == 1060
+        with patch("utils.rate_limit_storage.time.time", return_value=1061):
+            assert storage.get("k") == 0
+            assert storage.incr("k", 60) == 1
+
+    def test_moving_window(self, storage):
+        """Test that moving window hits free up one by one as they age out"""
+        limiter = MovingWindowRateLimiter(storage)
+        item = parse("2 per minute")
+
+        with patch("utils.rate_limit_storage.time.time", return_value=1000):
+            assert limiter.hit(item, "a")
+        with patch("utils.rate_limit_storage.time.time", return_value=1030):
+            assert limiter.hit(item, "a")
+            assert not limiter.hit(item, "a")
+        with patch("utils.rate_limit_storage.time.time", return_value=1061):
+            assert storage.get_moving_window(item.key_for("a"), 2, 60) == (1030, 1)
+            assert limiter.hit(item, "a")
+            assert not limiter.hit(item, "a")
+
+    def test_moving_window_above_ring_size(self, storage):
+        """Test that a limit larger than the ring is a configuration error"""
+        with pytest.raises(ConfigurationError):
+            storage.acquire_entry("k", 9, 60)
+
+    def test_counters_survive_restart(self, storage, uri):
+        """Test that a new worker opening the file sees the same counters"""
+        storage.incr("k", 60, amount=5)
+
+        restarted = storage_from_string(uri, slots=64, windows=16, window_size=8)
+        try:
+            assert restarted.get("k") == 5
+        finally:
+            restarted.close()
+
+    def test_clear_and_reset(self, storage):
+        storage.incr("a", 60)
+        storage.incr("b", 60)
+        storage.acquire_entry("b", 2, 60)
+
+        storage.clear("a")
+        assert storage.get("a") == 0
+        assert storage.reset() == 2
+        assert storage.get("b") == 0
+
+    def test_full_stripe_fails_closed(self, uri):
+        """Test that a full stripe refuses new keys instead of resetting a live counter"""
+        storage = MmapStorage(uri, slots=16, windows=4)
+        limiter = FixedWindowRateLimiter(storage)
+        item = parse("5 per day")
+        try:
+            with patch("utils.rate_limit_storage.time.time", return_value=1000):
+                for i in range(16):
+                    assert limiter.hit(item, f"client-{i}")
+                with patch("utils.rate_limit_storage.metrics") as metrics:
+                    assert not limiter.hit(item, "new")
+                    for i in range(4):
+                        assert storage.acquire_entry(f"w{i}", 2, 60)
+                    assert not storage.acquire_entry("w-new", 2, 60)
+                metrics.inc.assert_any_call("rate_limit_table_full_total", {"table": "counter"})
+                metrics.inc.assert_any_call("rate_limit_table_full_total", {"table": "window"})
+                # nobody's counter was reset to make room
+                assert all(storage.get(item.key_for(f"client-{i}")) == 1 for i in range(16))
+
+            # an expired slot is taken again
+            with patch("utils.rate_limit_storage.time.time", return_value=1000 + 86401):
+                assert limiter.hit(item, "new")
+        finally:
+            storage.close()
+
+    def test_sized_from_config(self, app):
+        """Test that the table size comes from RATELIMIT_STORAGE_OPTIONS"""
+        options = app.config["RATELIMIT_STORAGE_OPTIONS"]
+        assert options["slots"] >= 65536
+        assert set(options) == {"slots", "windows", "window_size"}
+
+    def test_limit_shared_across_processes(self, uri):
+        """Test that workers in other processes draw from the same counter"""
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=_hammer, args=(uri, 50, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert sum(results.get(timeout=5) for _ in workers) == 100
@@ -0,0 +1,62 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import MagicMock
+from utils.sales_rollups import backfill, rollup_changes
+
+
+@pytest.fixture
+def order():
+    return {
+        "order_id": "order-001",
+        "order_status": "Pending",
+        "order_quantity": 3,
+        "order_price": 30,
+        "created_at": datetime(2026, 3, 1, 12, 0),
+        "products": [
+            {"product_id": "p1", "sku": "A", "product_name": "A", "product_quantity": 1, "total_price": 10},
+            {"product_id": "p1", "sku": "A", "product_name": "A", "product_quantity": 1, "total_price": 10},
+            {"product_id": "p2", "sku": "B", "product_name": "B", "product_quantity": 1, "total_price": 10},
+        ]
+    }
+
+
+class TestSalesRollups:
+    """Test suite for the incrementally maintained sales rollups"""
+
+    def test_new_order(self, order):
+        daily_ops, product_ops = rollup_changes(None, order)
+
+        assert daily_ops[0]._filter == {"_id": "2026-03-01"}
+        assert daily_ops[0]._doc["$inc"] == {"orders": 1, "units": 3, "revenue": 30, "orders_by_status.Pending": 1}
+        incs = {op._filter["product_id"]: op._doc["$inc"] for op in product_ops}
+        # a product on two lines of one order counts as one order
+        assert incs == {"p1": {"orders": 1, "units": 2, "revenue": 20}, "p2": {"orders": 1, "units": 1, "revenue": 10}}
+        assert all(op._upsert for op in daily_ops + product_ops)
+
+    def test_status_change_only_moves_status_counts(self, order):
+        daily_ops, product_ops = rollup_changes(order, {**order, "order_status": "Confirmed"})
+
+        assert daily_ops[0]._doc["$inc"] == {"orders_by_status.Pending": -1, "orders_by_status.Confirmed": 1}
+        assert product_ops == []
+
+    def test_quantity_change_only_touches_changed_product(self, order):
+        new = {**order, "order_quantity": 5, "order_price": 50,
+               "products": order["products"][:2] + [{**order["products"][2], "product_quantity": 3, "total_price": 30}]}
+
+        daily_ops, product_ops = rollup_changes(order, new)
+
+        assert daily_ops[0]._doc["$inc"] == {"units": 2, "revenue": 20}
+        assert [(op._filter["product_id"], op._doc["$inc"]) for op in product_ops] == [("p2", {"units": 2, "revenue": 20})]
+
+    def test_backfill_rebuilds_from_orders(self):
+        """Test that a partial backfill clears and rebuilds only the given days"""
+        db = MagicMock()
+
+        backfill(db, since=date(2026, 3, 1))
+
+        db.sales_daily.delete_many.assert_called_once_with({"_id": {"$gte": "2026-03-01"}})
+        db.sales_product_daily.delete_many.assert_called_once_with({"day": {"$gte": "2026-03-01"}})
+        daily, products = [c[0][0] for c in db.orders.aggregate.call_args_list]
+        assert daily[0] == {"$match": {"created_at": {"$gte": datetime(2026, 3, 1)}}}
+        assert daily[-1]["$merge"]["into"] == "sales_daily"
+        assert products[-1]["$merge"]["on"] == ["day", "product_id"]
@@ -0,0 +1,137 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from utils.slow_queries import (SlowQueryLog, call_site, command_filter, main, plan_summary, redact,
+                                slow_query_log, suggest_index)
+
+COLLSCAN_PLAN = {"queryPlanner": {"winningPlan": {
+    "stage": "SORT", "inputStage": {"stage": "COLLSCAN", "filter": {}}
+}}}
+
+
+def run_command(log, command_name, command, duration_ms, request_id=1):
+    connection = ("localhost", 27017)
+    log.started(SimpleNamespace(request_id=request_id, connection_id=connection, command_name=command_name,
+                                command=command))
+    log.succeeded(SimpleNamespace(request_id=request_id, connection_id=connection, command_name=command_name,
+                                  duration_micros=int(duration_ms * 1000)))
+
+
+class TestSlowQueries:
+    """Test suite for the slow command log and index advisor"""
+
+    @pytest.fixture
+    def log(self):
+        log = SlowQueryLog()
+        log.threshold_ms = 50
+        # the tests flush and explain themselves
+        with patch.object(log, "_ensure_thread"):
+            yield log
+
+    def test_redact_keeps_operators_and_fields(self):
+        shape = redact({"user_id": "u-1", "price": {"$gte": 10, "$lt": 20}, "sku": {"$in": ["A", "B"]},
+                        "$or": [{"status": "paid"}, {"status": "shipped"}]})
+
+        assert shape == {"user_id": "?", "price": {"$gte": "?", "$lt": "?"}, "sku": {"$in": "?"},
+                         "$or": [{"status": "?"}, {"status": "?"}]}
+
+    def test_command_filter_per_command(self):
+        assert command_filter("find", {"find": "products", "filter": {"sku": "A"}, "sort": {"sku": 1}}) == ({"sku": "A"}, {"sku": 1})
+        assert command_filter("findAndModify", {"findAndModify": "orders", "query": {"order_id": "o"}}) == ({"order_id": "o"}, None)
+        assert command_filter("update", {"update": "products", "updates": [{"q": {"sku": "A"}, "u": {}}]}) == ({"sku": "A"}, None)
+        pipeline = [{"$match": {"day": {"$gte": "2024"}}}, {"$sort": {"day": 1}}, {"$group": {}}]
+        assert command_filter("aggregate", {"aggregate": "sales", "pipeline": pipeline}) == ({"day": {"$gte": "2024"}}, {"day": 1})
+        assert command_filter("insert", {"insert": "orders"}) == ({}, None)
+
+    def test_suggest_index_equality_sort_range(self):
+        keys = suggest_index({"created_at": {"$gte": 1}, "user_id": "u", "status": {"$in": ["paid"]}},
+                             {"created_at": -1, "order_id": -1})
+
+        assert keys == [["user_id", 1], ["status", 1], ["created_at", -1], ["order_id", -1]]
+
+    def test_plan_summary_flags_collscan(self):
+        assert plan_summary(COLLSCAN_PLAN) == {"collscan": True, "in_memory_sort": True,
+                                               "stages": ["SORT", "COLLSCAN"], "indexes": []}
+        indexed = {"queryPlanner": {"winningPlan": {"queryPlan": {
+            "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "sku_unique"}}}}}
+        summary = plan_summary(indexed)
+        assert not summary["collscan"]
+        assert summary["indexes"] == ["sku_unique"]
+
+    def test_only_slow_commands_are_recorded(self, log, mock_db):
+        """Test that slow commands are grouped by shape and source and fast ones ignored"""
+        run_command(log, "find", {"find": "orders", "filter": {"user_id": "u-1"}}, 10)
+        run_command(log, "find", {"find": "orders", "filter": {"user_id": "u-1"}}, 80)
+        run_command(log, "find", {"find": "orders", "filter": {"user_id": "u-2"}}, 120)
+        # the report itself and cursor plumbing are never recorded
+        run_command(log, "update", {"update": "slow_queries", "updates": [{"q": {}}]}, 500)
+        run_command(log, "getMore", {"getMore": 1, "collection": "orders"}, 500)
+
+        assert log.flush(mock_db) == 1
+        op = mock_db.slow_queries.bulk_write.call_args[0][0][0]
+        update = op._doc
+        assert update["$set"]["shape"] == '{"user_id": "?"}'
+        assert update["$set"]["source"].startswith("tests/test_slow_queries.py:")
+        assert update["$inc"] == {"count": 2, "total_ms": 200.0}
+        assert update["$max"]["max_ms"] == 120.0
+        # the buffer is emptied by the flush
+        assert log.flush(mock_db) == 0
+
+    def test_call_site_only_for_slow_commands(self, log):
+        """Test that the stack is walked only once a command turns out to be slow"""
+        with patch("utils.slow_queries.call_site", return_value="routes/order_routes.py:10 (get)") as site:
+            run_command(log, "find", {"find": "orders", "filter": {"user_id": "u-1"}}, 10)
+            assert not site.called
+            run_command(log, "find", {"find": "orders", "filter": {"user_id": "u-1"}}, 80)
+            assert site.call_count == 1
+
+        assert [stats["source"] for stats in log._buffer.values()] == ["routes/order_routes.py:10 (get)"]
+
+    def test_explain_slowest_flags_collscan(self, log, mock_db):
+        """Test that the slowest shape is explained with a real filter and gets an index suggestion"""
+        mock_db.command.return_value = COLLSCAN_PLAN
+        run_command(log, "find", {"find": "orders", "filter": {"status": "paid"}, "sort": {"created_at": -1}}, 300)
+
+        assert log.explain_slowest(mock_db) == 1
+        explain = mock_db.command.call_args[0][0]
+        assert explain["explain"] == {"find": "orders", "filter": {"status": "paid"}, "sort": {"created_at": -1}}
+        verdict = mock_db.slow_queries.update_one.call_args[0][1]["$set"]["explain"]
+        assert verdict["collscan"]
+        assert verdict["suggested_index"] == [["status", 1], ["created_at", -1]]
+        # explained again only after SLOW_QUERY_EXPLAIN_EVERY
+        assert log.explain_slowest(mock_db) == 0
+
+    def test_admin_endpoint(self, client, admin_token, user_token, mock_db):
+        mock_db.slow_queries.find.return_value = [
+            {"_id": "abc", "collection": "orders", "command": "find", "shape": '{"status": "?"}',
+             "count": 4, "total_ms": 400.0, "max_ms": 150.0, "explain": {"collscan": True}}
+        ]
+        with patch("routes.admin_routes.db", mock_db):
+            assert client.get('/admin/slow_queries', headers={'Authorization': f'Bearer {user_token}'}).status_code == 403
+            response = client.get('/admin/slow_queries?collscan=true', headers={'Authorization': f'Bearer {admin_token}'})
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["queries"][0]["id"] == "abc"
+        assert body["queries"][0]["avg_ms"] == 100.0
+        assert mock_db.slow_queries.find.call_args[0][0] == {"explain.collscan": True}
+
+    def test_cli_report(self, mock_db, capsys):
+        mock_db.slow_queries.find.return_value = [
+            {"_id": "abc", "collection": "orders", "command": "find", "shape": '{"status": "?"}', "sort": None,
+             "source": "routes/order_routes.py:10 (get)", "count": 2, "total_ms": 300.0, "max_ms": 200.0,
+             "explain": {"collscan": True, "in_memory_sort": False, "stages": ["FETCH", "COLLSCAN"],
+                         "suggested_index": [["status", 1]]}}
+        ]
+        with patch("db.mongo_db.db", mock_db):
+            assert main([]) == 0
+
+        out = capsys.readouterr().out
+        assert "orders.find {\"status\": \"?\"}" in out
+        assert "avg 150.0ms" in out
+        assert "[collscan]" in out
+        assert "suggested index: {status: 1}" in out
+
+    def test_call_site_skips_libraries(self):
+        assert call_site().startswith("tests/test_slow_queries.py:")
+        assert slow_query_log.enabled
@@ -0,0 +1,281 @@
+import glob
+import os
+import re
+import pytest
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from benchmarks.memory_store import MemoryDatabase
+from sqlalchemy import create_engine, text
+from db.documents import OPERATORS
+from db.indexes import ensure_indexes, index_drift
+from db.sql_db import SqlDatabase, encode, upgrade
+from routes.order_routes import quantity_update
+from utils.order_summaries import rebuild, sync_summary
+from utils.sales_rollups import apply_rollups, backfill
+
+
+@pytest.fixture
+def sql(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'inventory.db'}"
+    upgrade(uri)
+    database = SqlDatabase(uri)
+    yield database
+    database.close()
+
+
+def backend_app(database):
+    """The app with every route collection on ``database``"""
+    collections = {
+        "db.mongo_db.db": database,
+        "routes.user_routes.user_collection": database.users,
+        "routes.product_routes.product_collection": database.products,
+        "routes.order_routes.order_collection": database.orders,
+        "routes.order_routes.order_summary_collection": database.order_summaries,
+        "routes.order_routes.user_collection": database.users,
+        "routes.order_routes.product_collection": database.products,
+        "routes.analytics_routes.sales_daily_collection": database.sales_daily,
+        "routes.analytics_routes.sales_product_daily_collection": database.sales_product_daily,
+    }
+    with ExitStack() as stack:
+        for target, value in collections.items():
+            stack.enter_context(patch(target, value))
+        from app import create_app
+        yield create_app("testing")
+
+
+class TestSqlBackend:
+    """Test suite for the SQLAlchemy storage backend"""
+
+    def test_migrations_create_the_declared_indexes(self, sql):
+        assert index_drift(sql) == {}
+        sql.products.insert_one({"sku": "SKU-1", "product_id": "p-1"})
+        with pytest.raises(DuplicateKeyError):
+            sql.products.insert_one({"sku": "SKU-1", "product_id": "p-2"})
+
+    def test_documents_round_trip_like_bson(self, sql):
+        """Test that values come back as pymongo returns them: ObjectIds, naive datetimes to the millisecond"""
+        created = datetime(2026, 1, 2, 3, 4, 5, 678901)
+        _id = sql.orders.insert_one({"order_id": "o-1", "user_id": "u-1", "created_at": created,
+                                     "products": [{"sku": "A", "n": 1}]}).inserted_id
+
+        order = sql.orders.find_one(_id)
+        assert isinstance(order["_id"], ObjectId)
+        assert order["created_at"] == datetime(2026, 1, 2, 3, 4, 5, 678000)
+        assert sql.orders.find_one({"created_at": created, "products.sku": "A"}, {"_id": 0, "order_id": 1}) == {"order_id": "o-1"}
+        sql.versions.find_one_and_update({"_id": "products"}, {"$inc": {"version": 1}}, upsert=True)
+        assert sql.versions.find_one("products") == {"_id": "products", "version": 1}
+
+    def test_pages_and_filters(self, sql):
+        sql.products.insert_many([
+            {"product_id": f"p-{i}", "sku": f"SKU-{i:03d}", "product_type": "TV" if i % 2 else "Laptop",
+             "product_price": i * 10, "is_active": True, "tags": ["new"] if i < 3 else []}
+            for i in range(20)
+        ])
+
+        page = list(sql.products.find({"sku": {"$gt": "SKU-005"}, "product_type": "TV"}, {"_id": 0, "sku": 1},
+                                      sort=[("sku", 1)], limit=2))
+        assert page == [{"sku": "SKU-007"}, {"sku": "SKU-009"}]
+        # filters and sorts on fields without a column are evaluated on the documents
+        assert [p["sku"] for p in sql.products.find({"tags": "new"}).sort("product_price", -1)] == \
+            ["SKU-002", "SKU-001", "SKU-000"]
+        assert sql.products.count_documents({"$or": [{"sku": "SKU-001"}, {"product_price": {"$gte": 180}}]}) == 3
+        assert sql.products.delete_many({"product_type": "Laptop"}).deleted_count == 10
+        assert sql.products.estimated_document_count() == 10
+
+    def test_guarded_bulk_writes(self, sql):
+        """Test the reservation bulk of utils/stock.py and the per-operation errors of an import"""
+        sql.products.insert_many([{"product_id": "p-1", "sku": "A", "quantity_present": 5},
+                                  {"product_id": "p-2", "sku": "B", "quantity_present": 1}])
+
+        result = sql.products.bulk_write([
+            UpdateOne({"product_id": "p-1", "quantity_present": {"$gte": 3}, "reservations": {"$ne": "r1"}},
+                      {"$inc": {"quantity_present": -3}, "$addToSet": {"reservations": "r1"}}),
+            UpdateOne({"product_id": "p-2", "quantity_present": {"$gte": 3}}, {"$inc": {"quantity_present": -3}}),
+        ], ordered=False)
+        assert result.matched_count == 1
+        assert sql.products.find_one({"reservations": "r1"})["quantity_present"] == 2
+
+        with pytest.raises(BulkWriteError) as error:
+            sql.products.bulk_write([
+                UpdateOne({"sku": "C"}, {"$set": {"product_id": "p-1"}}, upsert=True),
+                UpdateOne({"sku": "D"}, {"$set": {"product_id": "p-4"}}, upsert=True),
+            ], ordered=False)
+        assert [e["index"] for e in error.value.details["writeErrors"]] == [0]
+        assert error.value.details["nUpserted"] == 1
+        assert sql.products.find_one({"sku": "C"}) is None
+
+    def test_pipeline_quantity_update(self, sql):
+        sql.orders.insert_one({"order_id": "o-1", "products": [
+            {"product_id": "p-1", "product_price": 10, "product_quantity": 1, "total_price": 10},
+            {"product_id": "p-2", "product_price": 5, "product_quantity": 2, "total_price": 10}
+        ], "order_quantity": 3, "order_price": 20, "version": 1})
+
+        order = sql.orders.find_one_and_update({"order_id": "o-1"}, quantity_update("p-2", 4, datetime(2026, 1, 1)),
+                                               projection={"_id": 0}, return_document=ReturnDocument.AFTER)
+
+        assert [p["total_price"] for p in order["products"]] == [10, 20]
+        assert (order["order_quantity"], order["order_price"], order["version"]) == (5, 30, 2)
+
+    def test_rebuild_jobs_match_the_incremental_writes(self, sql):
+        """Test that the summary rebuild and the rollup backfill pipelines give what the order writes keep up to date"""
+        incremental = MemoryDatabase()
+        for i in range(40):
+            lines = [{"product_id": f"p-{j}", "sku": f"SKU-{j}", "product_name": f"Product {j}", "product_quantity": q,
+                      "product_price": 2.5, "total_price": 2.5 * q} for j, q in [(i % 3, 1), ((i * 7) % 5, i % 4 + 1)]]
+            order = {"order_id": f"o-{i}", "user_id": f"u-{i % 3}", "order_status": ["Pending", "Shipped", "Cancelled"][i % 3],
+                     "payment_status": "Pending", "products": lines, "order_quantity": sum(l["product_quantity"] for l in lines),
+                     "order_price": sum(l["total_price"] for l in lines),
+                     "created_at": datetime(2026, 3, 1) + timedelta(hours=5 * i), "version": 1}
+            sql.orders.insert_one(dict(order))
+            apply_rollups(incremental, None, order)
+            sync_summary(incremental, order)
+
+        assert rebuild(sql) == 40
+        assert backfill(sql) == (9, incremental.sales_product_daily.count_documents({}))
+
+        def contents(collection, key):
+            # the backfill also writes the zero totals of days with only cancelled orders
+            return {doc[key]: {k: v for k, v in doc.items() if k != "_id" and v != 0}
+                    for doc in collection.find()}
+        assert contents(sql.order_summaries, "order_id") == contents(incremental.order_summaries, "order_id")
+        assert contents(sql.sales_daily, "_id") == contents(incremental.sales_daily, "_id")
+        day_product = lambda c: {(d["day"], d["product_id"]): {k: v for k, v in d.items() if k != "_id"} for d in c.find()}
+        assert day_product(sql.sales_product_daily) == day_product(incremental.sales_product_daily)
+
+    def test_top_sellers_route(self, sql, sample_admin):
+        sql.sales_product_daily.insert_many([
+            {"day": "2026-03-01", "product_id": "p-1", "sku": "OLD-1", "product_name": "One", "units": 5, "revenue": 50, "orders": 2},
+            {"day": "2026-03-02", "product_id": "p-1", "sku": "SKU-1", "product_name": "One", "units": 1, "revenue": 10, "orders": 1},
+            {"day": "2026-03-02", "product_id": "p-2", "sku": "SKU-2", "product_name": "Two", "units": 4, "revenue": 80, "orders": 4},
+            {"day": "2026-04-01", "product_id": "p-3", "sku": "SKU-3", "product_name": "Three", "units": 99, "revenue": 1, "orders": 1},
+        ])
+
+        for app in backend_app(sql):
+            with app.app_context():
+                admin = {"Authorization": "Bearer " + create_access_token(identity="admin-001", additional_claims={"role": "admin"})}
+            response = app.test_client().get('/analytics/top_sellers?start=2026-03-01&end=2026-03-31&by=revenue&limit=5',
+                                              headers=admin)
+
+        assert response.status_code == 200
+        assert response.get_json()["products"] == [
+            {"product_id": "p-2", "sku": "SKU-2", "product_name": "Two", "units": 4, "revenue": 80, "orders": 4},
+            {"product_id": "p-1", "sku": "SKU-1", "product_name": "One", "units": 6, "revenue": 60, "orders": 3},
+        ]
+        with pytest.raises(OperationFailure):
+            sql.command({"explain": {"find": "products"}})
+
+    def test_hot_filters_run_in_sql(self, sql):
+        """Test that the stock and order status guards are answered by SQL alone"""
+        sql.products.insert_many([{"sku": "A", "quantity_present": 5}, {"sku": "B", "quantity_present": 1}])
+        sql.orders.insert_many([{"order_id": "o-1", "user_name": "u", "order_status": "Pending"},
+                                {"order_id": "o-2", "user_name": "admin", "order_status": "Shipped"}])
+
+        assert sql.products._where({"sku": "A", "quantity_present": {"$gte": 2}})[1]
+        assert sql.orders._where({"order_id": "o-1", "order_status": {"$in": ["Pending", "Confirmed"]}})[1]
+        assert sql.products.update_one({"sku": "B", "quantity_present": {"$gte": 2}},
+                                       {"$inc": {"quantity_present": -2}}).matched_count == 0
+        assert sql.products.update_one({"sku": "A", "quantity_present": {"$gte": 2}},
+                                       {"$inc": {"quantity_present": -2}}).matched_count == 1
+        assert sql.products.find_one({"quantity_present": {"$lt": 4}, "sku": "A"})["quantity_present"] == 3
+        assert [o["order_id"] for o in sql.orders.find({"user_name": {"$ne": "admin"}})] == ["o-1"]
+
+    def test_migration_fills_the_new_columns(self, tmp_path):
+        """Test that upgrading a database of the first revision copies the promoted fields into their columns"""
+        uri = f"sqlite:///{tmp_path / 'old.db'}"
+        upgrade(uri, "0001")
+        engine = create_engine(uri)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO products (_id, sku, document) VALUES ('1', 'A', :doc)"),
+                         {"doc": encode({"_id": 1, "sku": "A", "quantity_present": 3})})
+            conn.execute(text("INSERT INTO orders (_id, order_id, document) VALUES ('1', 'o-1', :doc)"),
+                         {"doc": encode({"_id": 1, "order_id": "o-1", "order_status": "Pending"})})
+        upgrade(uri)
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT quantity_present FROM products")).scalar() == 3
+            assert conn.execute(text("SELECT order_status FROM orders")).scalar() == "Pending"
+        engine.dispose()
+
+    def test_routes_use_only_implemented_operators(self):
+        """Test that every operator the routes and utils send to the store is implemented by db/documents.py"""
+        implemented = set().union(*OPERATORS.values())
+        used = {}
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in glob.glob(f"{root}/routes/*.py") + glob.glob(f"{root}/utils/*.py") + [f"{root}/asgi.py"]:
+            with open(path) as f:
+                # operators are the keys of filters, updates and pipelines
+                for op in re.findall(r'"(\$[a-zA-Z]+)"\s*:', f.read()):
+                    used.setdefault(op, set()).add(os.path.relpath(path, root))
+
+        assert "$inc" in used and "$group" in used
+        assert {op: sorted(paths) for op, paths in used.items() if op not in implemented} == {}
+
+    def test_unsupported_operator_is_an_operation_failure(self, sql, sample_user, caplog):
+        """Test that an operator the SQL backend lacks fails like MongoDB does, inside the callers' error handling"""
+        sql.users.insert_one(dict(sample_user))
+        sql.products.insert_one({"product_id": "prod-001", "sku": "SKU-1", "product_type": "Laptop",
+                                 "product_name": "XPS", "product_desc": "d", "product_price": 100.0,
+                                 "quantity_present": 4, "is_active": True, "version": 1})
+        with pytest.raises(OperationFailure):
+            sql.products.find_one({"$where": "this.product_price > 0"})
+        with pytest.raises(OperationFailure):
+            list(sql.products.aggregate([{"$lookup": {"from": "users"}}]))
+
+        # a read model update using an operator the backend does not implement
+        unsupported = lambda db, order: db.orders.find_one({"order_id": {"$where": "1"}})
+        for app in backend_app(sql):
+            with app.app_context():
+                user = {"Authorization": "Bearer " + create_access_token(identity="user-001", additional_claims={"role": "user"})}
+            with patch("utils.order_hooks.sync_summary", side_effect=unsupported):
+                created = app.test_client().post("/orders/create_order", headers=user, json={
+                    "user_id": "user-001", "payment_method": "UPI", "shipping_address": "1 Street",
+                    "products": [{"sku": "SKU-1", "product_name": "XPS", "product_type": "Laptop", "product_quantity": 1}]})
+
+        # the order is placed, the failed read model update is only logged
+        assert created.status_code == 201
+        assert sql.orders.count_documents({}) == 1
+        assert "Order summary update failed" in caplog.text
+
+    @pytest.mark.parametrize("backend", ["memory", "sql"])
+    def test_routes_behave_the_same(self, backend, sql, sample_user, sample_admin):
+        """Test an order's lifecycle through the routes on the in-process store and on SQL"""
+        database = sql
+        if backend == "memory":
+            database = MemoryDatabase()
+            ensure_indexes(database)
+        database.users.insert_many([dict(sample_user), dict(sample_admin)])
+        database.products.insert_one({"product_id": "prod-001", "sku": "SKU-1", "product_type": "Laptop",
+                                      "product_name": "XPS", "product_desc": "d", "product_price": 100.0,
+                                      "quantity_present": 4, "is_active": True, "version": 1})
+
+        for app in backend_app(database):
+            client = app.test_client()
+            with app.app_context():
+                user = {"Authorization": "Bearer " + create_access_token(identity="user-001", additional_claims={"role": "user"})}
+                admin = {"Authorization": "Bearer " + create_access_token(identity="admin-001", additional_claims={"role": "admin"})}
+
+            line = {"sku": "SKU-1", "product_name": "XPS", "product_type": "Laptop", "product_quantity": 3}
+            order = {"user_id": "user-001", "payment_method": "UPI", "shipping_address": "1 Street", "products": [line]}
+            created = client.post("/orders/create_order", headers=user, json=order)
+            assert created.status_code == 201
+            order_id = created.get_json()["order_details"]["order_id"]
+            assert client.post("/orders/create_order", headers=user, json=order).status_code == 400
+
+            increased = client.patch(f"/orders/update_quantity/{order_id}/prod-001", headers=user,
+                                     json={"product_quantity": 4})
+            assert (increased.status_code, increased.get_json()["order_price"]) == (200, 400.0)
+            too_many = client.patch(f"/orders/update_quantity/{order_id}/prod-001", headers=user,
+                                    json={"product_quantity": 9})
+            assert too_many.status_code == 400
+            assert client.get("/product/get_product/prod-001", headers=admin).get_json()["quantity_present"] == 0
+
+            assert client.patch(f"/orders/cancel_order/{order_id}", headers=user, json={"reason": "x"}).status_code == 200
+            assert client.get("/product/get_product/prod-001", headers=admin).get_json()["quantity_present"] == 4
+            summaries = client.get("/orders/user_order_summaries", headers=user).get_json()
+            assert [(s["order_id"], s["order_status"], s["order_quantity"]) for s in summaries] == \
+                [(order_id, "Cancelled", 4)]
@@ -0,0 +1,100 @@
+import pytest
+from utils.stock import bulk_adjust_stock
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+            if "$ne" in condition and condition["$ne"] in (value or []):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeProducts:
+    """Just enough of a products collection to apply the adjustment updates"""
+
+    def __init__(self, stock, before_write=None):
+        self.docs = {sku: {"sku": sku, "quantity_present": n} for sku, n in stock.items()}
+        self.before_write = before_write
+        self.bulk_writes = 0
+
+    def bulk_write(self, ops, ordered=True):
+        self.bulk_writes += 1
+        if self.before_write:
+            self.before_write(self)
+        for op in ops:
+            doc = self.docs.get(op._filter["sku"])
+            if doc and _matches(doc, op._filter):
+                doc["quantity_present"] += op._doc["$inc"]["quantity_present"]
+                doc.setdefault("adjustments", []).append(op._doc["$addToSet"]["adjustments"])
+
+    def find(self, query, projection):
+        return [dict(self.docs[sku]) for sku in query["sku"]["$in"] if sku in self.docs]
+
+    def update_many(self, query, update):
+        for sku in query["sku"]["$in"]:
+            self.docs[sku]["adjustments"].remove(update["$pull"]["adjustments"])
+
+
+class TestStockAdjust:
+    """Test suite for bulk stock adjustments"""
+
+    def test_deltas_are_relative(self):
+        """Test that deltas add to the stock and repeated skus are summed"""
+        products = FakeProducts({"A": 10, "B": 0})
+
+        result = bulk_adjust_stock(products, [
+            {"sku": "A", "delta": 5}, {"sku": "B", "delta": 3}, {"sku": "A", "delta": -2}
+        ])
+
+        assert result["results"] == [{"sku": "A", "quantity_present": 13}, {"sku": "B", "quantity_present": 3}]
+        assert products.bulk_writes == 1
+        assert "adjustments" not in products.docs["A"] or products.docs["A"]["adjustments"] == []
+
+    def test_delta_never_goes_below_zero(self):
+        products = FakeProducts({"A": 2})
+
+        result = bulk_adjust_stock(products, [{"sku": "A", "delta": -3}, {"sku": "X", "delta": 1}])
+
+        assert result["applied"] == 0
+        assert result["errors"] == [{"sku": "A", "error": "Insufficient stock"},
+                                    {"sku": "X", "error": "Product not found"}]
+        assert products.docs["A"]["quantity_present"] == 2
+
+    def test_count_keeps_concurrent_orders(self):
+        """Test that a count retries when the stock moves between read and write"""
+        moved = []
+
+        def order_placed(products):
+            # an order takes one unit between the read and the first write
+            if not moved:
+                products.docs["A"]["quantity_present"] -= 1
+                moved.append(True)
+
+        products = FakeProducts({"A": 10}, before_write=order_placed)
+
+        result = bulk_adjust_stock(products, [{"sku": "A", "set": 7}])
+
+        assert result["results"] == [{"sku": "A", "quantity_present": 7}]
+        assert products.bulk_writes == 2
+
+    def test_counted_sku_listed_twice(self):
+        products = FakeProducts({"A": 10})
+
+        result = bulk_adjust_stock(products, [{"sku": "A", "set": 7}, {"sku": "A", "delta": 1}])
+
+        assert result["errors"] == [{"sku": "A", "error": "A counted sku can only be listed once"}]
+        assert products.docs["A"]["quantity_present"] == 10
+
+    def test_chunks(self):
+        products = FakeProducts({f"S{i}": 0 for i in range(5)})
+
+        result = bulk_adjust_stock(products, [{"sku": f"S{i}", "delta": 1} for i in range(5)], chunk_size=2)
+
+        assert result["applied"] == 5
+        assert products.bulk_writes == 3
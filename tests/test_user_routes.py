@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import MagicMock
 import bcrypt
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 
 class TestUserRoutes:
@@ -73,6 +74,24 @@ class TestUserRoutes:
         assert response.status_code == 400
     
     
+    def test_create_user_duplicate_username_race(self, client, mock_db):
+        """Test that a sign-up losing the race to the unique user_name index gets the duplicate answer"""
+        mock_db.users.reset_mock()
+        mock_db.users.find_one.return_value = None
+        mock_db.users.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error")
+
+        response = client.post(
+            '/user/create_user',
+            json={
+                "user_name": "existinguser",
+                "user_password": "Test@123"
+            }
+        )
+
+        assert response.status_code == 400
+        assert response.json["message"] == "Username already present.Please select other"
+    
+    
     def test_login_success(self, client, sample_user, mock_db):
         """Test successful login"""
         mock_db.users.reset_mock()
@@ -91,6 +110,68 @@ class TestUserRoutes:
         assert data['user'] == "testuser"
     
     
+    def test_login_rehashes_outdated_cost(self, client, mock_db, monkeypatch):
+        """Test that a hash made with a lower cost is upgraded on login"""
+        from utils.passwords import password_hasher
+        monkeypatch.setattr(password_hasher, "rounds", 5)
+        mock_db.users.reset_mock()
+        old_hash = bcrypt.hashpw("Test@123".encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8")
+        mock_db.users.find_one.return_value = {
+            "_id": ObjectId(), "user_id": "user-001", "user_name": "testuser",
+            "user_password": old_hash, "user_role": "user"
+        }
+        
+        response = client.post(
+            '/user/generate_token/testuser',
+            json={"user_password": "Test@123"}
+        )
+        
+        assert response.status_code == 200
+        query, update = mock_db.users.update_one.call_args[0]
+        assert query == {"user_id": "user-001", "user_password": old_hash}
+        new_hash = update["$set"]["user_password"]
+        assert new_hash.startswith("$2b$05$")
+        assert bcrypt.checkpw(b"Test@123", new_hash.encode("utf-8"))
+    
+    
+    def test_login_current_cost_not_rehashed(self, client, mock_db, monkeypatch):
+        """Test that an up to date hash is left alone"""
+        from utils.passwords import password_hasher
+        monkeypatch.setattr(password_hasher, "rounds", 4)
+        mock_db.users.reset_mock()
+        current_hash = bcrypt.hashpw("Test@123".encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8")
+        mock_db.users.find_one.return_value = {
+            "_id": ObjectId(), "user_id": "user-001", "user_name": "testuser",
+            "user_password": current_hash, "user_role": "user"
+        }
+        
+        response = client.post(
+            '/user/generate_token/testuser',
+            json={"user_password": "Test@123"}
+        )
+        
+        assert response.status_code == 200
+        mock_db.users.update_one.assert_not_called()
+    
+    
+    def test_login_hash_queue_full(self, client, sample_user, mock_db, monkeypatch):
+        """Test that logins are shed with a 503 when the hashing queue is full"""
+        from utils.passwords import password_hasher, PasswordQueueFull
+        def full(*args):
+            raise PasswordQueueFull()
+        monkeypatch.setattr(password_hasher, "_run", full)
+        mock_db.users.reset_mock()
+        mock_db.users.find_one.return_value = sample_user
+        
+        response = client.post(
+            '/user/generate_token/testuser',
+            json={"user_password": "Test@123"}
+        )
+        
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == "1"
+    
+    
     def test_login_invalid_credentials(self, client, sample_user, mock_db):
         """Test login with invalid password"""
         mock_db.users.reset_mock()
@@ -143,6 +224,22 @@ class TestUserRoutes:
         assert len(data) == 2
     
     
+    def test_export_users_without_passwords(self, client, admin_token, mock_db):
+        """Test that the user export never selects password hashes"""
+        mock_db.users.reset_mock()
+        mock_db.users.find.return_value.__iter__.return_value = iter([{"user_id": "user-001", "user_name": "user1", "user_role": "user"}])
+        
+        response = client.get(
+            '/user/export?format=csv',
+            headers={'Authorization': f'Bearer {admin_token}'}
+        )
+        
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).splitlines() == ["user_id,user_name,user_role", "user-001,user1,user"]
+        projection = mock_db.users.find.call_args[0][1]
+        assert "user_password" not in projection
+    
+    
     def test_get_users_unauthorized(self, client, user_token):
         """Test getting all users as regular user"""
         response = client.get(
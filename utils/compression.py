@@ -0,0 +1,173 @@
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+'''
+Negotiated response compression.
+
+Responses of a compressible type are encoded with the best coding the client
+accepts: zstd and br when their packages (``zstandard``, ``brotli``) are
+installed, gzip always. Bodies under COMPRESS_MIN_SIZE are sent as is.
+Streamed responses (the exports) are compressed chunk by chunk as they are
+produced, so they stay incremental and memory stays flat.
+
+A compressed body is a different representation, so its ETag gets the
+coding appended (``"3-gzip"``); utils.etags strips it again when the tag
+comes back in If-None-Match or If-Match.
+'''
+
+# every coding this module can produce, in order of preference
+CODINGS = ("zstd", "br", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv",
+                      "text/plain", "text/html", "text/css", "application/javascript")
+
+
+def strip_coding(etag):
+    """The ETag of the identity representation of a (possibly compressed) ETag"""
+    for coding in CODINGS:
+        if etag.endswith(f"-{coding}"):
+            return etag[:-len(coding) - 1]
+    return etag
+
+
+class _Gzip:
+
+    def __init__(self, level):
+        # wbits 31: zlib stream with a gzip header and trailer
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush()
+
+
+class _Brotli:
+
+    def __init__(self, level):
+        self._b = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._b.process(data)
+
+    def flush(self):
+        return self._b.finish()
+
+
+class _Zstd:
+
+    def __init__(self, level):
+        self._z = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush()
+
+
+class ResponseCompressor:
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.levels = {"gzip": 6, "br": 4, "zstd": 3}
+        self.mimetypes = set(COMPRESSIBLE_TYPES)
+        self.available = self._installed()
+
+    def init_app(self, app):
+        """Read the compression settings from the app config and compress every response"""
+        self.enabled = app.config.get("COMPRESS_ENABLED", True)
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 1024)
+        self.levels = {
+            "gzip": app.config.get("COMPRESS_LEVEL", 6),
+            "br": app.config.get("COMPRESS_BROTLI_LEVEL", 4),
+            "zstd": app.config.get("COMPRESS_ZSTD_LEVEL", 3)
+        }
+        self.mimetypes = set(app.config.get("COMPRESS_MIMETYPES", COMPRESSIBLE_TYPES))
+        self.available = [c for c in self._installed() if c in app.config.get("COMPRESS_CODINGS", CODINGS)]
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def _installed():
+        return [c for c in CODINGS if (c != "br" or brotli) and (c != "zstd" or zstandard)]
+
+    def negotiate(self, accept_encoding):
+        """Best available coding for a parsed Accept-Encoding header, None for identity"""
+        if not self.enabled:
+            return None
+        return accept_encoding.best_match(self.available)
+
+    def compressor(self, coding):
+        encoder = {"gzip": _Gzip, "br": _Brotli, "zstd": _Zstd}[coding]
+        return encoder(self.levels[coding])
+
+    def compress(self, coding, data):
+        encoder = self.compressor(coding)
+        return encoder.compress(data) + encoder.flush()
+
+    def encode_body(self, accept_encoding_header, body):
+        """(body, coding) for a whole body sent outside Flask, coding None when left as is"""
+        coding = self.negotiate(parse_accept_header(accept_encoding_header))
+        if coding is None or len(body) < self.min_size:
+            return body, None
+        compressed = self.compress(coding, body)
+        if len(compressed) >= len(body):
+            return body, None
+        return compressed, coding
+
+    def _stream(self, chunks, coding):
+        encoder = self.compressor(coding)
+        for chunk in chunks:
+            data = encoder.compress(chunk)
+            # the encoder buffers small chunks, only send when it has a block ready
+            if data:
+                yield data
+        yield encoder.flush()
+
+    def after_request(self, response):
+        if (not self.enabled or response.mimetype not in self.mimetypes
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or "Content-Encoding" in response.headers
+                or "no-transform" in response.headers.get("Cache-Control", "")):
+            return response
+        response.vary.add("Accept-Encoding")
+
+        coding = self.negotiate(request.accept_encodings)
+        if coding is None or request.method == "HEAD":
+            return response
+
+        if response.is_streamed:
+            if response.content_length is not None and response.content_length < self.min_size:
+                return response
+            response.response = self._stream(response.iter_encoded(), coding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            compressed = self.compress(coding, data)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers["Content-Encoding"] = coding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{coding}", weak)
+        return response
+
+
+compressor = ResponseCompressor()
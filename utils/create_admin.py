@@ -1,5 +1,5 @@
-import bcrypt
 from db.mongo_db import db
+from utils.passwords import password_hasher
 import os
 from dotenv import load_dotenv,find_dotenv
 from pymongo import MongoClient
@@ -29,14 +29,11 @@ def admin_creation(db):
         print(f"Admin user '{admin_name}' already exists")
         return existing_admin
     
-    hashed_password = bcrypt.hashpw(
-        admin_password.encode("utf-8"), 
-        bcrypt.gensalt()
-    )
+    hashed_password = password_hasher.hash(admin_password)
     db.users.insert_one({
         "user_id": admin_id,
         "user_name": admin_name,
-        "user_password": hashed_password.decode("utf-8"),
+        "user_password": hashed_password,
         "user_role": "admin"
     })
     print("Admin created successfully")
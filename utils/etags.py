@@ -0,0 +1,67 @@
+import hashlib
+import json
+from flask import Response, request
+from flask_smorest import abort
+from werkzeug.http import quote_etag
+from utils.compression import strip_coding
+
+'''
+Conditional requests.
+
+Every product and order carries a ``version`` counter that each write
+increments in the same update. A document's strong ETag is its version; a
+listing's ETag is a hash of the (key, version) pairs of the page plus the
+query that produced it. A matching If-None-Match is answered with a 304
+before anything is serialized, and If-Match turns a write into a
+compare-and-set on the version. ETags of compressed responses carry the
+coding (utils.compression), which is ignored when they come back.
+'''
+
+
+def document_etag(doc):
+    return str(doc.get("version", 0))
+
+
+def listing_etag(docs, key, *query):
+    """ETag of a page of documents: changes when any of them changes or the page itself does"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(query, sort_keys=True, default=str).encode("utf-8"))
+    for doc in docs:
+        digest.update(f"\0{doc.get(key)}\0{doc.get('version', 0)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def etag_header(etag):
+    return {"ETag": quote_etag(etag)}
+
+
+def etag_seen(if_none_match, etag):
+    """Whether the parsed If-None-Match (werkzeug ETags) names ``etag``, in any coding"""
+    seen = {strip_coding(tag) for tag in if_none_match.as_set(include_weak=True)}
+    return if_none_match.star_tag or etag in seen
+
+
+def not_modified(etag):
+    """A 304 response when the client already has ``etag``, else None"""
+    if etag_seen(request.if_none_match, etag):
+        return Response(status=304, headers=etag_header(etag))
+    return None
+
+
+def if_match_filter():
+    """Extra update filter for the request's If-Match header.
+
+    {} without the header (or with ``*``), {"version": n} for ``"n"``. An
+    ETag that cannot be one of our versions can never match: 412.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return {}
+    versions = []
+    for etag in request.if_match.as_set():
+        try:
+            versions.append(int(strip_coding(etag)))
+        except ValueError:
+            continue
+    if not versions:
+        abort(412, message="If-Match does not match the current version")
+    return {"version": versions[0]} if len(versions) == 1 else {"version": {"$in": versions}}
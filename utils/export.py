@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+from datetime import datetime
+from bson import ObjectId
+from flask import Response, stream_with_context, current_app
+
+'''
+Streaming exports.
+
+Documents are pulled from a batched cursor and written out one line at a
+time, so memory stays flat no matter how many documents are exported.
+'''
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def ndjson_lines(docs):
+    """Yield one JSON document per line"""
+    for doc in docs:
+        yield json.dumps(doc, default=_json_default) + "\n"
+
+
+def csv_lines(docs, fields):
+    """Yield a header row followed by one row per document.
+
+    Nested values (e.g. the products of an order) are written as JSON.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    for doc in docs:
+        buffer.seek(0)
+        buffer.truncate()
+        row = {}
+        for field in fields:
+            value = doc.get(field)
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=_json_default)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row[field] = value
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def export_response(collection, query, fields, fmt, name):
+    """Stream the documents matching ``query`` as NDJSON or CSV"""
+    batch_size = current_app.config.get("EXPORT_BATCH_SIZE", 1000)
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    cursor = collection.find(query, projection, batch_size=batch_size)
+
+    if fmt == "csv":
+        lines = csv_lines(cursor, fields)
+    else:
+        lines = ndjson_lines(cursor)
+
+    def stream():
+        # close the server-side cursor even if the client goes away mid-export
+        try:
+            yield from lines
+        finally:
+            cursor.close()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype=CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"}
+    )
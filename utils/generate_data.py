@@ -0,0 +1,347 @@
+import argparse
+import base64
+import bisect
+import itertools
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import bcrypt
+from bson import json_util
+from schema.order_schema import VALID_TRANSITIONS
+from schema.product_schema import Product_Schema
+
+'''
+Synthetic users, products and orders for capacity tests.
+
+Every document is a pure function of (seed, index): the output does not
+depend on the number of processes, and two runs with the same --seed and
+--end are identical. Work is split in chunks of --batch documents spread
+over --processes worker processes; each chunk is written with one
+``insert_many`` (``--target mongo``, the MONGO_URI/MONGO_DB_NAME database)
+or to its own ``<kind>-<chunk>.ndjson`` file in Extended JSON
+(``--target ndjson``, loadable with mongoimport).
+
+- Users get real bcrypt hashes (cost --bcrypt-rounds). Hashing millions of
+  passwords at a real cost would take days, so --passwords distinct
+  passwords are hashed in parallel (deterministic salts) and shared round
+  robin: user N logs in with ``Load@<N % passwords>x``.
+- Products are spread over the product types the API accepts, with
+  realistic names and prices; their popularity follows a Zipf law, so a few
+  products make most of the order lines.
+- Orders go through the VALID_TRANSITIONS lifecycle from Pending, with
+  delays per step; recent orders are still in flight. Placement times lean
+  towards evenings, weekends and recent weeks. Payment status follows the
+  order status.
+
+    python -m utils.generate_data --users 100000 --products 50000 --orders 2000000
+    python -m utils.generate_data --orders 1000000 --target ndjson --out /tmp/dataset
+
+With --target mongo the declared indexes are created after the load and
+the order summaries and sales rollups are rebuilt (--skip-read-models to
+skip). Product stock is not decremented by the generated orders.
+'''
+
+PRODUCT_TYPES = Product_Schema._declared_fields["product_type"].validate.choices
+BRANDS = {
+    "Laptop": (["Dell XPS", "Lenovo ThinkPad", "HP Spectre", "Apple MacBook", "Asus ZenBook", "Acer Swift"], 400, 3500),
+    "Smartphone": (["Samsung Galaxy", "Apple iPhone", "Google Pixel", "OnePlus", "Xiaomi Redmi"], 150, 1600),
+    "TV": (["LG OLED", "Sony Bravia", "Samsung QLED", "TCL", "Philips Ambilight"], 250, 4000),
+    "Refrigerator": (["Whirlpool", "LG InstaView", "Samsung Bespoke", "Bosch", "Haier"], 300, 3000),
+    "WashingMachine": (["Bosch Serie", "LG TurboWash", "Samsung EcoBubble", "Whirlpool", "IFB"], 250, 1500),
+}
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "UPI", "NetBanking", "CashOnDelivery"]
+# relative chance of each transition when an order moves on (others: 1)
+TRANSITION_WEIGHTS = {("Pending", "Confirmed"): 92, ("Pending", "Cancelled"): 8,
+                      ("Confirmed", "Shipped"): 96, ("Confirmed", "Cancelled"): 4}
+# (min, max) hours before an order moves on from a status
+STEP_HOURS = {"Pending": (0.05, 12), "Confirmed": (6, 72), "Shipped": (24, 168)}
+# orders per hour of the day and units per order line, relative (cumulated once for random.choices)
+HOUR_WEIGHTS = list(itertools.accumulate([2, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 9, 10, 9, 8, 8, 9, 11, 13, 15, 16, 14, 9, 5]))
+QUANTITY_WEIGHTS = list(itertools.accumulate([70, 20, 7, 3]))
+CANCEL_REASONS = ["Changed my mind", "Found a better price", "Ordered by mistake", "Delivery too slow"]
+DEFAULT_END = date(2026, 1, 1)
+PASSWORD_FORMAT = "Load@{}x"
+BCRYPT_ALPHABET = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+                                  b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789")
+
+
+def _rng(seed, kind, index):
+    return random.Random(f"{seed}:{kind}:{index}")
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def password(index, distinct):
+    """Plain password of user ``index`` (it satisfies the sign-up rules)"""
+    return PASSWORD_FORMAT.format(index % distinct)
+
+
+def hash_password(seed, index, rounds):
+    """bcrypt hash of password ``index`` with a salt drawn from the seed"""
+    raw = _rng(seed, "salt", index).randbytes(16)
+    salt = base64.b64encode(raw).translate(BCRYPT_ALPHABET)[:22]
+    return bcrypt.hashpw(PASSWORD_FORMAT.format(index).encode("utf-8"), f"$2b${rounds:02d}$".encode() + salt).decode("utf-8")
+
+
+'''
+Documents
+'''
+
+
+def user(seed, index, hashes):
+    rng = _rng(seed, "user", index)
+    return {
+        "user_id": _uuid(rng),
+        "user_name": f"loaduser{index:08d}",
+        "user_password": hashes[index % len(hashes)],
+        "user_role": "user"
+    }
+
+
+def product(seed, index, end):
+    rng = _rng(seed, "product", index)
+    product_type = rng.choice(PRODUCT_TYPES)
+    brands, low, high = BRANDS.get(product_type, ([product_type], 50, 2000))
+    name = f"{rng.choice(brands)} {rng.choice(['', 'Pro ', 'Max ', 'Lite ', 'Plus '])}{rng.randint(2, 99)}"
+    created = datetime.combine(end, datetime.min.time()) - timedelta(days=rng.uniform(30, 1000))
+    # prices cluster at the low end of each category
+    price = round(low + (high - low) * rng.random() ** 2, 0) - 0.01
+    return {
+        "product_id": _uuid(rng),
+        "product_type": product_type,
+        "product_name": name,
+        "product_desc": f"{name} {product_type.lower()} with {rng.choice(['1', '2', '3'])} year warranty",
+        "product_price": price,
+        "quantity_present": rng.randint(0, 2000) if rng.random() > 0.03 else 0,
+        "is_active": rng.random() > 0.05,
+        "sku": f"{product_type[:3].upper()}-{index:08d}",
+        "timestamp": created,
+        "updated_timestamp": created + timedelta(days=rng.uniform(0, 30)),
+        "version": 1
+    }
+
+
+class Popularity:
+    """Zipf(s) sampling of product indexes: product 0 is the most popular"""
+
+    def __init__(self, count, s=1.1):
+        self.cumulative = list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(count)))
+
+    def sample(self, rng):
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def _placed_at(rng, end, days):
+    # more orders in recent weeks (the shop grows) and in the evening, a few more at weekends
+    while True:
+        day = end - timedelta(days=int(days * (1 - rng.random() ** 0.7)))
+        if day.weekday() >= 5 or rng.random() < 0.85:
+            break
+    hour = rng.choices(range(24), cum_weights=HOUR_WEIGHTS)[0]
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, seconds=rng.randint(0, 3599))
+
+
+def lifecycle(rng, placed, now):
+    """(status, [(status, at), ...]) of an order placed at ``placed``, as it stands at ``now``"""
+    status, at, history = "Pending", placed, []
+    while VALID_TRANSITIONS.get(status):
+        low, high = STEP_HOURS[status]
+        at = at + timedelta(hours=rng.uniform(low, high))
+        if at > now:
+            break
+        targets = VALID_TRANSITIONS[status]
+        status = rng.choices(targets, [TRANSITION_WEIGHTS.get((status, t), 1) for t in targets])[0]
+        history.append((status, at))
+    return status, history
+
+
+def payment_status(status, method, history):
+    statuses = {s for s, _ in history}
+    paid = "Confirmed" in statuses and (method != "CashOnDelivery" or status == "Delivered")
+    if status == "Cancelled":
+        return "Refunded" if paid else "Pending"
+    return "Paid" if paid else "Pending"
+
+
+def order(seed, index, context):
+    rng = _rng(seed, "order", index)
+    now = datetime.combine(context["end"], datetime.min.time())
+    # a few users place most orders
+    buyer = cached_user(seed, min(context["users"] - 1, int(context["users"] * rng.random() ** 2.5)))
+
+    lines = {}
+    for _ in range(min(1 + int(rng.expovariate(1.2)), 6)):
+        item = cached_product(seed, context["popularity"].sample(rng), context["end"])
+        line = lines.setdefault(item["sku"], {
+            "product_id": item["product_id"], "sku": item["sku"], "product_name": item["product_name"],
+            "product_type": item["product_type"], "product_price": item["product_price"], "product_quantity": 0
+        })
+        line["product_quantity"] += rng.choices([1, 2, 3, 4], cum_weights=QUANTITY_WEIGHTS)[0]
+    products = list(lines.values())
+    for line in products:
+        line["total_price"] = round(line["product_price"] * line["product_quantity"], 2)
+
+    placed = _placed_at(rng, context["end"], context["days"])
+    status, history = lifecycle(rng, placed, now)
+    method = rng.choice(PAYMENT_METHODS)
+    doc = {
+        "order_id": _uuid(rng),
+        "user_name": buyer["user_name"],
+        "user_id": buyer["user_id"],
+        "products": products,
+        "order_quantity": sum(line["product_quantity"] for line in products),
+        "order_price": round(sum(line["total_price"] for line in products), 2),
+        "order_status": status,
+        "payment_status": payment_status(status, method, history),
+        "payment_method": method,
+        "shipping_address": f"{rng.randint(1, 999)} {rng.choice(['Main', 'Park', 'Lake', 'Hill', 'Station'])} Road",
+        "created_at": placed,
+        "version": 1 + len(history)
+    }
+    if history:
+        doc["updated_timestamp"] = history[-1][1]
+    if status == "Cancelled":
+        doc["reason"] = rng.choice(CANCEL_REASONS)
+    return doc
+
+
+@lru_cache(maxsize=65536)
+def cached_product(seed, index, end):
+    return product(seed, index, end)
+
+
+@lru_cache(maxsize=65536)
+def cached_user(seed, index):
+    # only the id and name are used by the orders
+    return user(seed, index, [None])
+
+
+'''
+Chunks (run in the worker processes)
+'''
+
+_context = {}
+
+
+def _init_worker(context):
+    _context.update(context)
+    if context["products"]:
+        _context["popularity"] = Popularity(context["products"])
+
+
+def _documents(kind, start, stop):
+    seed = _context["seed"]
+    if kind == "users":
+        return [user(seed, i, _context["hashes"]) for i in range(start, stop)]
+    if kind == "products":
+        return [product(seed, i, _context["end"]) for i in range(start, stop)]
+    return [order(seed, i, _context) for i in range(start, stop)]
+
+
+def write_chunk(kind, chunk, start, stop):
+    """Generate documents [start, stop) of ``kind`` and write them, returns the count"""
+    docs = _documents(kind, start, stop)
+    if _context["target"] == "ndjson":
+        path = os.path.join(_context["out"], f"{kind}-{chunk:05d}.ndjson")
+        with open(path, "w") as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS))
+                f.write("\n")
+    else:
+        from db.mongo_db import db
+        db[kind].insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def chunks(kind, count, batch):
+    for chunk, start in enumerate(range(0, count, batch)):
+        yield kind, chunk, start, min(start + batch, count)
+
+
+def generate(counts, seed=42, end=DEFAULT_END, days=365, target="mongo", out=None, batch=10000,
+             processes=None, passwords=256, bcrypt_rounds=12):
+    """Write ``counts`` ({"users": n, "products": n, "orders": n}) documents, returns the counts written"""
+    if counts["orders"] and not (counts["users"] and counts["products"]):
+        raise ValueError("orders need at least one user and one product")
+    if target == "ndjson":
+        os.makedirs(out, exist_ok=True)
+    processes = processes or os.cpu_count()
+    written = {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        started = time.perf_counter()
+        hashes = list(pool.map(hash_password, itertools.repeat(seed), range(passwords), itertools.repeat(bcrypt_rounds)))
+        logging.info(f"{passwords} bcrypt hashes (cost {bcrypt_rounds}) in {time.perf_counter() - started:.1f}s")
+
+    context = {"seed": seed, "end": end, "days": days, "target": target, "out": out, "hashes": hashes,
+               "users": counts["users"], "products": counts["products"]}
+    # a fresh pool so every worker starts with the hashes and the popularity table
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(context,)) as pool:
+        for kind in ("users", "products", "orders"):
+            started = time.perf_counter()
+            tasks = list(chunks(kind, counts[kind], batch))
+            written[kind] = sum(pool.map(write_chunk, *zip(*tasks))) if tasks else 0
+            elapsed = time.perf_counter() - started
+            logging.info(f"{written[kind]} {kind} in {elapsed:.1f}s ({written[kind] / max(elapsed, 1e-9):.0f}/s)")
+    return written
+
+
+def finish_mongo(db, rebuild_read_models=True):
+    """Create the declared indexes and rebuild the read models of the generated orders"""
+    from db.indexes import ensure_indexes
+    from utils.order_summaries import rebuild
+    from utils.sales_rollups import backfill
+    ensure_indexes(db)
+    if rebuild_read_models:
+        logging.info(f"{rebuild(db)} order summaries")
+        days, product_days = backfill(db)
+        logging.info(f"{days} daily and {product_days} product/day sales rollups")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate users, products and orders for capacity tests")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", type=date.fromisoformat, default=DEFAULT_END, help="orders are placed before this day")
+    parser.add_argument("--days", type=int, default=365, help="days of order history")
+    parser.add_argument("--target", choices=["mongo", "ndjson"], default="mongo")
+    parser.add_argument("--out", help="directory of the NDJSON files (--target ndjson)")
+    parser.add_argument("--batch", type=int, default=10000, help="documents per insert_many/file")
+    parser.add_argument("--processes", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--passwords", type=int, default=256, help="distinct passwords to hash")
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", 12)))
+    parser.add_argument("--drop", action="store_true", help="drop users, products and orders first (mongo)")
+    parser.add_argument("--skip-read-models", action="store_true", help="do not rebuild summaries and rollups")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.target == "ndjson" and not args.out:
+        parser.error("--out is required with --target ndjson")
+
+    if args.target == "mongo":
+        from db.mongo_db import db, db_instance
+        if args.drop:
+            for name in ("users", "products", "orders", "order_summaries", "sales_daily", "sales_product_daily"):
+                db.drop_collection(name)
+        # the workers open their own clients
+        db_instance.close()
+
+    started = time.perf_counter()
+    counts = {"users": args.users, "products": args.products, "orders": args.orders}
+    generate(counts, args.seed, args.end, args.days, args.target, args.out, args.batch, args.processes,
+             args.passwords, args.bcrypt_rounds)
+    if args.target == "mongo":
+        finish_mongo(db, not args.skip_read_models)
+    logging.info(f"done in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
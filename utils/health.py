@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+import time
+from db import mongo_db
+from db.pool_stats import pool_stats
+
+'''
+Liveness and readiness from a cached status.
+
+A daemon thread per worker process pings MongoDB every
+HEALTH_PROBE_INTERVAL seconds and records the latency, the connection pool
+usage and the last error. The probe endpoints only read that status, so a
+load balancer can probe as often as it likes without adding queries or
+waiting on Mongo.
+
+Readiness is lost when the last ping failed or took longer than
+HEALTH_MAX_PING_MS, when HEALTH_POOL_SATURATION of the pool is checked out,
+or when the status has not been refreshed for three intervals.
+'''
+
+
+class HealthMonitor:
+
+    def __init__(self):
+        self.interval = 5.0
+        self.max_ping_ms = 500
+        self.pool_saturation = 0.9
+        self.environment = None
+        self._status = None
+        self._last_error = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, environment=None):
+        """Read the probe settings from the app config"""
+        self.interval = app.config.get("HEALTH_PROBE_INTERVAL", 5.0)
+        self.max_ping_ms = app.config.get("HEALTH_MAX_PING_MS", 500)
+        self.pool_saturation = app.config.get("HEALTH_POOL_SATURATION", 0.9)
+        self.environment = environment
+
+    def start(self):
+        """Start this process's prober (a forked worker does not inherit the parent's thread)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._status = None
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe()
+            except Exception:
+                # the prober must outlive anything a probe can raise
+                logging.exception("Health probe failed")
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Ping MongoDB once and record the result"""
+        started = time.perf_counter()
+        error = None
+        try:
+            mongo_db.db.command('ping')
+        except Exception as e:
+            error = {"type": type(e).__name__, "message": str(e), "at": time.time()}
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        pool = pool_stats.snapshot()
+        max_pool = mongo_db.db_instance.pool_settings.get("maxPoolSize") or 100
+        pool["max_size"] = max_pool
+        pool["utilization"] = round(pool["checked_out"] / max_pool, 3)
+
+        if error:
+            self._last_error = error
+        self._status = {
+            "checked_at": time.time(),
+            "database": "unreachable" if error else "connected",
+            "ping_ms": None if error else round(latency_ms, 2),
+            "pool": pool,
+            "last_error": self._last_error
+        }
+        return self._status
+
+    def problems(self, status):
+        """Why ``status`` is not ready ([] when it is)"""
+        if status is None:
+            return ["no probe has completed yet"]
+        found = []
+        if time.time() - status["checked_at"] > 3 * self.interval:
+            found.append("status is stale")
+        if status["database"] != "connected":
+            found.append("database unreachable")
+        elif status["ping_ms"] > self.max_ping_ms:
+            found.append(f"database degraded: ping {status['ping_ms']}ms")
+        if status["pool"]["utilization"] >= self.pool_saturation:
+            found.append("connection pool saturated")
+        return found
+
+    def liveness(self):
+        """The process answers requests; Mongo does not matter here"""
+        self.start()
+        return {"status": "alive", "pid": os.getpid()}, 200
+
+    def readiness(self):
+        self.start()
+        status = self._status
+        problems = self.problems(status)
+        body = {
+            "status": "ready" if not problems else "unavailable",
+            "environment": self.environment,
+            "problems": problems,
+            **(status or {})
+        }
+        return body, 200 if not problems else 503
+
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,433 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from flask import g, request
+from pymongo import monitoring
+
+'''
+Prometheus metrics without a client library.
+
+Each worker process keeps its counters, gauges and histograms in memory:
+
+- HTTP requests per blueprint and route: latency histogram, count per
+  status code, requests in flight.
+- MongoDB commands per command and collection (pymongo command
+  monitoring): duration histogram and failures.
+- Connection pool checkouts: wait time histogram and failures.
+- Rate limiter rejections per endpoint.
+
+With METRICS_DIR set, every worker writes its values to
+``<METRICS_DIR>/worker-<pid>-<random id>.json`` every METRICS_FLUSH_INTERVAL
+seconds and a scrape of /metrics (admins, or the METRICS_TOKEN bearer
+token) adds up the files of all workers. A worker has exited when its pid
+is gone or a later worker got the same pid; the scrape folds its counters
+and histograms into ``archive.json`` and removes its file, so totals never
+go back and the directory does not grow. Gauges of exited workers are
+dropped.
+'''
+
+ARCHIVE = "archive.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+HELP = {
+    "http_requests_total": ("counter", "HTTP requests by route and status code"),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency until the response is returned"),
+    "http_requests_in_flight": ("gauge", "HTTP requests being handled"),
+    "mongo_command_duration_seconds": ("histogram", "MongoDB command duration by command and collection"),
+    "mongo_command_failures_total": ("counter", "Failed MongoDB commands by command and collection"),
+    "mongo_pool_checkout_wait_seconds": ("histogram", "Time spent waiting for a pooled connection"),
+    "mongo_pool_checkout_failures_total": ("counter", "Connection checkouts that failed, by reason"),
+    "rate_limit_rejections_total": ("counter", "Requests rejected by the rate limiter, by endpoint"),
+    "rate_limit_table_full_total": ("counter", "New rate limit keys refused because their mmap stripe was full"),
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+
+    def __init__(self):
+        self.enabled = True
+        self.directory = None
+        self.flush_interval = 5.0
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._flusher = None
+        self._flusher_pid = None
+        self._listeners_registered = False
+        self._new_worker()
+
+    def _new_worker(self):
+        # the pid alone is reused by later workers
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self.started = time.time()
+
+    def init_app(self, app):
+        """Read the metrics settings, instrument the app and register the pymongo listeners"""
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.directory = app.config.get("METRICS_DIR")
+        self.flush_interval = app.config.get("METRICS_FLUSH_INTERVAL", 5.0)
+        if not self.enabled:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._teardown_request)
+        # monitoring listeners apply to every client created afterwards, the clients are lazy
+        if not self._listeners_registered:
+            monitoring.register(CommandMetrics(self))
+            monitoring.register(PoolMetrics(self))
+            self._listeners_registered = True
+
+    '''
+    Recording
+    '''
+
+    def inc(self, name, labels, amount=1):
+        if not self.enabled:
+            return
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._ensure_flusher()
+
+    def add_gauge(self, name, labels, amount):
+        if not self.enabled:
+            return
+        key = (name, _key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        if not self.enabled:
+            return
+        key = (name, _key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1),
+                                                     "sum": 0.0, "count": 0}
+            # counts are per bucket here, made cumulative on export
+            histogram["counts"][bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self._ensure_flusher()
+
+    def rate_limited(self, endpoint):
+        self.inc("rate_limit_rejections_total", {"endpoint": endpoint or "unknown"})
+
+    '''
+    Flask hooks
+    '''
+
+    @staticmethod
+    def _route_labels():
+        rule = request.url_rule
+        return {"blueprint": request.blueprint or "", "route": rule.rule if rule is not None else "unmatched",
+                "method": request.method}
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_labels = self._route_labels()
+        self.add_gauge("http_requests_in_flight", g._metrics_labels, 1)
+
+    def _teardown_request(self, exc):
+        started = g.pop("_metrics_started", None)
+        labels = g.pop("_metrics_labels", None)
+        if started is None:
+            return
+        self.add_gauge("http_requests_in_flight", labels, -1)
+        self.observe("http_request_duration_seconds", labels, time.perf_counter() - started)
+        status = 500 if exc is not None else g.pop("_metrics_status", 200)
+        self.inc("http_requests_total", {**labels, "status": str(status)})
+
+    def _record_status(self, response):
+        # the status code is only known in after_request
+        g._metrics_status = response.status_code
+        return response
+
+    '''
+    Aggregation across workers
+    '''
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "worker": self.worker_id,
+                "started": self.started,
+                "counters": [[n, list(l), v] for (n, l), v in self._counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self._gauges.items()],
+                "histograms": [[n, list(l), dict(h, counts=list(h["counts"]))] for (n, l), h in self._histograms.items()]
+            }
+
+    def flush(self):
+        """Write this worker's values for the other workers' scrapes"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"worker-{self.worker_id}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _ensure_flusher(self):
+        if not self.directory or (self._flusher_pid == os.getpid() and self._flusher.is_alive()):
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logging.exception("Writing the metrics file failed")
+
+    def _worker_snapshots(self):
+        """Snapshots of the live workers, plus the archived totals of the exited ones"""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        workers = []
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            try:
+                with open(path) as f:
+                    workers.append((path, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        latest = {}
+        for _, snapshot in workers:
+            latest[snapshot["pid"]] = max(latest.get(snapshot["pid"], 0), snapshot["started"])
+        live, exited = [], []
+        for path, snapshot in workers:
+            alive = self._alive(snapshot["pid"]) and snapshot["started"] == latest[snapshot["pid"]]
+            (live if alive else exited).append((path, snapshot))
+        archive = self._fold(exited) if exited else self._read_archive()
+        return [snapshot for _, snapshot in live] + [archive]
+
+    def _read_archive(self):
+        try:
+            with open(os.path.join(self.directory, ARCHIVE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"counters": [], "gauges": [], "histograms": [], "folded": []}
+
+    def _fold(self, exited):
+        """Add the files of exited workers to the archive and remove them"""
+        # workers scraping at the same time must not fold a file twice
+        with open(os.path.join(self.directory, f"{ARCHIVE}.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = self._read_archive()
+            # files already folded by a scrape that died before removing them
+            folded = set(archive.get("folded", []))
+            counters, histograms = {}, {}
+            _add(counters, {}, histograms, archive)
+            for path, snapshot in exited:
+                if snapshot["worker"] not in folded and os.path.exists(path):
+                    _add(counters, {}, histograms, {**snapshot, "gauges": []})
+            archive = {
+                "counters": [[name, [list(l) for l in labels], value] for (name, labels), value in counters.items()],
+                "gauges": [],
+                "histograms": [[name, [list(l) for l in labels], h] for (name, labels), h in histograms.items()],
+                "folded": [snapshot["worker"] for _, snapshot in exited]
+            }
+            path = os.path.join(self.directory, ARCHIVE)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(archive, f)
+            os.replace(f"{path}.tmp", path)
+            for path, _ in exited:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return archive
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def collect(self):
+        """(counters, gauges, histograms) added up over every worker"""
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in self._worker_snapshots():
+            _add(counters, gauges, histograms, snapshot)
+        return counters, gauges, histograms
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        counters, gauges, histograms = self.collect()
+        by_name = {}
+        for source in (counters, gauges, histograms):
+            for (name, labels), value in source.items():
+                by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, text = HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value["buckets"] + ["+Inf"], value["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def _after_fork(self):
+        # a worker starts from zero: what the master recorded is in the master's file
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self._new_worker()
+        self.reset()
+
+
+def _add(counters, gauges, histograms, snapshot):
+    """Add the values of a snapshot to the totals"""
+    for name, labels, value in snapshot["counters"]:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, value in snapshot["gauges"]:
+        key = (name, tuple(map(tuple, labels)))
+        gauges[key] = gauges.get(key, 0) + value
+    for name, labels, histogram in snapshot["histograms"]:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = dict(histogram, counts=list(histogram["counts"]))
+        else:
+            total["counts"] = [a + b for a, b in zip(total["counts"], histogram["counts"])]
+            total["sum"] += histogram["sum"]
+            total["count"] += histogram["count"]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def command_collection(command_name, command):
+    """Collection a MongoDB command works on ("" for database commands like ping)"""
+    target = command.get(command_name)
+    if isinstance(target, str):
+        return target
+    if command_name == "getMore":
+        return command.get("collection", "")
+    return ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Duration of every MongoDB command by command name and collection"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        # the finished events do not carry the command, remember its collection
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.request_id, event.connection_id)] = command_collection(event.command_name, event.command)
+
+    def _finished(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), "")
+        labels = {"command": event.command_name, "collection": collection}
+        self.registry.observe("mongo_command_duration_seconds", labels, event.duration_micros / 1e6,
+                              buckets=MONGO_BUCKETS)
+        return labels
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self.registry.inc("mongo_command_failures_total", self._finished(event))
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Time requests wait to check a connection out of the pool"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def connection_checked_out(self, event):
+        self.registry.observe("mongo_pool_checkout_wait_seconds", {}, event.duration, buckets=MONGO_BUCKETS)
+
+    def connection_check_out_failed(self, event):
+        self.registry.inc("mongo_pool_checkout_failures_total", {"reason": str(event.reason)})
+
+    # the remaining events carry nothing we measure
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+metrics = Metrics()
+
+os.register_at_fork(after_in_child=metrics._after_fork)
@@ -0,0 +1,27 @@
+import logging
+from pymongo.errors import PyMongoError
+from db import mongo_db
+from utils.order_summaries import sync_summary
+from utils.sales_rollups import apply_rollups
+
+'''
+Read models kept in sync with the orders.
+
+Every route that writes an order calls after_order_write with the order as
+it was before and after the write (None for a new order). The read models
+are updated after the order itself is written; a failure there is logged
+and never fails the request, and each read model has a rebuild job.
+'''
+
+
+def after_order_write(old, new):
+    order_id = (new or old)["order_id"]
+    try:
+        apply_rollups(mongo_db.db, old, new)
+    except PyMongoError:
+        logging.exception(f"Sales rollup update failed for order {order_id}")
+    if new is not None:
+        try:
+            sync_summary(mongo_db.db, new)
+        except PyMongoError:
+            logging.exception(f"Order summary update failed for order {order_id}")
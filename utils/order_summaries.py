@@ -0,0 +1,62 @@
+import argparse
+import logging
+from pymongo.errors import DuplicateKeyError
+
+'''
+Per-user order summaries.
+
+``order_summaries`` holds one small document per order with only what an
+order list shows (id, status, totals, dates), so listing the orders of a
+user never reads the embedded products. The summaries are written by the
+order routes through after_order_write; ``python -m utils.order_summaries``
+rebuilds them from the orders.
+'''
+
+SUMMARY_FIELDS = ["order_id", "user_id", "order_status", "payment_status", "order_price",
+                  "order_quantity", "created_at", "updated_timestamp", "version"]
+
+
+def order_summary(order):
+    summary = {field: order[field] for field in SUMMARY_FIELDS if field in order}
+    summary["item_count"] = len(order.get("products", []))
+    return summary
+
+
+def sync_summary(db, order):
+    """Write the summary of ``order`` as it is now, unless it already holds this version or a newer one"""
+    summary = order_summary(order)
+    query = {"order_id": order["order_id"]}
+    if "version" in summary:
+        # an older write finishing last must not take the summary back
+        query["$or"] = [{"version": {"$lt": summary["version"]}}, {"version": {"$exists": False}}]
+    try:
+        db.order_summaries.replace_one(query, summary, upsert=True)
+    except DuplicateKeyError:
+        # the upsert hit the unique order_id index: the stored summary is newer
+        pass
+
+
+def summary_pipeline():
+    project = {field: 1 for field in SUMMARY_FIELDS}
+    project.update({"_id": 0, "item_count": {"$size": {"$ifNull": ["$products", []]}}})
+    return [
+        {"$project": project},
+        {"$merge": {"into": "order_summaries", "on": "order_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def rebuild(db):
+    db.orders.aggregate(summary_pipeline(), allowDiskUse=True)
+    return db.order_summaries.estimated_document_count()
+
+
+def main(argv=None):
+    argparse.ArgumentParser(description="Rebuild the per-user order summaries from the orders").parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from db.mongo_db import db
+    logging.info(f"{rebuild(db)} order summaries")
+
+
+if __name__ == "__main__":
+    main()
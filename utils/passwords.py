@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+'''
+Password hashing off the request thread.
+
+bcrypt releases the GIL, so hashes run on a small bounded thread pool while
+the rest of the worker keeps serving. The number of hashes waiting for the
+pool is capped; past that PasswordQueueFull is raised (answered with a 503)
+instead of letting a login burst pile up behind the CPU.
+
+The cost comes from BCRYPT_ROUNDS, or is calibrated at startup so one hash
+takes about BCRYPT_TARGET_MS on this machine.
+'''
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many hashes are already waiting for the pool"""
+
+
+def hash_cost(hashed):
+    """Cost factor of a bcrypt hash ($2b$12$... -> 12)"""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms, min_rounds=10, max_rounds=16):
+    """Highest cost whose hash time stays under ``target_ms`` on this machine"""
+    # every extra round doubles the work, so one measurement is enough
+    probe_rounds = 8
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(probe_rounds))
+    probe_ms = (time.perf_counter() - started) * 1000
+
+    rounds = probe_rounds
+    while rounds < max_rounds and probe_ms * 2 ** (rounds + 1 - probe_rounds) <= target_ms:
+        rounds += 1
+    while rounds > min_rounds and probe_ms * 2 ** (rounds - probe_rounds) > target_ms:
+        rounds -= 1
+    return max(rounds, min_rounds)
+
+
+class PasswordHasher:
+
+    def __init__(self):
+        self.rounds = 12
+        self.max_workers = 2
+        self.max_queue = 16
+        self.timeout = 10
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read the pool and cost settings from the app config"""
+        self.max_workers = app.config.get("BCRYPT_MAX_WORKERS", 2)
+        self.max_queue = app.config.get("BCRYPT_MAX_QUEUE", 16)
+        self.timeout = app.config.get("BCRYPT_TIMEOUT", 10)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+
+        target_ms = app.config.get("BCRYPT_TARGET_MS")
+        if target_ms:
+            self.rounds = calibrate_rounds(target_ms, min_rounds=app.config.get("BCRYPT_MIN_ROUNDS", 10))
+            logging.info(f"bcrypt cost calibrated to {self.rounds} for a {target_ms}ms target")
+        else:
+            self.rounds = app.config.get("BCRYPT_ROUNDS", 12)
+
+    def hash(self, password):
+        """bcrypt hash of ``password`` at the configured cost, as str"""
+        hashed = self._run(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds))
+        return hashed.decode("utf-8")
+
+    def check(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """True when ``hashed`` was made with a lower cost than the current one"""
+        cost = hash_cost(hashed)
+        return cost is not None and cost < self.rounds
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordQueueFull()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def _get_executor(self):
+        # threads do not survive a fork, each gunicorn worker gets its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+from pymongo import ReturnDocument
+
+'''
+Read-through product cache.
+
+Product documents are cached per worker, keyed by sku and by product_id,
+with a bounded LRU and a TTL. Writes bump a version stamp stored in Mongo
+(``versions`` collection, ``_id: "products"``); every worker compares its
+stamp with the stored one at most every ``PRODUCT_CACHE_VERSION_INTERVAL``
+seconds and drops its entries when it changed, so an update made through one
+gunicorn worker reaches the others.
+
+Stock is deliberately not cached: it changes with every order and is checked
+atomically when the stock is reserved.
+'''
+
+CACHE_KEYS = ("sku", "product_id")
+
+#fields never kept in the cache
+UNCACHED_FIELDS = {"_id": 0, "quantity_present": 0, "reservations": 0, "adjustments": 0}
+
+
+class ProductCache:
+
+    def __init__(self):
+        self.enabled = False
+        self.max_size = 10000
+        self.ttl = 300
+        self.version_interval = 1.0
+        self._versions = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app, versions):
+        """Read the cache settings from the app config"""
+        self.enabled = app.config.get("PRODUCT_CACHE_ENABLED", True)
+        self.max_size = app.config.get("PRODUCT_CACHE_SIZE", 10000)
+        self.ttl = app.config.get("PRODUCT_CACHE_TTL", 300)
+        self.version_interval = app.config.get("PRODUCT_CACHE_VERSION_INTERVAL", 1.0)
+        self._versions = versions
+        self.clear()
+
+    def get_many(self, collection, field, values, projection=None):
+        """Return {value: product} for the products whose ``field`` is in ``values``.
+
+        Only the values missing from the cache are fetched, in one $in query.
+        When the cache is disabled this is a plain projected query.
+        """
+        if not self.enabled:
+            return {doc[field]: doc for doc in collection.find({field: {"$in": list(values)}}, projection)}
+
+        self._sync_version()
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for value in values:
+                entry = self._entries.get((field, value))
+                if entry and entry[0] > now:
+                    self._entries.move_to_end((field, value))
+                    found[value] = dict(entry[1])
+                    self.hits += 1
+                else:
+                    missing.append(value)
+                    self.misses += 1
+
+        if missing:
+            version = self._version
+            docs = list(collection.find({field: {"$in": missing}}, UNCACHED_FIELDS))
+            with self._lock:
+                # an invalidation while we were reading makes these documents stale
+                if version == self._version:
+                    for doc in docs:
+                        self._store(doc, now + self.ttl)
+            for doc in docs:
+                found[doc[field]] = dict(doc)
+        return found
+
+    def invalidate(self):
+        """Drop the cache in this worker and bump the shared version for the others"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.clear()
+            # a get_many reading since before the write must not store what it read
+            self._version = object()
+            self.invalidations += 1
+        stamp = self._versions.find_one_and_update(
+            {"_id": "products"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        with self._lock:
+            self._version = stamp["version"]
+            self._version_checked_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._version_checked_at = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "version": self._version
+            }
+
+    def _store(self, doc, expires_at):
+        for key in CACHE_KEYS:
+            if key in doc:
+                self._entries[(key, doc[key])] = (expires_at, doc)
+                self._entries.move_to_end((key, doc[key]))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _sync_version(self):
+        """Pick up invalidations made by other workers"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_interval:
+            return
+        stamp = self._versions.find_one({"_id": "products"})
+        version = stamp["version"] if stamp else 0
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            self._version_checked_at = now
+
+
+product_cache = ProductCache()
@@ -0,0 +1,170 @@
+import argparse
+import codecs
+import csv
+import json
+import logging
+import uuid
+from datetime import datetime
+from marshmallow import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from schema.product_schema import Add_Product_Schema
+
+'''
+Bulk product import.
+
+Rows are read one at a time from an NDJSON or CSV stream, validated with
+Add_Product_Schema and upserted by sku in unordered bulk_writes of
+``chunk_size`` operations, so a catalog of any size is loaded with a few
+round trips per thousand rows and flat memory.
+
+Existing products keep their product_id and creation timestamp; every other
+field is overwritten by the imported row.
+
+    python -m utils.product_import catalog.csv --format csv
+'''
+
+# columns of a product export that are not part of an imported row
+EXPORT_ONLY_FIELDS = ("_id", "product_id", "timestamp", "updated_timestamp")
+
+
+def ndjson_rows(lines):
+    """Yield (line number, row) for every non-blank line, row is None when it is not a JSON object"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def csv_rows(lines):
+    """Yield (line number, row) for every data row of a CSV with a header"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _upsert(data, now):
+    return UpdateOne(
+        {"sku": data["sku"]},
+        {
+            "$set": {**data, "updated_timestamp": now},
+            "$setOnInsert": {"product_id": str(uuid.uuid4()), "timestamp": now},
+            "$inc": {"version": 1}
+        },
+        upsert=True
+    )
+
+
+class ImportResult:
+
+    def __init__(self, max_errors):
+        self.received = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, line, sku, errors):
+        self.failed += 1
+        # the counts stay exact, only the reported details are capped
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "sku": sku, "errors": errors})
+
+    def to_dict(self):
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+def _flush(collection, chunk, result):
+    if not chunk:
+        return
+    ops = [op for _, _, op in chunk]
+    try:
+        written = collection.bulk_write(ops, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        written = e.details
+        for error in written.get("writeErrors", []):
+            line, sku, _ = chunk[error["index"]]
+            result.error(line, sku, {"_write": [error.get("errmsg", "write failed")]})
+    result.inserted += written.get("nUpserted", 0)
+    result.updated += written.get("nMatched", 0)
+    chunk.clear()
+
+
+def import_products(collection, rows, chunk_size=1000, max_errors=1000):
+    """Validate and upsert (line, row) pairs, returning the aggregate counts and per-row errors"""
+    schema = Add_Product_Schema()
+    result = ImportResult(max_errors)
+    chunk = []
+    pending_skus = set()
+    now = datetime.now()
+
+    for line, row in rows:
+        result.received += 1
+        if row is None:
+            result.error(line, None, {"_row": ["Not a valid JSON object."]})
+            continue
+        for field in EXPORT_ONLY_FIELDS:
+            row.pop(field, None)
+        try:
+            data = schema.load(row)
+        except ValidationError as e:
+            result.error(line, row.get("sku"), e.messages)
+            continue
+
+        # a sku repeated within one unordered bulk would race its own upsert
+        if data["sku"] in pending_skus:
+            _flush(collection, chunk, result)
+            pending_skus.clear()
+        chunk.append((line, data["sku"], _upsert(data, now)))
+        pending_skus.add(data["sku"])
+        if len(chunk) >= chunk_size:
+            _flush(collection, chunk, result)
+            pending_skus.clear()
+
+    _flush(collection, chunk, result)
+    return result.to_dict()
+
+
+def read_rows(stream, fmt):
+    """(line, row) pairs from a binary stream in the given format"""
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    return csv_rows(lines) if fmt == "csv" else ndjson_rows(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import products (upsert by sku)")
+    parser.add_argument("path", help="NDJSON or CSV file")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from db.mongo_db import db
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    with open(args.path, "rb") as stream:
+        result = import_products(db.products, read_rows(stream, fmt), chunk_size=args.chunk_size)
+    # make the running workers drop their cached products
+    db.versions.update_one({"_id": "products"}, {"$inc": {"version": 1}}, upsert=True)
+
+    for error in result["errors"]:
+        logging.info(f"line {error['line']} ({error['sku']}): {error['errors']}")
+    logging.info(f"received {result['received']}, inserted {result['inserted']}, "
+                 f"updated {result['updated']}, failed {result['failed']}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,259 @@
+import cProfile
+import glob
+import json
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+from uuid import uuid4
+from flask import g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_smorest import abort
+
+'''
+On-demand profiling of single requests.
+
+An admin adds ``X-Profile: 1`` (or ``?_profile=1``) to a request and it
+runs under cProfile. The profile is saved in PROFILE_DIR as a pstats dump,
+a callgrind file (kcachegrind/qcachegrind) and a JSON report with the top
+functions by cumulative time and the time spent in Mongo, serialization,
+bcrypt, the view code and the framework. The response carries the report id
+in ``X-Profile-Id`` and the breakdown in ``Server-Timing``; with
+``X-Profile: inline`` the report replaces the response body.
+
+With PROFILING_ENABLED off no hook is registered at all; with it on,
+requests that don't ask for a profile cost one header lookup.
+'''
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ARG = "_profile"
+
+# first match wins, on the file of the function; the rest of the app's own code is "view"
+CATEGORIES = (
+    ("mongo", ("/pymongo/", "/bson/", "/db/")),
+    ("bcrypt", ("/bcrypt/", "/utils/passwords.py")),
+    ("serialization", ("/marshmallow/", "/schema/", "/json/")),
+    ("framework", ("/flask/", "/werkzeug/", "/flask_smorest/", "/flask_jwt_extended/", "/flask_limiter/",
+                   "/limits/", "/jwt/")),
+)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _own_category(func):
+    filename = func[0].replace(os.sep, "/")
+    for category, markers in CATEGORIES:
+        if any(marker in filename for marker in markers):
+            return category
+    if func[0].startswith(PROJECT_ROOT) and "site-packages" not in filename:
+        return "view"
+    return None
+
+
+def breakdown(stats):
+    """Self time in seconds per category.
+
+    Builtins and standard library functions (lock waits, socket reads) are
+    charged to the category of their busiest caller, so waiting for a
+    socket inside pymongo counts as Mongo time.
+    """
+    memo = {}
+
+    def category(func, depth=0):
+        if func in memo:
+            return memo[func]
+        found = _own_category(func)
+        if found is None and depth < 20:
+            callers = stats[func][4] if func in stats else {}
+            if callers:
+                busiest = max(callers, key=lambda caller: callers[caller][3])
+                memo[func] = "other"  # guards against recursion cycles
+                found = category(busiest, depth + 1)
+        memo[func] = found or "other"
+        return memo[func]
+
+    totals = {}
+    for func, (_, _, tottime, _, _) in stats.items():
+        name = category(func)
+        totals[name] = totals.get(name, 0.0) + tottime
+    return totals
+
+
+def _label(func):
+    filename, line, name = func
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    return f"{filename}:{line}({name})" if line else name
+
+
+def top_functions(stats, limit):
+    """The ``limit`` functions with the highest cumulative time"""
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {"function": _label(func), "calls": calls, "tottime_ms": round(tottime * 1000, 3),
+         "cumtime_ms": round(cumtime * 1000, 3)}
+        for func, (_, calls, tottime, cumtime, _) in ranked
+    ]
+
+
+def callgrind(stats):
+    """The profile in the callgrind format, costs in microseconds"""
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge))
+
+    lines = ["# callgrind format", "events: Microseconds", ""]
+    for func, (_, _, tottime, _, _) in stats.items():
+        filename, line, name = func
+        lines += [f"fl={filename}", f"fn={name}:{line}", f"{line} {int(tottime * 1e6)}"]
+        for callee, (calls, _, _, cumtime) in callees.get(func, []):
+            lines += [f"cfl={callee[0]}", f"cfn={callee[2]}:{callee[1]}", f"calls={calls} {callee[1]}",
+                      f"{line} {int(cumtime * 1e6)}"]
+        lines.append("")
+    return "\n".join(lines)
+
+
+class RequestProfiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = os.path.join(tempfile.gettempdir(), "inventory-profiles")
+        self.keep = 50
+        self.top = 30
+        # cProfile hooks the interpreter: one profiled request per process at a time
+        self._busy = threading.Lock()
+
+    def init_app(self, app):
+        """Register the hooks when PROFILING_ENABLED is set"""
+        self.enabled = app.config.get("PROFILING_ENABLED", True)
+        self.directory = app.config.get("PROFILE_DIR") or self.directory
+        self.keep = app.config.get("PROFILE_KEEP", 50)
+        self.top = app.config.get("PROFILE_TOP", 30)
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def requested_mode():
+        """None, "store" or "inline" """
+        mode = request.headers.get(PROFILE_HEADER)
+        if mode is None and PROFILE_ARG.encode() in request.query_string:
+            mode = request.args.get(PROFILE_ARG)
+        if not mode or mode in ("0", "false"):
+            return None
+        return "inline" if mode == "inline" else "store"
+
+    '''
+    Flask hooks
+    '''
+
+    def _before_request(self):
+        mode = self.requested_mode()
+        if mode is None:
+            return
+        verify_jwt_in_request()
+        if get_jwt().get("role") != "admin":
+            abort(403, message="Profiling is for admins only")
+        if not self._busy.acquire(blocking=False):
+            g._profile_busy = True
+            return
+        g._profile_mode = mode
+        g._profile_started = time.perf_counter()
+        g._profiler = cProfile.Profile()
+        g._profiler.enable()
+
+    def _after_request(self, response):
+        profiler = g.pop("_profiler", None)
+        if profiler is None:
+            if g.pop("_profile_busy", False):
+                response.headers["X-Profile-Status"] = "busy"
+            return response
+        profiler.disable()
+        self._busy.release()
+        elapsed = time.perf_counter() - g.pop("_profile_started")
+        mode = g.pop("_profile_mode")
+
+        report = self.save(profiler, elapsed, response.status_code)
+        timings = ", ".join(f"{name};dur={ms}" for name, ms in report["breakdown_ms"].items())
+        if mode == "inline":
+            response = self._inline(response, report)
+        response.headers["X-Profile-Id"] = report["id"]
+        response.headers["Server-Timing"] = f"{timings}, total;dur={report['total_ms']}"
+        return response
+
+    def _teardown_request(self, exc):
+        # the view raised past the after_request hooks
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            self._busy.release()
+
+    @staticmethod
+    def _inline(response, report):
+        response.set_data(json.dumps(report))
+        response.mimetype = "application/json"
+        response.status_code = 200
+        # the body no longer matches the view's validators
+        response.headers.pop("ETag", None)
+        response.headers.pop("Last-Modified", None)
+        return response
+
+    '''
+    Stored profiles
+    '''
+
+    def save(self, profiler, elapsed, status_code):
+        """Write the pstats, callgrind and JSON files of a profile and return the report"""
+        stats = pstats.Stats(profiler)
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid4().hex[:8]}"
+        report = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": status_code,
+            "total_ms": round(elapsed * 1000, 3),
+            "breakdown_ms": {name: round(seconds * 1000, 3)
+                             for name, seconds in sorted(breakdown(stats.stats).items(), key=lambda i: -i[1])},
+            "top": top_functions(stats.stats, self.top)
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile_id)
+            stats.dump_stats(f"{base}.prof")
+            with open(f"{base}.callgrind", "w") as f:
+                f.write(callgrind(stats.stats))
+            with open(f"{base}.json", "w") as f:
+                json.dump(report, f)
+            self.prune()
+        except OSError:
+            logging.exception("Saving the request profile failed")
+        return report
+
+    def prune(self):
+        """Keep the PROFILE_KEEP newest profiles"""
+        for path in self.reports()[self.keep:]:
+            base = path[:-len(".json")]
+            for suffix in (".json", ".prof", ".callgrind"):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def reports(self):
+        """Report files, newest first"""
+        return sorted(glob.glob(os.path.join(self.directory, "*.json")), reverse=True)
+
+    def path(self, profile_id, suffix):
+        """File of a stored profile, None when it does not exist"""
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, f"{profile_id}{suffix}")
+        return path if os.path.exists(path) else None
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,270 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from limits.errors import ConfigurationError
+from limits.storage import MovingWindowSupport, Storage
+from utils.metrics import metrics
+
+'''
+Rate limit counters shared by every worker on a host.
+
+    RATELIMIT_STORAGE_URI=mmap:///var/tmp/inventory-ratelimit.mmap
+
+The counters live in a memory-mapped file, so all gunicorn workers see the
+same numbers and the limits survive worker restarts. Keys are hashed into
+stripes of slots; a stripe is locked with a thread lock (threads of one
+worker) plus an fcntl lock on its byte range (other workers), so requests
+only contend when their keys land in the same stripe.
+
+Fixed windows keep a count and an expiry per slot. Moving windows keep the
+last ``window_size`` hit timestamps per slot in a ring, so a moving window
+limit can allow at most ``window_size`` hits.
+
+The table is sized by RATELIMIT_STORAGE_OPTIONS (``slots``, ``windows``,
+``window_size``). A new key takes an empty or expired slot of its stripe.
+When every slot of the stripe is live, no client's counter is reset to make
+room: the new key is refused (fail closed), the refusal is counted in
+``rate_limit_table_full_total`` and logged, and the table should be grown.
+'''
+
+MAGIC = b"INVRLMT1"
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+# every slot starts with the key fingerprint and the expiry of the slot
+SLOT = struct.Struct("<16sd")
+COUNTER = struct.Struct("<16sdq")           # fingerprint, expiry, count
+WINDOW = struct.Struct("<16sdqq")           # fingerprint, expiry, ring head, entries
+TIMESTAMP = struct.Struct("<d")
+COUNTER_STRIPE = 16
+WINDOW_STRIPE = 4
+EMPTY = bytes(SLOT.size)
+# what incr answers for a key that got no slot: above any limit
+TABLE_FULL = 2 ** 62
+# at most one warning per worker per interval, the counter has the exact number
+FULL_LOG_INTERVAL = 60
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "inventory-ratelimit.mmap")
+
+
+def _fingerprint(key):
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def _stripes(count, per_stripe):
+    return max(1, -(-int(count) // per_stripe))
+
+
+class MmapStorage(Storage, MovingWindowSupport):
+    """limits storage backed by a memory-mapped file (``mmap:///path``)"""
+
+    STORAGE_SCHEME = ["mmap"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, slots=4096, windows=1024, window_size=256, **_):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        self.path = (urlparse(uri).path if uri else "") or DEFAULT_PATH
+        self.counter_stripes = _stripes(slots, COUNTER_STRIPE)
+        self.window_stripes = _stripes(windows, WINDOW_STRIPE)
+        self.window_size = int(window_size)
+
+        self._window_bytes = WINDOW.size + self.window_size * TIMESTAMP.size
+        self._counters_at = HEADER_SIZE
+        self._windows_at = self._counters_at + self.counter_stripes * COUNTER_STRIPE * COUNTER.size
+        self._size = self._windows_at + self.window_stripes * WINDOW_STRIPE * self._window_bytes
+        self._thread_locks = [threading.Lock() for _ in range(self.counter_stripes + self.window_stripes)]
+        self._full_logged = 0
+        self._open()
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = HEADER.pack(MAGIC, self.counter_stripes, self.window_stripes, self.window_size)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            # growing the file is safe while other workers have it mapped
+            if os.fstat(self._fd).st_size < self._size:
+                os.ftruncate(self._fd, self._size)
+            self._map = mmap.mmap(self._fd, self._size)
+            if self._map[:HEADER.size] != header:
+                # new file or different geometry: start from empty counters
+                self._map[:] = bytes(self._size)
+                self._map[:HEADER.size] = header
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def _stripe(self, key, windows=False):
+        """Lock the stripe ``key`` hashes to, yielding (fingerprint, first slot offset)"""
+        fp = _fingerprint(key)
+        h = int.from_bytes(fp[:8], "little")
+        if windows:
+            index = h % self.window_stripes
+            length = WINDOW_STRIPE * self._window_bytes
+            start = self._windows_at + index * length
+            index += self.counter_stripes
+        else:
+            index = h % self.counter_stripes
+            length = COUNTER_STRIPE * COUNTER.size
+            start = self._counters_at + index * length
+
+        with self._thread_locks[index]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield fp, start
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _find(self, fp, start, count, stride, now, claim=False):
+        """(offset, live) of the slot holding ``fp``.
+
+        With ``claim`` the key's own slot, else an empty or expired one; a
+        live slot of another key is never returned, so (None, False) means
+        the stripe is full.
+        """
+        free = None
+        for i in range(count):
+            offset = start + i * stride
+            slot_fp, expiry = SLOT.unpack_from(self._map, offset)
+            if slot_fp == fp:
+                return offset, expiry > now
+            if claim and free is None and expiry <= now:
+                free = offset
+        return free, False
+
+    def _full(self, table):
+        metrics.inc("rate_limit_table_full_total", {"table": table})
+        now = time.monotonic()
+        if now - self._full_logged >= FULL_LOG_INTERVAL:
+            self._full_logged = now
+            logging.warning(f"Rate limit {table} table full in {self.path}, refusing new clients: "
+                            f"raise the slots/windows of RATELIMIT_STORAGE_OPTIONS")
+
+    '''
+    Fixed window
+    '''
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._stripe(key) as (fp, start):
+            offset, live = self._find(fp, start, COUNTER_STRIPE, COUNTER.size, now, claim=True)
+            if offset is None:
+                self._full("counter")
+                return TABLE_FULL
+            if live:
+                _, until, value = COUNTER.unpack_from(self._map, offset)
+                value += amount
+            else:
+                until, value = now + expiry, amount
+            COUNTER.pack_into(self._map, offset, fp, until, value)
+        return value
+
+    def get(self, key):
+        with self._stripe(key) as (fp, start):
+            offset, live = self._find(fp, start, COUNTER_STRIPE, COUNTER.size, time.time())
+            return COUNTER.unpack_from(self._map, offset)[2] if live else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        with self._stripe(key) as (fp, start):
+            offset, live = self._find(fp, start, COUNTER_STRIPE, COUNTER.size, now)
+            return COUNTER.unpack_from(self._map, offset)[1] if live else now
+
+    '''
+    Moving window
+    '''
+
+    def _entry(self, offset, head, i):
+        """i-th most recent timestamp of the ring at ``offset``"""
+        ring = offset + WINDOW.size
+        return TIMESTAMP.unpack_from(self._map, ring + (head - i) % self.window_size * TIMESTAMP.size)[0]
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        if limit > self.window_size:
+            raise ConfigurationError(
+                f"Moving window limit of {limit} is above the mmap window_size of {self.window_size}"
+            )
+
+        now = time.time()
+        with self._stripe(key, windows=True) as (fp, start):
+            offset, live = self._find(fp, start, WINDOW_STRIPE, self._window_bytes, now, claim=True)
+            if offset is None:
+                self._full("window")
+                return False
+            head, entries = WINDOW.unpack_from(self._map, offset)[2:] if live else (0, 0)
+
+            # same rule as the in-memory storage: the hit that would be pushed
+            # out of the window by this one must already be outside it
+            if limit - amount < entries and self._entry(offset, head, limit - amount) >= now - expiry:
+                return False
+
+            ring = offset + WINDOW.size
+            for _ in range(amount):
+                head = (head + 1) % self.window_size
+                TIMESTAMP.pack_into(self._map, ring + head * TIMESTAMP.size, now)
+            WINDOW.pack_into(self._map, offset, fp, now + expiry, head, min(entries + amount, self.window_size))
+        return True
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        with self._stripe(key, windows=True) as (fp, start):
+            offset, live = self._find(fp, start, WINDOW_STRIPE, self._window_bytes, now)
+            if not live:
+                return now, 0
+            head, entries = WINDOW.unpack_from(self._map, offset)[2:]
+
+            oldest, count = now, 0
+            for i in range(min(entries, limit)):
+                timestamp = self._entry(offset, head, i)
+                if timestamp < now - expiry:
+                    break
+                oldest, count = timestamp, i + 1
+            return oldest, count
+
+    '''
+    Maintenance
+    '''
+
+    def check(self):
+        return not self._map.closed
+
+    def clear(self, key):
+        now = time.time()
+        with self._stripe(key) as (fp, start):
+            offset, _ = self._find(fp, start, COUNTER_STRIPE, COUNTER.size, now)
+            if offset is not None:
+                self._map[offset:offset + SLOT.size] = EMPTY
+        with self._stripe(key, windows=True) as (fp, start):
+            offset, _ = self._find(fp, start, WINDOW_STRIPE, self._window_bytes, now)
+            if offset is not None:
+                self._map[offset:offset + SLOT.size] = EMPTY
+
+    def reset(self):
+        now = time.time()
+        cleared = 0
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self._size - HEADER_SIZE, HEADER_SIZE)
+        try:
+            for offset in range(self._counters_at, self._windows_at, COUNTER.size):
+                cleared += SLOT.unpack_from(self._map, offset)[1] > now
+            for offset in range(self._windows_at, self._size, self._window_bytes):
+                cleared += SLOT.unpack_from(self._map, offset)[1] > now
+            self._map[HEADER_SIZE:] = bytes(self._size - HEADER_SIZE)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._size - HEADER_SIZE, HEADER_SIZE)
+        return cleared
@@ -2,15 +2,26 @@ from flask import request
 import os
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import utils.rate_limit_storage  # registers the mmap:// storage scheme
+from utils.metrics import metrics
 
 
 def is_testing():
     """Check if we're in testing mode"""
     return os.getenv('TESTING') == 'True'
 
+#storage comes from RATELIMIT_STORAGE_URI, use mmap:// to share counters between workers
+#applied to every route (also by the async handlers in asgi.py)
+DEFAULT_LIMITS = ["200 per day", "50 per hour"]
+
+def count_rejection(request_limit):
+    """Count every request the limiter rejects, per endpoint"""
+    metrics.rate_limited(request.endpoint)
+
+
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://",
-    enabled=not is_testing()
+    default_limits=DEFAULT_LIMITS,
+    enabled=not is_testing(),
+    on_breach=count_rejection
 )
\ No newline at end of file
@@ -0,0 +1,179 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+'''
+Sales rollups.
+
+Two small collections are kept up to date as orders change, so the
+analytics endpoints never scan the orders:
+
+- ``sales_daily``: one document per day (``_id: "YYYY-MM-DD"``) with the
+  units, revenue and number of orders, plus the orders per status.
+- ``sales_product_daily``: one document per (day, product_id) with the
+  units, revenue and number of orders containing the product.
+
+An order counts on the day it was created. Cancelled orders count only in
+``orders_by_status``. Every write to an order applies the difference between
+the rollup contribution of the order before and after the write as $inc
+upserts. ``python -m utils.sales_rollups`` rebuilds the rollups from the
+order history with two aggregations, e.g. after a failed update.
+'''
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def order_day(order):
+    return order["created_at"].strftime(DAY_FORMAT)
+
+
+def contribution(order):
+    """(day, daily increments, {product_id: increments}) that ``order`` adds to the rollups"""
+    if order is None:
+        return None, {}, {}
+    status = order["order_status"]
+    daily = {f"orders_by_status.{status}": 1}
+    products = {}
+    if status != "Cancelled":
+        daily.update({"orders": 1, "units": order["order_quantity"], "revenue": order["order_price"]})
+        for line in order["products"]:
+            totals = products.setdefault(line["product_id"], {"orders": 1, "units": 0, "revenue": 0,
+                                                              "sku": line["sku"],
+                                                              "product_name": line["product_name"]})
+            totals["units"] += line["product_quantity"]
+            totals["revenue"] += line["total_price"]
+    return order_day(order), daily, products
+
+
+def _diff(new, old):
+    return {field: new.get(field, 0) - old.get(field, 0) for field in set(new) | set(old)}
+
+
+def rollup_changes(old, new):
+    """The $inc updates that take the rollups from ``old`` to ``new`` (either may be None)"""
+    old_day, old_daily, old_products = contribution(old)
+    new_day, new_daily, new_products = contribution(new)
+    day = new_day or old_day
+
+    daily = {k: v for k, v in _diff(new_daily, old_daily).items() if v}
+    daily_ops = [UpdateOne({"_id": day}, {"$inc": daily}, upsert=True)] if daily else []
+
+    product_ops = []
+    for product_id in set(new_products) | set(old_products):
+        line = new_products.get(product_id) or old_products[product_id]
+        counters = {"orders", "units", "revenue"}
+        inc = _diff(
+            {k: v for k, v in new_products.get(product_id, {}).items() if k in counters},
+            {k: v for k, v in old_products.get(product_id, {}).items() if k in counters}
+        )
+        inc = {k: v for k, v in inc.items() if v}
+        if inc:
+            product_ops.append(UpdateOne(
+                {"day": day, "product_id": product_id},
+                {"$inc": inc, "$set": {"sku": line["sku"], "product_name": line["product_name"]}},
+                upsert=True
+            ))
+    return daily_ops, product_ops
+
+
+def apply_rollups(db, old, new):
+    """Move the rollups from order ``old`` to order ``new``"""
+    daily_ops, product_ops = rollup_changes(old, new)
+    if daily_ops:
+        db.sales_daily.bulk_write(daily_ops, ordered=False)
+    if product_ops:
+        db.sales_product_daily.bulk_write(product_ops, ordered=False)
+
+
+'''
+Backfill
+'''
+
+def _day_expression():
+    return {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}}
+
+
+def daily_pipeline(match):
+    active = {"$ne": ["$_id.status", "Cancelled"]}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"day": _day_expression(), "status": "$order_status"},
+            "orders": {"$sum": 1},
+            "units": {"$sum": "$order_quantity"},
+            "revenue": {"$sum": "$order_price"}
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "orders": {"$sum": {"$cond": [active, "$orders", 0]}},
+            "units": {"$sum": {"$cond": [active, "$units", 0]}},
+            "revenue": {"$sum": {"$cond": [active, "$revenue", 0]}},
+            "statuses": {"$push": {"k": "$_id.status", "v": "$orders"}}
+        }},
+        {"$project": {"orders": 1, "units": 1, "revenue": 1, "orders_by_status": {"$arrayToObject": "$statuses"}}},
+        {"$merge": {"into": "sales_daily", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def product_daily_pipeline(match):
+    return [
+        {"$match": {**match, "order_status": {"$ne": "Cancelled"}}},
+        {"$unwind": "$products"},
+        # one order counts once per product even if the product is on several lines
+        {"$group": {
+            "_id": {"order_id": "$order_id", "day": _day_expression(), "product_id": "$products.product_id"},
+            "sku": {"$first": "$products.sku"},
+            "product_name": {"$first": "$products.product_name"},
+            "units": {"$sum": "$products.product_quantity"},
+            "revenue": {"$sum": "$products.total_price"}
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "product_id": "$_id.product_id"},
+            "sku": {"$first": "$sku"},
+            "product_name": {"$first": "$product_name"},
+            "orders": {"$sum": 1},
+            "units": {"$sum": "$units"},
+            "revenue": {"$sum": "$revenue"}
+        }},
+        {"$project": {"_id": 0, "day": "$_id.day", "product_id": "$_id.product_id",
+                      "sku": 1, "product_name": 1, "orders": 1, "units": 1, "revenue": 1}},
+        {"$merge": {"into": "sales_product_daily", "on": ["day", "product_id"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+def backfill(db, since=None):
+    """Rebuild the rollups of every day from ``since`` (a date, default: all history).
+
+    Orders written while the backfill runs may be counted twice or not at
+    all on the rebuilt days, so run it when order traffic is quiet.
+    """
+    match, day_filter, product_filter = {}, {}, {}
+    if since is not None:
+        start = datetime.combine(since, datetime.min.time())
+        match = {"created_at": {"$gte": start}}
+        day_filter = {"_id": {"$gte": since.strftime(DAY_FORMAT)}}
+        product_filter = {"day": {"$gte": since.strftime(DAY_FORMAT)}}
+
+    db.sales_daily.delete_many(day_filter)
+    db.sales_product_daily.delete_many(product_filter)
+    db.orders.aggregate(daily_pipeline(match), allowDiskUse=True)
+    db.orders.aggregate(product_daily_pipeline(match), allowDiskUse=True)
+    return db.sales_daily.count_documents(day_filter), db.sales_product_daily.count_documents(product_filter)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the sales rollups from the order history")
+    parser.add_argument("--days", type=int, help="only rebuild the last N days")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from db.mongo_db import db
+    since = datetime.now().date() - timedelta(days=args.days - 1) if args.days else None
+    days, product_days = backfill(db, since)
+    logging.info(f"rebuilt {days} daily and {product_days} product/day rollups")
+
+
+if __name__ == "__main__":
+    main()
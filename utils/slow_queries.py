@@ -0,0 +1,338 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pymongo import UpdateOne, monitoring
+from pymongo.errors import PyMongoError
+from db import mongo_db
+from utils.metrics import command_collection
+
+'''
+Slow MongoDB command log.
+
+A pymongo CommandListener times every command. Commands slower than
+SLOW_QUERY_MS are grouped by collection, command, filter shape (the filter
+with every value replaced by "?") and the line of the app that issued it,
+e.g. ``routes/product_routes.py:120 (get)``, looked up once a command is
+known to be slow (the reply is delivered on the stack that issued the
+command, so the line is still there). The listener only buffers; a
+background thread per worker upserts the buffered stats into the
+``slow_queries`` collection every SLOW_QUERY_FLUSH_INTERVAL seconds, so
+every worker adds to the same report.
+
+The same thread explains the slowest shapes it has seen (with one real
+filter it kept in memory, never stored), flags collection scans and
+in-memory sorts, and suggests an index following the equality, sort, range
+order. ``GET /admin/slow_queries`` and ``python -m utils.slow_queries``
+show the report.
+'''
+
+# commands whose filter can be explained as a find, and where it is
+FILTER_PATHS = {
+    "find": ("filter", "sort"),
+    "findAndModify": ("query", "sort"),
+    "count": ("query", None),
+    "distinct": ("query", None),
+}
+# not worth a report line: cursor plumbing, and the report itself
+IGNORED_COMMANDS = {"getMore", "killCursors", "explain", "endSessions"}
+REPORT_COLLECTION = "slow_queries"
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists", "$not", "$elemMatch"}
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def redact(value):
+    """The shape of a filter: operators and field names kept, values replaced by "?" """
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    # $and/$or keep their conditions, a list of values is just a value
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [redact(v) for v in value]
+    return "?"
+
+
+def command_filter(command_name, command):
+    """(filter, sort) of a command, ({}, None) when it has none"""
+    if command_name in FILTER_PATHS:
+        filter_key, sort_key = FILTER_PATHS[command_name]
+        return command.get(filter_key) or {}, command.get(sort_key) if sort_key else None
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return statements[0].get("q") or {}, None
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        match = pipeline[0].get("$match", {}) if pipeline else {}
+        sort = pipeline[1].get("$sort") if match and len(pipeline) > 1 else None
+        return match, sort
+    return {}, None
+
+
+def suggest_index(filter, sort=None):
+    """Index keys for ``filter``/``sort``: equality fields, then sort fields, then range fields"""
+    equality, ranges = [], []
+    for field, condition in filter.items():
+        if field.startswith("$"):
+            continue
+        operators = set(condition) if isinstance(condition, dict) else set()
+        if operators & RANGE_OPERATORS:
+            ranges.append(field)
+        else:
+            equality.append(field)
+    keys = [[field, 1] for field in equality]
+    for field, direction in (sort or {}).items():
+        if field not in equality:
+            keys.append([field, direction])
+    used = {field for field, _ in keys}
+    keys += [[field, 1] for field in ranges if field not in used]
+    return keys
+
+
+def plan_summary(explain):
+    """Stages and indexes of the winning plan of an explain reply"""
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # slot based engine plans nest the classic tree under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages, indexes = [], []
+    pending = [plan]
+    while pending:
+        stage = pending.pop()
+        if not isinstance(stage, dict):
+            continue
+        if "stage" in stage:
+            stages.append(stage["stage"])
+        if "indexName" in stage:
+            indexes.append(stage["indexName"])
+        pending.append(stage.get("inputStage"))
+        pending.extend(stage.get("inputStages", []))
+    return {
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+        "stages": stages,
+        "indexes": indexes
+    }
+
+
+def call_site():
+    """The line of the app that issued the current command"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(PROJECT_ROOT) and "site-packages" not in path and path != __file__:
+            return f"{os.path.relpath(path, PROJECT_ROOT)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return None
+
+
+def shape_id(entry):
+    key = json.dumps([entry["collection"], entry["command"], entry["shape"], entry["source"]], sort_keys=True)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class SlowQueryLog(monitoring.CommandListener):
+
+    def __init__(self):
+        self.enabled = True
+        self.threshold_ms = 100
+        self.flush_interval = 10.0
+        self.explain_top = 5
+        self.explain_every = 3600
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._buffer = {}
+        self._samples = {}
+        self._explained = {}
+        self._thread = None
+        self._pid = None
+        self._registered = False
+
+    def init_app(self, app):
+        """Read the settings and register the listener (clients created afterwards are timed)"""
+        self.enabled = app.config.get("SLOW_QUERY_ENABLED", True)
+        self.threshold_ms = app.config.get("SLOW_QUERY_MS", 100)
+        self.flush_interval = app.config.get("SLOW_QUERY_FLUSH_INTERVAL", 10.0)
+        self.explain_top = app.config.get("SLOW_QUERY_EXPLAIN_TOP", 5)
+        self.explain_every = app.config.get("SLOW_QUERY_EXPLAIN_EVERY", 3600)
+        if self.enabled and not self._registered:
+            monitoring.register(self)
+            self._registered = True
+
+    '''
+    Listener (runs on the thread of the command, must stay cheap)
+    '''
+
+    def started(self, event):
+        if not self.enabled or event.command_name in IGNORED_COMMANDS:
+            return
+        collection = command_collection(event.command_name, event.command)
+        if not collection or collection == REPORT_COLLECTION:
+            return
+        filter, sort = command_filter(event.command_name, event.command)
+        self._pending[(event.request_id, event.connection_id)] = (collection, event.command_name, filter, sort)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        collection, command_name, filter, sort = pending
+        # walking the stack is left to the slow commands only
+        source = call_site()
+        entry = {
+            "collection": collection,
+            "command": command_name,
+            "shape": json.dumps(redact(filter), sort_keys=True, default=str),
+            "sort": json.dumps(sort, default=str) if sort else None,
+            "source": source
+        }
+        _id = shape_id(entry)
+        with self._lock:
+            stats = self._buffer.setdefault(_id, {**entry, "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if filter or sort:
+                self._samples[_id] = (collection, filter, sort, stats["total_ms"])
+        self._ensure_thread()
+
+    '''
+    Background flush and explain
+    '''
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush(mongo_db.db)
+                self.explain_slowest(mongo_db.db)
+            except PyMongoError:
+                logging.exception("Slow query log update failed")
+
+    def flush(self, db):
+        """Add the buffered stats to the slow_queries report"""
+        with self._lock:
+            buffered, self._buffer = self._buffer, {}
+        if not buffered:
+            return 0
+        now = datetime.now()
+        ops = [
+            UpdateOne(
+                {"_id": _id},
+                {
+                    "$set": {k: stats[k] for k in ("collection", "command", "shape", "sort", "source")},
+                    "$inc": {"count": stats["count"], "total_ms": stats["total_ms"]},
+                    "$max": {"max_ms": stats["max_ms"], "last_seen": now}
+                },
+                upsert=True
+            )
+            for _id, stats in buffered.items()
+        ]
+        db.slow_queries.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    def explain_slowest(self, db, force=False):
+        """Explain the slowest shapes this worker has a sample of and store the verdict"""
+        with self._lock:
+            samples = sorted(self._samples.items(), key=lambda item: item[1][3], reverse=True)
+        now = time.time()
+        explained = 0
+        for _id, (collection, filter, sort, _) in samples[:self.explain_top]:
+            if not force and now - self._explained.get(_id, 0) < self.explain_every:
+                continue
+            command = {"find": collection, "filter": filter}
+            if sort:
+                command["sort"] = sort
+            try:
+                reply = db.command({"explain": command, "verbosity": "queryPlanner"})
+            except PyMongoError as e:
+                logging.warning(f"explain failed for {collection}: {e}")
+                continue
+            verdict = plan_summary(reply)
+            verdict["suggested_index"] = suggest_index(filter, sort) if verdict["collscan"] or verdict["in_memory_sort"] else None
+            verdict["explained_at"] = datetime.now()
+            db.slow_queries.update_one({"_id": _id}, {"$set": {"explain": verdict}})
+            self._explained[_id] = now
+            explained += 1
+        return explained
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._buffer.clear()
+            self._samples.clear()
+            self._explained.clear()
+
+    def _after_fork(self):
+        # the master's buffered stats are flushed by the master
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._pending = {}
+        self.reset()
+
+
+def report(db, limit=20, collscan_only=False):
+    """The slowest shapes by total time"""
+    query = {"explain.collscan": True} if collscan_only else {}
+    entries = list(db.slow_queries.find(query, sort=[("total_ms", -1)], limit=limit))
+    for entry in entries:
+        entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 2) if entry.get("count") else None
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the slowest MongoDB command shapes seen by the app")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--collscan", action="store_true", help="only shapes explained as collection scans")
+    parser.add_argument("--reset", action="store_true", help="clear the report after printing it")
+    args = parser.parse_args(argv)
+
+    from db.mongo_db import db
+    entries = report(db, args.limit, args.collscan)
+    if not entries:
+        print("No slow commands recorded")
+    for entry in entries:
+        print(f"{entry['collection']}.{entry['command']} {entry['shape']}"
+              + (f" sort {entry['sort']}" if entry.get("sort") else ""))
+        print(f"  {entry['count']} calls, avg {entry['avg_ms']}ms, max {round(entry['max_ms'], 2)}ms"
+              f"  from {entry.get('source') or 'unknown'}")
+        verdict = entry.get("explain")
+        if verdict:
+            flags = [name for name in ("collscan", "in_memory_sort") if verdict.get(name)]
+            print(f"  plan: {' > '.join(reversed(verdict['stages']))}" + (f"  [{', '.join(flags)}]" if flags else ""))
+            if verdict.get("suggested_index"):
+                keys = ", ".join(f"{field}: {direction}" for field, direction in verdict["suggested_index"])
+                print(f"  suggested index: {{{keys}}}")
+    if args.reset:
+        db.slow_queries.delete_many({})
+    return 0
+
+
+slow_query_log = SlowQueryLog()
+
+os.register_at_fork(after_in_child=slow_query_log._after_fork)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,290 @@
+import uuid
+from pymongo import UpdateOne
+
+'''
+Stock reservation.
+
+Every line is decremented with a conditional $inc guarded by
+``quantity_present >= n`` so concurrent orders can never oversell, and all
+lines go to the server in a single unordered bulk_write.
+
+Without a transaction each reserved product is tagged with the reservation
+id while the bulk runs. If some lines could not be reserved only the tagged
+products are given their stock back, which makes the compensation exact even
+when other orders are reserving the same products at the same time.
+
+Every stock change also increments the product's ``version`` (see
+utils/etags.py). The *_async variants do the same with an AsyncMongoClient
+collection.
+'''
+
+
+class InsufficientStock(Exception):
+    """Raised when at least one line of a reservation could not be satisfied"""
+
+    def __init__(self, quantities):
+        super().__init__("Insufficient stock")
+        self.quantities = quantities
+
+
+def order_quantities(lines):
+    """Total quantity per product_id for the given order lines"""
+    quantities = {}
+    for line in lines:
+        quantities[line["product_id"]] = quantities.get(line["product_id"], 0) + line["product_quantity"]
+    return quantities
+
+
+def _reserve_ops(reservation_id, quantities, tagged):
+    ops = []
+    for product_id, n in quantities.items():
+        query = {"product_id": product_id, "is_active": True, "quantity_present": {"$gte": n}}
+        update = {"$inc": {"quantity_present": -n, "version": 1}}
+        if tagged:
+            query["reservations"] = {"$ne": reservation_id}
+            update["$addToSet"] = {"reservations": reservation_id}
+        ops.append(UpdateOne(query, update))
+    return ops
+
+
+def _compensate_ops(reservation_id, quantities):
+    # only the products tagged by this reservation get their stock back
+    return [
+        UpdateOne(
+            {"product_id": product_id, "reservations": reservation_id},
+            {"$inc": {"quantity_present": n, "version": 1}, "$pull": {"reservations": reservation_id}}
+        )
+        for product_id, n in quantities.items()
+    ]
+
+
+def _untag(reservation_id, quantities):
+    return {"product_id": {"$in": list(quantities)}}, {"$pull": {"reservations": reservation_id}}
+
+
+def _release_ops(quantities):
+    return [
+        UpdateOne({"product_id": product_id}, {"$inc": {"quantity_present": n, "version": 1}})
+        for product_id, n in quantities.items()
+    ]
+
+
+def reserve_stock(collection, reservation_id, quantities, session=None):
+    """Atomically take ``quantities`` ({product_id: n}) out of stock.
+
+    Raises InsufficientStock, with nothing reserved, if any line cannot be
+    satisfied. Pass a session to run inside a multi-document transaction, in
+    which case aborting the transaction undoes partial reservations.
+    """
+    if not quantities:
+        return
+
+    if session is not None:
+        result = collection.bulk_write(_reserve_ops(reservation_id, quantities, False), ordered=False, session=session)
+        if result.matched_count != len(quantities):
+            raise InsufficientStock(quantities)
+        return
+
+    result = collection.bulk_write(_reserve_ops(reservation_id, quantities, True), ordered=False)
+    if result.matched_count != len(quantities):
+        collection.bulk_write(_compensate_ops(reservation_id, quantities), ordered=False)
+        raise InsufficientStock(quantities)
+    collection.update_many(*_untag(reservation_id, quantities))
+
+
+def release_stock(collection, quantities, session=None):
+    """Put ``quantities`` ({product_id: n}) back into stock"""
+    if not quantities:
+        return
+    collection.bulk_write(_release_ops(quantities), ordered=False, session=session)
+
+
+def place_order(product_collection, order_collection, order_doc, use_transaction=False):
+    """Reserve the stock of ``order_doc`` and insert it.
+
+    With ``use_transaction`` the reservation and the insert commit together
+    (requires a replica set or sharded cluster). Otherwise the reservation is
+    released again if the insert fails.
+    """
+    quantities = order_quantities(order_doc["products"])
+
+    if use_transaction:
+        def reserve_and_insert(session):
+            reserve_stock(product_collection, order_doc["order_id"], quantities, session=session)
+            order_collection.insert_one(order_doc, session=session)
+
+        with order_collection.database.client.start_session() as session:
+            session.with_transaction(reserve_and_insert)
+        return
+
+    reserve_stock(product_collection, order_doc["order_id"], quantities)
+    try:
+        order_collection.insert_one(order_doc)
+    except Exception:
+        release_stock(product_collection, quantities)
+        raise
+
+
+async def reserve_stock_async(collection, reservation_id, quantities, session=None):
+    """Async counterpart of reserve_stock"""
+    if not quantities:
+        return
+
+    if session is not None:
+        result = await collection.bulk_write(_reserve_ops(reservation_id, quantities, False), ordered=False, session=session)
+        if result.matched_count != len(quantities):
+            raise InsufficientStock(quantities)
+        return
+
+    result = await collection.bulk_write(_reserve_ops(reservation_id, quantities, True), ordered=False)
+    if result.matched_count != len(quantities):
+        await collection.bulk_write(_compensate_ops(reservation_id, quantities), ordered=False)
+        raise InsufficientStock(quantities)
+    await collection.update_many(*_untag(reservation_id, quantities))
+
+
+async def release_stock_async(collection, quantities, session=None):
+    """Async counterpart of release_stock"""
+    if not quantities:
+        return
+    await collection.bulk_write(_release_ops(quantities), ordered=False, session=session)
+
+
+async def place_order_async(product_collection, order_collection, order_doc, use_transaction=False):
+    """Async counterpart of place_order"""
+    quantities = order_quantities(order_doc["products"])
+
+    if use_transaction:
+        async def reserve_and_insert(session):
+            await reserve_stock_async(product_collection, order_doc["order_id"], quantities, session=session)
+            await order_collection.insert_one(order_doc, session=session)
+
+        async with order_collection.database.client.start_session() as session:
+            await session.with_transaction(reserve_and_insert)
+        return
+
+    await reserve_stock_async(product_collection, order_doc["order_id"], quantities)
+    try:
+        await order_collection.insert_one(order_doc)
+    except Exception:
+        await release_stock_async(product_collection, quantities)
+        raise
+
+
+'''
+Bulk stock adjustment.
+
+Every adjustment is a relative $inc, so receiving stations posting at the
+same time add up instead of overwriting each other. A cycle count ({sku,
+set}) is turned into the $inc from the quantity just read, guarded by that
+quantity, and read again if an order moved the stock in between.
+
+Each applied update tags the product with the adjustment id, the same way
+reservations do, so a single read afterwards tells which lines were applied
+and what the resulting quantities are.
+'''
+
+
+def _adjust_ops(adjustment_id, lines):
+    ops = []
+    for sku, (guard, delta) in lines.items():
+        query = {"sku": sku, "adjustments": {"$ne": adjustment_id}, **guard}
+        ops.append(UpdateOne(query, {"$inc": {"quantity_present": delta, "version": 1}, "$addToSet": {"adjustments": adjustment_id}}))
+    return ops
+
+
+def _apply_adjustments(collection, adjustment_id, lines):
+    """Run one bulk of {sku: (guard, delta)}, returning {sku: product} and the applied skus"""
+    collection.bulk_write(_adjust_ops(adjustment_id, lines), ordered=False)
+    products = {
+        p["sku"]: p
+        for p in collection.find({"sku": {"$in": list(lines)}}, {"_id": 0, "sku": 1, "quantity_present": 1, "adjustments": 1})
+    }
+    applied = [sku for sku, p in products.items() if adjustment_id in p.get("adjustments", [])]
+    if applied:
+        collection.update_many({"sku": {"$in": applied}}, {"$pull": {"adjustments": adjustment_id}})
+    return products, applied
+
+
+def adjust_stock(collection, adjustment_id, deltas, counts, retries=3):
+    """Apply {sku: delta} and {sku: counted quantity} in one chunk.
+
+    Returns ({sku: resulting quantity}, {sku: error}).
+    """
+    results, errors = {}, {}
+
+    # a delta never takes the stock below zero
+    lines = {sku: ({"quantity_present": {"$gte": -d}} if d < 0 else {}, d) for sku, d in deltas.items()}
+    if lines:
+        products, applied = _apply_adjustments(collection, adjustment_id, lines)
+        for sku in lines:
+            if sku in applied:
+                results[sku] = products[sku]["quantity_present"]
+            elif sku in products:
+                errors[sku] = "Insufficient stock"
+            else:
+                errors[sku] = "Product not found"
+
+    pending = dict(counts)
+    for _ in range(retries):
+        if not pending:
+            break
+        current = {
+            p["sku"]: p.get("quantity_present", 0)
+            for p in collection.find({"sku": {"$in": list(pending)}}, {"_id": 0, "sku": 1, "quantity_present": 1})
+        }
+        for sku in [s for s in pending if s not in current]:
+            errors[sku] = "Product not found"
+            del pending[sku]
+        if not pending:
+            break
+        lines = {sku: ({"quantity_present": current[sku]}, n - current[sku]) for sku, n in pending.items()}
+        products, applied = _apply_adjustments(collection, adjustment_id, lines)
+        for sku in applied:
+            results[sku] = products[sku]["quantity_present"]
+            del pending[sku]
+
+    for sku in pending:
+        errors[sku] = "Stock changed while counting, please retry"
+    return results, errors
+
+
+def bulk_adjust_stock(collection, entries, chunk_size=1000):
+    """Apply [{sku, delta} | {sku, set}] entries in chunks.
+
+    Deltas for the same sku are summed; a sku that is counted (``set``) may
+    only appear once. Returns per-sku results and errors.
+    """
+    adjustment_id = str(uuid.uuid4())
+    deltas, counts, errors = {}, {}, {}
+    for entry in entries:
+        sku = entry["sku"]
+        if sku in counts or ("set" in entry and sku in deltas):
+            errors[sku] = "A counted sku can only be listed once"
+        elif "set" in entry:
+            counts[sku] = entry["set"]
+        else:
+            deltas[sku] = deltas.get(sku, 0) + entry["delta"]
+    for sku in errors:
+        deltas.pop(sku, None)
+        counts.pop(sku, None)
+
+    results = {}
+    skus = list(deltas) + list(counts)
+    for start in range(0, len(skus), chunk_size):
+        chunk = skus[start:start + chunk_size]
+        chunk_results, chunk_errors = adjust_stock(
+            collection,
+            adjustment_id,
+            {sku: deltas[sku] for sku in chunk if sku in deltas},
+            {sku: counts[sku] for sku in chunk if sku in counts}
+        )
+        results.update(chunk_results)
+        errors.update(chunk_errors)
+
+    return {
+        "applied": len(results),
+        "failed": len(errors),
+        "results": [{"sku": sku, "quantity_present": n} for sku, n in results.items()],
+        "errors": [{"sku": sku, "error": error} for sku, error in errors.items()]
+    }